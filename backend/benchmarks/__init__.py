@@ -0,0 +1 @@
+"""Offline benchmarks with mock LLM provider and GitHub API servers"""
@@ -0,0 +1,291 @@
+"""Fake GitHub REST API serving one synthetic repository for offline benchmarks
+
+Implements the endpoints the backend uses: the authenticated user and their
+repositories, repository metadata, commits, recursive Git trees, Git blobs, the
+contents API (with ETags, so conditional requests get 304s) and tarball downloads.
+"""
+
+import base64
+import hashlib
+import io
+import json
+import tarfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+OWNER = 'bench'
+REPO = 'sample'
+DEFAULT_BRANCH = 'main'
+UPDATED_AT = '2024-01-01T00:00:00Z'
+
+PYTHON_TEMPLATE = '''"""Synthetic module {index}"""
+
+import os
+
+
+def load_{index}(path):
+    """Read a file and return its lines"""
+    with open(path) as handle:
+        return handle.read().splitlines()
+
+
+class Processor{index}:
+    def __init__(self, items):
+        self.items = items
+
+    def run(self):
+        results = []
+        for item in self.items:
+            if item is None:
+                continue
+            results.append(str(item).strip())
+        return results
+'''
+
+JS_TEMPLATE = '''// Synthetic module {index}
+export function format{index}(items) {{
+  const results = [];
+  for (const item of items) {{
+    if (item == null) continue;
+    results.push(String(item).trim());
+  }}
+  return results;
+}}
+'''
+
+
+def git_blob_sha(data):
+    header = f"blob {len(data)}\0".encode('utf-8')
+    return hashlib.sha1(header + data).hexdigest()
+
+
+def build_files(file_count=50, file_size=2000):
+    """Generate {path: bytes} for a repository of Python and JavaScript modules"""
+    files = {'README.md': b'# Synthetic benchmark repository\n'}
+    for index in range(file_count):
+        if index % 3 == 2:
+            path, template = f"web/module_{index}.js", JS_TEMPLATE
+        else:
+            path, template = f"src/pkg{index % 5}/module_{index}.py", PYTHON_TEMPLATE
+        content = template.format(index=index)
+        # Pad to roughly file_size bytes with repeated, still-valid source
+        while len(content) < file_size:
+            content += template.format(index=f"{index}_{len(content)}")
+        files[path] = content.encode('utf-8')
+    return files
+
+
+class MockGitHubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-RateLimit-Limit', '5000')
+        self.send_header('X-RateLimit-Remaining', '4999')
+        self.send_header('X-RateLimit-Reset', str(int(time.time()) + 3600))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_cacheable(self, payload):
+        body = json.dumps(payload, sort_keys=True)
+        etag = '"' + hashlib.sha1(body.encode('utf-8')).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self._send_json(304, None, {'ETag': etag})
+        else:
+            self._send_json(200, payload, {'ETag': etag})
+
+    def _send_archive(self, data):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-gzip')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        server = self.server
+        server.count_request()
+        if server.latency:
+            time.sleep(server.latency)
+
+        url = urlparse(self.path)
+        path = unquote(url.path).rstrip('/')
+        query = parse_qs(url.query)
+        repo_prefix = f"/repos/{OWNER}/{REPO}"
+
+        if path == '/user':
+            self._send_json(200, {'login': OWNER, 'id': 1, 'url': f"{server.base_url}/users/{OWNER}", 'type': 'User'})
+        elif path == '/user/repos':
+            self._send_json(200, [server.repo_json()])
+        elif path == repo_prefix:
+            self._send_json(200, server.repo_json())
+        elif path.startswith(f"{repo_prefix}/commits/"):
+            self._send_json(200, server.commit_json())
+        elif path.startswith(f"{repo_prefix}/tarball"):
+            # Like GitHub, redirect to the archive download host
+            self.send_response(302)
+            self.send_header('Location', f"{server.base_url}/archive/{OWNER}-{REPO}.tar.gz")
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        elif path == f"/archive/{OWNER}-{REPO}.tar.gz":
+            self._send_archive(server.tarball())
+        elif path.startswith(f"{repo_prefix}/git/trees/"):
+            self._send_json(200, server.tree_json(recursive=query.get('recursive') == ['1']))
+        elif path.startswith(f"{repo_prefix}/git/blobs/"):
+            blob = server.blob_json(path.rsplit('/', 1)[-1])
+            if blob is None:
+                self._send_json(404, {'message': 'Not Found'})
+            else:
+                self._send_json(200, blob)
+        elif path == f"{repo_prefix}/contents" or path.startswith(f"{repo_prefix}/contents/"):
+            contents = server.contents_json(path[len(f"{repo_prefix}/contents"):].lstrip('/'))
+            if contents is None:
+                self._send_json(404, {'message': 'Not Found'})
+            else:
+                self._send_cacheable(contents)
+        else:
+            self._send_json(404, {'message': 'Not Found'})
+
+
+class MockGitHubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, file_count=50, file_size=2000, latency=0.0):
+        super().__init__(address, MockGitHubHandler)
+        self.latency = latency
+        self.files = build_files(file_count, file_size)
+        self.blobs = {git_blob_sha(data): data for data in self.files.values()}
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def repo_url(self):
+        return f"{self.base_url}/repos/{OWNER}/{REPO}"
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def repo_json(self):
+        return {
+            'id': 1,
+            'name': REPO,
+            'full_name': f"{OWNER}/{REPO}",
+            'description': 'Synthetic benchmark repository',
+            'private': False,
+            'html_url': f"https://github.com/{OWNER}/{REPO}",
+            'url': self.repo_url,
+            'language': 'Python',
+            'default_branch': DEFAULT_BRANCH,
+            'updated_at': UPDATED_AT,
+            'owner': {'login': OWNER, 'id': 1, 'url': f"{self.base_url}/users/{OWNER}"}
+        }
+
+    def commit_json(self):
+        # The synthetic repository has a single commit, identified by its content
+        sha = hashlib.sha1(''.join(sorted(git_blob_sha(data) for data in self.files.values())).encode()).hexdigest()
+        return {'sha': sha, 'url': f"{self.repo_url}/commits/{sha}",
+                'commit': {'message': 'Synthetic commit', 'tree': {'sha': self.tree_json(recursive=False)['sha']}}}
+
+    def _directories(self):
+        directories = set()
+        for path in self.files:
+            parts = path.split('/')[:-1]
+            for depth in range(1, len(parts) + 1):
+                directories.add('/'.join(parts[:depth]))
+        return directories
+
+    def tree_json(self, recursive=True):
+        entries = []
+        for directory in sorted(self._directories()):
+            if recursive or '/' not in directory:
+                entries.append({'path': directory, 'mode': '040000', 'type': 'tree', 'sha': hashlib.sha1(directory.encode()).hexdigest(),
+                                'url': f"{self.repo_url}/git/trees/{directory}"})
+        for path, data in sorted(self.files.items()):
+            if recursive or '/' not in path:
+                sha = git_blob_sha(data)
+                entries.append({'path': path, 'mode': '100644', 'type': 'blob', 'sha': sha, 'size': len(data),
+                                'url': f"{self.repo_url}/git/blobs/{sha}"})
+        return {'sha': hashlib.sha1(DEFAULT_BRANCH.encode()).hexdigest(), 'url': f"{self.repo_url}/git/trees/{DEFAULT_BRANCH}",
+                'tree': entries, 'truncated': False}
+
+    def tarball(self):
+        """The repository as a gzipped tarball nested under '<owner>-<repo>-<sha>/', as GitHub serves it"""
+        sha = self.commit_json()['sha']
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w:gz', format=tarfile.PAX_FORMAT, pax_headers={'comment': sha}) as archive:
+            for path, data in sorted(self.files.items()):
+                info = tarfile.TarInfo(f"{OWNER}-{REPO}-{sha[:7]}/{path}")
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+        return buffer.getvalue()
+
+    def blob_json(self, sha):
+        data = self.blobs.get(sha)
+        if data is None:
+            return None
+        return {'sha': sha, 'size': len(data), 'url': f"{self.repo_url}/git/blobs/{sha}",
+                'content': base64.b64encode(data).decode('ascii'), 'encoding': 'base64'}
+
+    def _content_entry(self, path, entry_type):
+        entry = {'name': path.rsplit('/', 1)[-1], 'path': path, 'type': entry_type,
+                 'url': f"{self.repo_url}/contents/{path}"}
+        if entry_type == 'file':
+            data = self.files[path]
+            entry.update(sha=git_blob_sha(data), size=len(data), download_url=None)
+        else:
+            entry.update(sha=hashlib.sha1(path.encode()).hexdigest(), size=0)
+        return entry
+
+    def contents_json(self, path):
+        if path in self.files:
+            return dict(self._content_entry(path, 'file'), encoding='base64',
+                        content=base64.b64encode(self.files[path]).decode('ascii'))
+
+        prefix = f"{path}/" if path else ''
+        children = {}
+        for file_path in self.files:
+            if not file_path.startswith(prefix):
+                continue
+            name = file_path[len(prefix):].split('/', 1)
+            child = prefix + name[0]
+            children[child] = 'dir' if len(name) > 1 else 'file'
+        if not children:
+            return None
+        return [self._content_entry(child, entry_type) for child, entry_type in sorted(children.items())]
+
+
+def start_mock_github(file_count=50, file_size=2000, latency=0.0, host='127.0.0.1', port=0):
+    """Start the fake GitHub API on a background thread and return the server"""
+    server = MockGitHubServer((host, port), file_count, file_size, latency)
+    threading.Thread(target=server.serve_forever, daemon=True, name='mock-github').start()
+    return server
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8401)
+    parser.add_argument('--files', type=int, default=50)
+    parser.add_argument('--file-size', type=int, default=2000)
+    parser.add_argument('--latency', type=float, default=0.0)
+    args = parser.parse_args()
+
+    mock = MockGitHubServer(('127.0.0.1', args.port), args.files, args.file_size, args.latency)
+    print(f"Mock GitHub API at {mock.base_url} serving {OWNER}/{REPO}")
+    mock.serve_forever()
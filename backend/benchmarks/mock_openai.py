@@ -0,0 +1,222 @@
+"""Stand-in OpenAI-compatible chat completions server for offline benchmarks
+
+Responses take `latency` seconds plus the completion length divided by
+`token_rate`, stream as server-sent events when requested, report usage, and
+can fail at configurable rates with 500s or 429s carrying Retry-After.
+"""
+
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FILLER_WORDS = (
+    "the function handles input validation and returns early on error while the loop "
+    "accumulates results into a list consider extracting a helper and adding tests"
+).split()
+
+
+class MockLLMConfig:
+    """Behaviour of the mock provider"""
+
+    def __init__(self, latency=0.2, token_rate=200.0, completion_tokens=150,
+                 error_rate=0.0, rate_limit_rate=0.0, retry_after=1.0):
+        self.latency = latency
+        self.token_rate = token_rate
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+
+
+class MockLLMStats:
+    """Counts of requests the mock has answered, by outcome"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'errors': self.errors,
+                'rate_limited': self.rate_limited,
+                'prompt_tokens': self.prompt_tokens,
+                'completion_tokens': self.completion_tokens
+            }
+
+
+def _estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def _completion_words(count):
+    return [FILLER_WORDS[index % len(FILLER_WORDS)] for index in range(count)]
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        config = self.server.config
+        stats = self.server.stats
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': f'Unknown path {self.path}'}})
+            return
+
+        stats.add(requests=1)
+        roll = random.random()
+        if roll < config.rate_limit_rate:
+            stats.add(rate_limited=1)
+            self._send_json(
+                429,
+                {'error': {'message': 'Rate limit reached for requests', 'type': 'requests', 'code': 'rate_limit_exceeded'}},
+                {'Retry-After': str(config.retry_after)}
+            )
+            return
+        if roll < config.rate_limit_rate + config.error_rate:
+            stats.add(errors=1)
+            time.sleep(config.latency)
+            self._send_json(500, {'error': {'message': 'The server had an error processing your request', 'type': 'server_error'}})
+            return
+
+        prompt = ''.join(str(message.get('content', '')) for message in request.get('messages', []))
+        prompt_tokens = _estimate_tokens(prompt)
+        completion_tokens = min(config.completion_tokens, request.get('max_tokens') or config.completion_tokens)
+        stats.add(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        usage = {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens
+        }
+        words = _completion_words(completion_tokens)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        model = request.get('model', 'mock-model')
+
+        time.sleep(config.latency)
+        if request.get('stream'):
+            self._stream(completion_id, model, words, usage, request)
+            return
+
+        if config.token_rate:
+            time.sleep(completion_tokens / config.token_rate)
+        self._send_json(200, {
+            'id': completion_id,
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': ' '.join(words)},
+                'finish_reason': 'stop'
+            }],
+            'usage': usage
+        })
+
+    def _stream(self, completion_id, model, words, usage, request):
+        config = self.server.config
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        def send(payload):
+            self.wfile.write(f"data: {payload}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        def chunk(delta, finish_reason=None, chunk_usage=None):
+            payload = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+            }
+            if chunk_usage is not None:
+                payload['usage'] = chunk_usage
+            return json.dumps(payload)
+
+        send(chunk({'role': 'assistant', 'content': ''}))
+        for index, word in enumerate(words):
+            if config.token_rate:
+                time.sleep(1.0 / config.token_rate)
+            send(chunk({'content': word if index == 0 else ' ' + word}))
+        include_usage = (request.get('stream_options') or {}).get('include_usage')
+        send(chunk({}, 'stop'))
+        if include_usage:
+            send(json.dumps({
+                'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                'model': model, 'choices': [], 'usage': usage
+            }))
+        send('[DONE]')
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config=None):
+        super().__init__(address, MockLLMHandler)
+        self.config = config or MockLLMConfig()
+        self.stats = MockLLMStats()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+def start_mock_llm(config=None, host='127.0.0.1', port=0):
+    """Start the mock provider on a background thread and return the server"""
+    server = MockLLMServer((host, port), config)
+    threading.Thread(target=server.serve_forever, daemon=True, name='mock-llm').start()
+    return server
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8400)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--token-rate', type=float, default=200.0)
+    parser.add_argument('--completion-tokens', type=int, default=150)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    mock = MockLLMServer(('127.0.0.1', args.port), MockLLMConfig(
+        latency=args.latency, token_rate=args.token_rate, completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate
+    ))
+    print(f"Mock OpenAI-compatible server at {mock.base_url}")
+    mock.serve_forever()
@@ -0,0 +1,252 @@
+"""Offline load benchmark for the backend API
+
+Runs the Flask app in-process against the mock OpenAI-compatible provider and
+the fake GitHub API, drives the selected endpoints at a fixed concurrency and
+reports throughput, latency percentiles, errors and process memory.
+
+    cd backend
+    python -m benchmarks.run --scenario analyze chat --concurrency 16 --requests 200
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .mock_github import OWNER, REPO, build_files, start_mock_github
+from .mock_openai import MockLLMConfig, start_mock_llm
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ('analyze', 'analyze-multiple', 'chat', 'analyze-all')
+
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(percent / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def rss_mb():
+    """Current and peak resident set size of this process in MB"""
+    current = peak = None
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    current = int(line.split()[1]) / 1024
+                elif line.startswith('VmHWM:'):
+                    peak = int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if peak is None:
+        try:
+            import resource
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # Reported in KB on Linux and bytes on macOS
+            peak = max_rss / (1024 * 1024) if sys.platform == 'darwin' else max_rss / 1024
+        except ImportError:
+            pass
+    return current, peak
+
+
+def configure_environment(args, llm_mock, github_mock, work_dir):
+    """Point the app at the mocks and keep benchmark state out of the real database and caches"""
+    os.environ['GITHUB_API_URL'] = github_mock.base_url
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(work_dir, 'bench.db')}"
+    os.environ['GITHUB_BLOB_CACHE_DIR'] = os.path.join(work_dir, 'blob_cache')
+    if args.cold_github:
+        os.environ['GITHUB_BLOB_CACHE_MEMORY_BYTES'] = '0'
+        os.environ['GITHUB_BLOB_CACHE_DISK_BYTES'] = '0'
+    os.environ['LLM_RESPONSE_CACHE_PATH'] = os.path.join(work_dir, 'llm_cache.db')
+    os.environ.setdefault('LLM_RESPONSE_CACHE', 'off')
+
+
+def start_app():
+    """Import the Flask app after the environment is configured and serve it on a free port"""
+    from werkzeug.serving import make_server
+
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    from src.main import app
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True, name='bench-app').start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def build_requests(args, llm_mock):
+    """Return {scenario: callable(index) -> (method, path, json, headers)}"""
+    sources = [content.decode('utf-8') for path, content in sorted(build_files(max(args.files, 3), args.file_size).items())
+               if path.endswith('.py')]
+    files = [
+        {'path': path, 'content': content.decode('utf-8')}
+        for path, content in sorted(build_files(args.multi_files, args.file_size).items())
+        if not path.endswith('.md')
+    ][:args.multi_files]
+    llm_config = {
+        'provider': 'custom',
+        'model': args.model,
+        'api_key': 'bench-key',
+        'base_url': llm_mock.base_url
+    }
+
+    def analyze(index):
+        # Vary the code so identical requests are not coalesced
+        code = sources[index % len(sources)] + f"\n# request {index}\n"
+        return 'POST', '/api/llm/analyze', dict(llm_config, code=code, type='general', cache=False,
+                                                 session_id=f"bench-analyze-{index % args.concurrency}"), None
+
+    def analyze_multiple(index):
+        return 'POST', '/api/llm/analyze-multiple', dict(llm_config, files=files, mode=args.multi_mode,
+                                                         session_id=f"bench-multi-{index % args.concurrency}"), None
+
+    def chat(index):
+        return 'POST', '/api/llm/chat', dict(llm_config, message=f"How can I simplify function {index}?",
+                                              session_id=f"bench-chat-{index % args.concurrency}"), None
+
+    def analyze_all(index):
+        return ('POST', f"/api/github/repository/{OWNER}/{REPO}/analyze-all",
+                {'max_files': args.files, 'fetch': args.fetch}, {'Authorization': 'token bench-token'})
+
+    return {
+        'analyze': analyze,
+        'analyze-multiple': analyze_multiple,
+        'chat': chat,
+        'analyze-all': analyze_all
+    }
+
+
+def run_scenario(base_url, build_request, total, concurrency, timeout):
+    """Send total requests with concurrency workers and collect latencies and failures"""
+    local = threading.local()
+    latencies = []
+    failures = {}
+    lock = threading.Lock()
+
+    def send(index):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        method, path, payload, headers = build_request(index)
+        started = time.perf_counter()
+        try:
+            response = session.request(method, base_url + path, json=payload, headers=headers, timeout=timeout)
+            outcome = response.status_code
+        except requests.RequestException as error:
+            outcome = type(error).__name__
+        elapsed = time.perf_counter() - started
+        with lock:
+            if outcome == 200:
+                latencies.append(elapsed)
+            else:
+                failures[str(outcome)] = failures.get(str(outcome), 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(send, range(total)))
+    duration = time.perf_counter() - started
+
+    latencies.sort()
+    current_rss, peak_rss = rss_mb()
+    return {
+        'requests': total,
+        'succeeded': len(latencies),
+        'failures': failures,
+        'concurrency': concurrency,
+        'duration_s': round(duration, 3),
+        'throughput_rps': round(len(latencies) / duration, 2) if duration else None,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1) if latencies else None,
+        'max_ms': round(latencies[-1] * 1000, 1) if latencies else None,
+        'rss_mb': round(current_rss, 1) if current_rss is not None else None,
+        'peak_rss_mb': round(peak_rss, 1) if peak_rss is not None else None
+    }
+
+
+def print_report(results):
+    columns = ('scenario', 'succeeded', 'failures', 'throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'rss_mb', 'peak_rss_mb')
+    rows = [columns] + [
+        tuple(str(result.get(column) if column != 'failures' else (result['failures'] or '-')) for column in columns)
+        for result in results
+    ]
+    widths = [max(len(row[index]) for row in rows) for index in range(len(columns))]
+    for row in rows:
+        print('  '.join(value.ljust(width) for value, width in zip(row, widths)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Offline load benchmark for the backend API')
+    parser.add_argument('--scenario', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=100, help='Requests per scenario')
+    parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests per scenario')
+    parser.add_argument('--timeout', type=float, default=300.0)
+    parser.add_argument('--model', default='gpt-4o-mini')
+    # Mock provider behaviour
+    parser.add_argument('--llm-latency', type=float, default=0.2, help='Seconds before the first token')
+    parser.add_argument('--token-rate', type=float, default=200.0, help='Completion tokens per second (0 = instant)')
+    parser.add_argument('--completion-tokens', type=int, default=150)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of provider calls answered with 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Share of provider calls answered with 429')
+    parser.add_argument('--retry-after', type=float, default=1.0)
+    # Fake GitHub repository
+    parser.add_argument('--files', type=int, default=50, help='Files in the fake repository')
+    parser.add_argument('--file-size', type=int, default=2000, help='Approximate bytes per file')
+    parser.add_argument('--github-latency', type=float, default=0.02)
+    parser.add_argument('--cold-github', action='store_true', help='Disable the blob cache so every run downloads blobs')
+    parser.add_argument('--fetch', choices=('blobs', 'archive'), default='blobs',
+                        help='Load analyze-all files blob by blob or from one tarball')
+    parser.add_argument('--multi-files', type=int, default=10, help='Files per analyze-multiple request')
+    parser.add_argument('--multi-mode', choices=('combined', 'map_reduce'), default='map_reduce')
+    parser.add_argument('--json', dest='json_path', help='Also write the results to this file')
+    args = parser.parse_args(argv)
+
+    llm_mock = start_mock_llm(MockLLMConfig(
+        latency=args.llm_latency, token_rate=args.token_rate, completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after
+    ))
+    github_mock = start_mock_github(args.files, args.file_size, args.github_latency)
+
+    with tempfile.TemporaryDirectory(prefix='code-analysis-bench-') as work_dir:
+        configure_environment(args, llm_mock, github_mock, work_dir)
+        app_server, base_url = start_app()
+        builders = build_requests(args, llm_mock)
+
+        results = []
+        try:
+            for scenario in args.scenario:
+                if args.warmup:
+                    run_scenario(base_url, builders[scenario], args.warmup, min(args.concurrency, args.warmup), args.timeout)
+                result = run_scenario(base_url, builders[scenario], args.requests, args.concurrency, args.timeout)
+                result['scenario'] = scenario
+                results.append(result)
+        finally:
+            app_server.shutdown()
+
+    print_report(results)
+    print(f"\nmock provider: {json.dumps(llm_mock.stats.to_dict())}")
+    print(f"mock github: {json.dumps({'requests': github_mock.requests})}")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as output:
+            json.dump({
+                'settings': vars(args),
+                'results': results,
+                'mock_provider': llm_mock.stats.to_dict(),
+                'mock_github_requests': github_mock.requests
+            }, output, indent=2)
+
+    return results
+
+
+if __name__ == '__main__':
+    main()
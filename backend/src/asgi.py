@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+AI Code Assistant - ASGI Entry Point
+
+Serves the I/O-bound LLM and repository analysis routes from async views, so
+one process can hold many in-flight provider and GitHub calls. Every other
+route is delegated to the regular Flask application.
+
+Run with an ASGI server, e.g.:
+    hypercorn src.asgi:app --bind 0.0.0.0:5000
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from asgiref.wsgi import WsgiToAsgi
+from quart import Quart, g, request
+from werkzeug.exceptions import HTTPException
+
+from main import app as flask_app
+from llm.metrics import HTTP_REQUEST_SECONDS
+from routes.async_llm import async_llm_bp
+from routes.async_github import async_github_bp
+
+async_app = Quart(__name__)
+async_app.register_blueprint(async_llm_bp, url_prefix='/api/llm')
+async_app.register_blueprint(async_github_bp, url_prefix='/api/github')
+
+wsgi_app = WsgiToAsgi(flask_app)
+
+
+@async_app.before_request
+async def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@async_app.after_request
+async def add_cors_headers(response):
+    # Mirrors the Flask app's CORS(app, origins="*", expose_headers=...)
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    response.headers['Access-Control-Expose-Headers'] = (
+        'Retry-After, X-GitHub-RateLimit-Limit, X-GitHub-RateLimit-Remaining, X-GitHub-RateLimit-Reset'
+    )
+    if request.method == 'OPTIONS':
+        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
+        response.headers['Access-Control-Allow-Headers'] = request.headers.get(
+            'Access-Control-Request-Headers', 'Content-Type, Authorization'
+        )
+    return response
+
+
+@async_app.after_request
+async def record_request_latency(response):
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    HTTP_REQUEST_SECONDS.observe(
+        time.perf_counter() - g.get('request_started', time.perf_counter()),
+        method=request.method, endpoint=endpoint, status=response.status_code
+    )
+    return response
+
+
+def _is_async_route(scope):
+    """Check whether the async app serves this request's path"""
+    adapter = async_app.url_map.bind('')
+    try:
+        adapter.match(scope.get('path', ''), method=scope.get('method', 'GET'))
+        return True
+    except HTTPException:
+        return False
+
+
+async def app(scope, receive, send):
+    """ASGI dispatcher: async routes go to Quart, everything else to Flask"""
+    if scope['type'] == 'lifespan' or (scope['type'] == 'http' and _is_async_route(scope)):
+        await async_app(scope, receive, send)
+    else:
+        await wsgi_app(scope, receive, send)
@@ -0,0 +1,24 @@
+"""Background jobs for long-running analyses"""
+
+from .queue import JobCancelled, QueueFull, Reschedule, get_job_queue, init_job_queue
+from .snapshots import get_snapshot_store, init_snapshot_store
+from .tasks import (
+    analyze_all_task, analyze_multiple_task, analyze_batch_task,
+    analyze_all_params, analyze_multiple_params, analyze_batch_params
+)
+
+__all__ = [
+    'JobCancelled',
+    'QueueFull',
+    'Reschedule',
+    'get_job_queue',
+    'init_job_queue',
+    'get_snapshot_store',
+    'init_snapshot_store',
+    'analyze_all_task',
+    'analyze_multiple_task',
+    'analyze_batch_task',
+    'analyze_all_params',
+    'analyze_multiple_params',
+    'analyze_batch_params'
+]
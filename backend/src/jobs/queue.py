@@ -0,0 +1,285 @@
+"""Local background job queue with SQLite-backed status, progress and results"""
+
+import json
+import os
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+JOBS_WORKERS = int(os.getenv('JOBS_WORKERS', '2'))
+JOBS_MAX_PENDING = int(os.getenv('JOBS_MAX_PENDING', '20'))
+
+# Request fields never persisted with a job
+SECRET_FIELDS = ('api_key', 'github_token', 'token')
+
+TERMINAL_STATUSES = ('succeeded', 'failed', 'cancelled')
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once it has been cancelled"""
+
+
+class QueueFull(Exception):
+    """Raised when this process already has JOBS_MAX_PENDING jobs waiting, running or rescheduled"""
+
+
+class Reschedule:
+    """Returned by a task to run next_task(context) after delay seconds
+
+    The job stays running but holds no worker while it waits, so a job
+    polling an external service for hours does not block the queue. The
+    next step still runs if the job is cancelled meanwhile, so it can release
+    what it holds; its first check_cancelled raises.
+    """
+
+    def __init__(self, next_task, delay):
+        self.next_task = next_task
+        self.delay = delay
+
+
+def _public_params(params):
+    """Copy of params with credential fields removed at any depth"""
+    if isinstance(params, dict):
+        return {key: _public_params(value) for key, value in params.items() if key not in SECRET_FIELDS}
+    if isinstance(params, list):
+        return [_public_params(value) for value in params]
+    return params
+
+
+def _owner_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobContext:
+    """Handle passed to a running task for progress reporting and cancellation checks"""
+
+    def __init__(self, queue, job_id):
+        self.queue = queue
+        self.job_id = job_id
+
+    def update(self, **progress):
+        """Set progress counters (files_total, files_fetched, files_analyzed)"""
+        self.queue._update(self.job_id, **progress)
+
+    def increment(self, field):
+        self.queue._increment(self.job_id, field)
+
+    def check_cancelled(self):
+        if self.queue._status(self.job_id) == 'cancelled':
+            raise JobCancelled()
+
+
+class JobQueue:
+    """Runs jobs on a bounded local thread pool, no external broker required
+
+    Job state lives in the database so any worker process can report status
+    and results. Credentials stay in the submitting process's memory only, so
+    a job always runs in the process that accepted it. Each job records the
+    fingerprint of the credential it was submitted with (its submitter), and
+    is only listed, shown or cancelled for that same submitter.
+    """
+
+    def __init__(self, app, db, job_model, workers=JOBS_WORKERS, max_pending=JOBS_MAX_PENDING):
+        self.app = app
+        self.db = db
+        self.Job = job_model
+        self.max_pending = max_pending
+        self.owner = _owner_id()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='analysis-job')
+        self._futures = {}
+        self._timers = {}
+        self._lock = threading.Lock()
+        self._add_submitter_column()
+        self._recover_interrupted()
+
+    def _add_submitter_column(self):
+        """Add the submitter column to job tables created before it existed"""
+        with self.app.app_context():
+            table = self.Job.__tablename__
+            columns = {column['name'] for column in inspect(self.db.engine).get_columns(table)}
+            if 'submitter' not in columns:
+                self.db.session.execute(text(f'ALTER TABLE {table} ADD COLUMN submitter VARCHAR(16)'))
+                self.db.session.commit()
+
+    def _recover_interrupted(self):
+        """Fail jobs left unfinished by processes on this host that no longer exist"""
+        hostname = socket.gethostname()
+        with self.app.app_context():
+            unfinished = self.Job.query.filter(self.Job.status.in_(('queued', 'running'))).all()
+            for job in unfinished:
+                host, _, pid = (job.owner or '').rpartition(':')
+                if host == hostname and pid.isdigit() and not _process_alive(int(pid)):
+                    job.status = 'failed'
+                    job.error = 'Job interrupted by a server restart'
+                    job.finished_at = datetime.utcnow()
+            self.db.session.commit()
+
+    def submit(self, kind, task, params, submitter=None):
+        """Queue task(context) and return the new job's dict
+
+        params are stored for display with any credential fields removed.
+        submitter is the fingerprint of the credential the job was submitted with.
+        """
+        with self._lock:
+            # Jobs waiting on a Reschedule hold no worker but still count toward the bound
+            pending = sum(1 for future in self._futures.values() if not future.done()) + len(self._timers)
+            if pending >= self.max_pending:
+                raise QueueFull('Too many analysis jobs queued. Please try again later.')
+
+            job_id = str(uuid.uuid4())
+            stored_params = _public_params(params or {})
+            with self.app.app_context():
+                job = self.Job(id=job_id, kind=kind, status='queued', owner=self.owner, submitter=submitter,
+                               params=json.dumps(stored_params, default=str))
+                self.db.session.add(job)
+                self.db.session.commit()
+                job_dict = job.to_dict()
+
+            self._futures[job_id] = self._executor.submit(self._run, job_id, task)
+        return job_dict
+
+    def _run(self, job_id, task, resumed=False):
+        if not resumed:
+            with self.app.app_context():
+                job = self.db.session.get(self.Job, job_id)
+                if job is None or job.status != 'queued':
+                    # Cancelled after the worker had already picked it up
+                    with self._lock:
+                        self._futures.pop(job_id, None)
+                    return
+                job.status = 'running'
+                job.started_at = datetime.utcnow()
+                self.db.session.commit()
+
+        try:
+            result = task(JobContext(self, job_id))
+            if isinstance(result, Reschedule):
+                self._reschedule(job_id, result)
+                return
+            self._finish(job_id, 'succeeded', result=result)
+        except JobCancelled:
+            self._finish(job_id, 'cancelled')
+        except Exception as job_error:
+            self._finish(job_id, 'failed', error=str(job_error))
+        with self._lock:
+            self._futures.pop(job_id, None)
+
+    def _reschedule(self, job_id, reschedule):
+        """Free the worker and queue the job's next step once the delay has passed"""
+        def resume():
+            with self._lock:
+                # Fired by the timer or early by cancel, whichever comes first
+                if self._timers.pop(job_id, None) is None:
+                    return
+                self._futures[job_id] = self._executor.submit(self._run, job_id, reschedule.next_task, True)
+
+        timer = threading.Timer(reschedule.delay, resume)
+        timer.daemon = True
+        with self._lock:
+            self._futures.pop(job_id, None)
+            self._timers[job_id] = timer
+        timer.start()
+
+    def _finish(self, job_id, status, result=None, error=None):
+        with self.app.app_context():
+            job = self.db.session.get(self.Job, job_id)
+            if job is None:
+                return
+            if job.status != 'cancelled':
+                job.status = status
+            job.result = json.dumps(result) if result is not None else None
+            job.error = error
+            job.finished_at = datetime.utcnow()
+            self.db.session.commit()
+
+    def _update(self, job_id, **progress):
+        with self.app.app_context():
+            self.db.session.query(self.Job).filter_by(id=job_id).update(progress, synchronize_session=False)
+            self.db.session.commit()
+
+    def _increment(self, job_id, field):
+        with self.app.app_context():
+            column = getattr(self.Job, field)
+            self.db.session.query(self.Job).filter_by(id=job_id).update(
+                {field: column + 1}, synchronize_session=False
+            )
+            self.db.session.commit()
+
+    def _status(self, job_id):
+        with self.app.app_context():
+            row = self.db.session.query(self.Job.status).filter_by(id=job_id).first()
+            return row[0] if row else None
+
+    def _submitted_by(self, submitter):
+        return self.Job.query.filter(
+            self.Job.submitter == submitter if submitter else self.Job.submitter.is_(None)
+        )
+
+    def get(self, job_id, submitter, include_result=False):
+        """Return a job's dict, or None if it does not exist or another submitter's it is"""
+        with self.app.app_context():
+            job = self._submitted_by(submitter).filter_by(id=job_id).first()
+            return job.to_dict(include_result=include_result) if job else None
+
+    def list(self, submitter, limit=50):
+        """Return the submitter's most recent jobs, newest first"""
+        with self.app.app_context():
+            jobs = self._submitted_by(submitter).order_by(self.Job.created_at.desc()).limit(limit).all()
+            return [job.to_dict() for job in jobs]
+
+    def cancel(self, job_id, submitter):
+        """Cancel a queued or running job; returns False if it already finished or is unknown"""
+        if self.get(job_id, submitter) is None:
+            return False
+        with self._lock:
+            future = self._futures.get(job_id)
+            if future is not None and future.cancel():
+                # A job cancelled while queued never runs, so nothing else drops its future
+                self._futures.pop(job_id)
+            timer = self._timers.get(job_id)
+
+        with self.app.app_context():
+            job = self.db.session.get(self.Job, job_id)
+            if job is None or job.status in TERMINAL_STATUSES:
+                return False
+            job.status = 'cancelled'
+            if future is None or future.cancelled():
+                job.finished_at = datetime.utcnow()
+            self.db.session.commit()
+
+        if timer is not None:
+            # A job waiting to be resumed runs its next step now, which stops at its first check_cancelled
+            timer.cancel()
+            timer.function()
+        return True
+
+
+_job_queue = None
+
+
+def get_job_queue():
+    """Return the process's job queue"""
+    if _job_queue is None:
+        raise RuntimeError('Job queue not initialized')
+    return _job_queue
+
+
+def init_job_queue(app, db, job_model):
+    """Create the process's job queue"""
+    global _job_queue
+    _job_queue = JobQueue(app, db, job_model)
+    return _job_queue
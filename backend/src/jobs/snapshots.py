@@ -0,0 +1,117 @@
+"""Per-repository analysis snapshots for incremental analyze-all runs
+
+A snapshot records the commit an analysis ran against, the tree entries it
+covered and the per-file results, each tagged with the file's Git blob SHA.
+A later run lists the tree at the new HEAD and compares blob SHAs path by
+path, so only added or modified files are downloaded and analyzed again.
+
+Snapshots are scoped to the credentials of the run that stored them: a run
+with a different GitHub token or API key starts from scratch rather than
+reusing analyses of a repository it may not be able to read.
+"""
+
+import hashlib
+import json
+from datetime import datetime
+
+from llm.providers import fingerprint
+
+# Request fields that change which files are covered or what their analyses say
+SNAPSHOT_SETTINGS = ('extensions', 'max_files', 'max_file_size')
+SNAPSHOT_ANALYSIS_SETTINGS = ('provider', 'model', 'base_url', 'type', 'mode')
+
+
+def snapshot_settings(data, github_token=None):
+    """Settings and credential fingerprints a snapshot is only valid for, from an analyze-all request"""
+    analysis = data.get('analysis') or {}
+    settings = {key: data.get(key) for key in SNAPSHOT_SETTINGS}
+    if settings['extensions']:
+        settings['extensions'] = sorted(settings['extensions'])
+    settings.update({key: analysis.get(key) for key in SNAPSHOT_ANALYSIS_SETTINGS})
+    settings['github_credential'] = fingerprint(github_token)
+    settings['credential'] = fingerprint(analysis.get('api_key'))
+    if data.get('source', 'github') != 'github':
+        # A local checkout and a GitHub repository may share a name
+        settings['source'] = data['source']
+    return settings
+
+
+def snapshot_id(repository, settings):
+    payload = json.dumps({'repository': repository, 'settings': settings}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def diff_entries(snapshot, entries):
+    """Split tree entries against a snapshot
+
+    Returns (reused, changed, removed): reused maps paths whose blob SHA is
+    unchanged to their stored per-file result, changed lists the entries to
+    fetch and analyze (new, modified, or previously failed), and removed
+    lists the paths no longer in the tree.
+    """
+    previous = {}
+    if snapshot:
+        for file_result in snapshot['result'].get('file_results', []):
+            if 'analysis' in file_result and file_result.get('sha'):
+                previous[file_result['path']] = file_result
+
+    reused = {}
+    changed = []
+    for entry in entries:
+        file_result = previous.get(entry['path'])
+        if file_result is not None and file_result['sha'] == entry['sha']:
+            reused[entry['path']] = file_result
+        else:
+            changed.append(entry)
+
+    paths = {entry['path'] for entry in entries}
+    removed = [file['path'] for file in (snapshot or {}).get('files', []) if file['path'] not in paths]
+    return reused, changed, removed
+
+
+class SnapshotStore:
+    """Snapshots in the application's SQLAlchemy database, one per repository and settings"""
+
+    def __init__(self, app, db, snapshot_model):
+        self.app = app
+        self.db = db
+        self.Snapshot = snapshot_model
+
+    def get(self, repository, settings):
+        """Return the snapshot's dict, or None"""
+        with self.app.app_context():
+            snapshot = self.db.session.get(self.Snapshot, snapshot_id(repository, settings))
+            return snapshot.to_dict() if snapshot else None
+
+    def save(self, repository, settings, ref, commit_sha, truncated, entries, result):
+        """Create or replace the snapshot for a repository and settings"""
+        key = snapshot_id(repository, settings)
+        now = datetime.utcnow()
+        with self.app.app_context():
+            snapshot = self.db.session.get(self.Snapshot, key)
+            if snapshot is None:
+                snapshot = self.Snapshot(id=key, repository=repository, created_at=now)
+                self.db.session.add(snapshot)
+            snapshot.settings = json.dumps(settings, default=str)
+            snapshot.ref = ref
+            snapshot.commit_sha = commit_sha
+            snapshot.truncated = truncated
+            snapshot.files = json.dumps(entries)
+            snapshot.result = json.dumps(result)
+            snapshot.updated_at = now
+            self.db.session.commit()
+
+
+_snapshot_store = None
+
+
+def get_snapshot_store():
+    """Return the process's snapshot store, or None before init_snapshot_store"""
+    return _snapshot_store
+
+
+def init_snapshot_store(app, db, snapshot_model):
+    """Create the process's snapshot store"""
+    global _snapshot_store
+    _snapshot_store = SnapshotStore(app, db, snapshot_model)
+    return _snapshot_store
@@ -0,0 +1,217 @@
+"""Job tasks for repository, multi-file and batch analyses"""
+
+from llm.analysis import analyze_multiple_files
+from llm.batch import PROVIDER_BATCH_POLL_INTERVAL, prepare_provider_batch, start_provider_batch, poll_provider_batch
+from llm.code_index import repository_index_id
+from repository.fetch import DEFAULT_EXTENSIONS, DEFAULT_MAX_FILE_SIZE
+from repository.sources import get_repository_source, validate_source
+
+from .queue import Reschedule
+from .snapshots import get_snapshot_store, snapshot_settings, diff_entries
+
+
+def _file_summary(file):
+    return {key: file.get(key) for key in ('name', 'path', 'sha', 'size')}
+
+
+def _validate_analysis(analysis):
+    """Reject analysis settings that would fail, before a job is queued"""
+    if not analysis.get('api_key') and analysis.get('provider', 'openai') != 'ollama':
+        raise ValueError('API key required. Please configure your API key in Settings.')
+
+
+def _download_files(context, source, ref, entries, data):
+    """Load entries' contents from the source, counting each file as it comes in"""
+    return source.fetch_files(
+        ref, entries,
+        concurrency=data.get('concurrency'),
+        on_fetched=lambda entry: context.increment('files_fetched')
+    )
+
+
+def _analyze_files(context, analysis, files, previous_results=None):
+    """Map-reduce analysis of fetched files, reporting per-file progress"""
+    def on_file_result(result):
+        context.increment('files_analyzed')
+        context.check_cancelled()
+
+    return analyze_multiple_files(
+        dict(analysis, files=files, mode=analysis.get('mode', 'map_reduce')),
+        on_file_result=on_file_result,
+        previous_results=previous_results
+    )
+
+
+def _tag_blob_shas(analysis_result, entries):
+    """Record each file's blob SHA on its per-file result so later runs can compare"""
+    shas = {entry['path']: entry['sha'] for entry in entries}
+    for file_result in analysis_result.get('file_results', []):
+        file_result['sha'] = shas.get(file_result['path'])
+    return analysis_result
+
+
+def _incremental_analysis(context, source, repo_name, github_token, data, filters, result):
+    """Analyze only the files whose blob SHA changed since the stored snapshot
+
+    Unchanged files keep their stored per-file analyses. When nothing was
+    added, modified or removed, the stored synthesis is returned as well.
+    """
+    store = get_snapshot_store()
+    settings = snapshot_settings(dict(data, **filters), github_token)
+    snapshot = store.get(repo_name, settings) if data.get('incremental', True) is not False else None
+
+    commit_sha = source.resolve_commit(result['ref'])
+
+    if snapshot and snapshot['commit_sha'] == commit_sha and source.immutable:
+        # Same commit: the stored tree listing still applies
+        entries, truncated = snapshot['files'], snapshot['truncated']
+    else:
+        entries, truncated = source.list_files(commit_sha, **filters)
+
+    reused, changed, removed = diff_entries(snapshot, entries)
+    context.update(files_total=len(entries), files_analyzed=len(reused))
+    context.check_cancelled()
+
+    fetched = {file['path']: file for file in _download_files(context, source, commit_sha, changed, data)}
+    context.check_cancelled()
+
+    # Reused files need no content; files that could not be downloaded are left out
+    files = [
+        fetched.get(entry['path'], entry) for entry in entries
+        if entry['path'] in reused or entry['path'] in fetched
+    ]
+    result.update(
+        commit_sha=commit_sha,
+        truncated=truncated,
+        total_files=len(files),
+        files=[_file_summary(file) for file in files],
+        incremental={
+            'base_commit_sha': snapshot['commit_sha'] if snapshot else None,
+            'files_changed': len(changed),
+            'files_reused': len(reused),
+            'files_removed': len(removed)
+        }
+    )
+
+    if snapshot and not changed and not removed:
+        # Nothing changed: the stored synthesis still holds and no LLM call is needed
+        if snapshot['commit_sha'] != commit_sha:
+            store.save(repo_name, settings, result['ref'], commit_sha, truncated, entries, snapshot['result'])
+        result['analysis'] = dict(snapshot['result'], reused=True)
+        return result
+
+    analysis_result = _tag_blob_shas(_analyze_files(context, data['analysis'], files, reused), entries)
+    store.save(repo_name, settings, result['ref'], commit_sha, truncated, entries, analysis_result)
+    result['analysis'] = analysis_result
+    return result
+
+
+def analyze_all_task(repo_name, github_token, data):
+    """Build the task for fetching (and optionally analyzing) a whole repository
+
+    With an 'analysis' object (provider, model, api_key, type, ...) the
+    fetched files are analyzed and only their metadata is kept in the
+    result; otherwise the result matches the inline analyze-all response.
+    Map-reduce analyses are incremental: per-file results are stored by
+    blob SHA after each run, and the next run only fetches and analyzes
+    the files that changed, unless the request sets 'incremental' to false.
+    """
+    validate_source(data)
+    if data.get('analysis'):
+        _validate_analysis(data['analysis'])
+
+    def task(context):
+        # Background scans slow down with the rate limit budget instead of failing part-way
+        source = get_repository_source(repo_name, github_token, data, priority='batch')
+        filters = {
+            'extensions': data.get('extensions', DEFAULT_EXTENSIONS),
+            'max_files': data.get('max_files', 50),
+            'max_file_size': data.get('max_file_size', DEFAULT_MAX_FILE_SIZE)
+        }
+        result = {
+            'repository': repo_name,
+            'ref': data.get('ref') or source.default_ref()
+        }
+
+        analysis = data.get('analysis')
+        if analysis and analysis.get('mode') == 'retrieval':
+            # Chat can reach the repository's index by this id, with the same API key (or GitHub token without one)
+            analysis = dict(analysis, index_id=analysis.get('index_id') or repository_index_id(repo_name),
+                            github_token=github_token)
+        if analysis and analysis.get('mode', 'map_reduce') == 'map_reduce' and get_snapshot_store():
+            return _incremental_analysis(context, source, repo_name, github_token, data, filters, result)
+
+        entries, truncated = source.list_files(result['ref'], **filters)
+        context.update(files_total=len(entries))
+        context.check_cancelled()
+
+        files = _download_files(context, source, result['ref'], entries, data)
+        context.check_cancelled()
+
+        result.update(total_files=len(files), truncated=truncated)
+        if analysis:
+            result['files'] = [_file_summary(file) for file in files]
+            result['analysis'] = _analyze_files(context, analysis, files)
+        else:
+            result['files'] = files
+        return result
+
+    return task
+
+
+def analyze_multiple_task(data):
+    """Build the task for a multi-file analysis request"""
+    if not data.get('files'):
+        raise ValueError('Files array required')
+    _validate_analysis(data)
+
+    def task(context):
+        files = data.get('files', [])
+        context.update(files_total=len(files), files_fetched=len(files))
+        return _analyze_files(context, data, files)
+
+    return task
+
+
+def analyze_batch_task(data):
+    """Build the task for a batch analysis through the provider's Batch API"""
+    batch = prepare_provider_batch(data)
+
+    def task(context):
+        unique = len(batch['groups'])
+        context.update(files_total=unique, files_fetched=unique)
+        run = start_provider_batch(
+            batch,
+            on_item_done=lambda: context.increment('files_analyzed'),
+            check_cancelled=context.check_cancelled
+        )
+
+        def poll(context):
+            # The provider may take up to 24 hours; between checks the job holds no worker
+            result = poll_provider_batch(run, check_cancelled=context.check_cancelled)
+            return result if result is not None else Reschedule(poll, PROVIDER_BATCH_POLL_INTERVAL)
+
+        return poll(context)
+
+    return task
+
+
+def analyze_all_params(repo_name, data):
+    """Job params shown for an analyze-all job"""
+    return dict(data, repository=repo_name)
+
+
+def analyze_multiple_params(data):
+    """Job params shown for an analyze-multiple job; file contents are left out"""
+    return dict(
+        data,
+        files=[file.get('path', 'Unknown') for file in data.get('files', [])]
+    )
+
+
+def analyze_batch_params(data):
+    """Job params shown for a batch job; item code is left out"""
+    return dict(
+        data,
+        items=[item.get('id', index) for index, item in enumerate(data.get('items', [])) if isinstance(item, dict)]
+    )
@@ -1,21 +1,30 @@
 """LLM package for code analysis functionality"""
 
-from .providers import DEFAULT_PROVIDERS, get_llm
-from .analysis import analyze_code, analyze_multiple_files, get_conversation_memory, clear_session_memory, get_all_sessions, get_session_history
-from .chat import handle_chat_followup
-from .connection_test import test_llm_connection
+from .providers import DEFAULT_PROVIDERS, get_llm, clear_llm_cache
+from .analysis import analyze_code, stream_analysis, analyze_multiple_files, analyze_code_async, astream_analysis, analyze_multiple_files_async, get_conversation_memory, clear_session_memory, get_all_sessions, get_session_history
+from .chat import handle_chat_followup, stream_chat_followup, handle_chat_followup_async, astream_chat_followup
+from .connection_test import test_llm_connection, test_llm_connection_async
 from .error_handling import handle_llm_error
 
 __all__ = [
     'DEFAULT_PROVIDERS',
     'get_llm',
+    'clear_llm_cache',
     'analyze_code',
+    'stream_analysis',
     'analyze_multiple_files',
+    'analyze_code_async',
+    'astream_analysis',
+    'analyze_multiple_files_async',
     'get_conversation_memory',
     'clear_session_memory',
     'get_all_sessions',
     'get_session_history',
     'handle_chat_followup',
+    'stream_chat_followup',
+    'handle_chat_followup_async',
+    'astream_chat_followup',
     'test_llm_connection',
+    'test_llm_connection_async',
     'handle_llm_error'
 ]
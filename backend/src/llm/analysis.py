@@ -1,31 +1,52 @@
 """Code analysis functionality"""
 
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from langchain_core.prompts import ChatPromptTemplate
-from .providers import get_llm, get_model_context_limits, DEFAULT_PROVIDERS
-from .prompts import ANALYSIS_PROMPTS, SYSTEM_INSTRUCTIONS
+from .providers import get_llm, fingerprint, DEFAULT_PROVIDERS
+from .prompts import ANALYSIS_PROMPTS, SYSTEM_INSTRUCTIONS, RETRIEVAL_QUERIES
+from .response_cache import get_response_cache, make_cache_key
+from .map_reduce import map_files, reduce_results, map_files_async, reduce_results_async, resolve_concurrency, iter_map_files, aiter_map_files
+from .tokens import count_tokens, fit_code_to_budget, code_token_budget
+from .chunking import detect_language, split_code, number_lines
+from .code_index import CODE_INDEX_TOP_K, CODE_INDEX_CONTEXT_TOKENS, get_code_index, get_embeddings, format_chunks, index_scope, session_index_id
+from .sessions import SessionMemory, get_session_store
+from .single_flight import SingleFlight
+from .metrics import PROMPT_BUILD_SECONDS, RESPONSE_CACHE_REQUESTS, TokenUsage
 
-# Simple message storage class to replace deprecated ConversationBufferMemory
-class SimpleMemory:
-    def __init__(self):
-        self.messages = []
+# Share of the code budget left after the chunk header that numbered chunk code is sized to;
+# the rest absorbs token count differences between a chunk's lines counted apart and together
+CHUNK_BUDGET_RATIO = 0.95
 
-    def add_user_message(self, message):
-        self.messages.append({"type": "human", "content": message})
+# Completion tokens reserved when sizing retrieved context (the largest get_llm default)
+RETRIEVAL_COMPLETION_TOKENS = 4000
 
-    def add_ai_message(self, message):
-        self.messages.append({"type": "ai", "content": message})
+# Identical analyses already in flight are shared instead of sent to the provider again
+_in_flight = SingleFlight()
 
-    def get_messages(self):
-        return self.messages
+def _raise_friendly_error(llm_error):
+    """Re-raise common provider errors with a user-facing message"""
+    error_message = str(llm_error).lower()
 
-    def clear(self):
-        self.messages = []
+    if 'rate limit' in error_message:
+        raise Exception('Rate limit exceeded. Please wait a moment and try again.') from llm_error
+    elif 'api key' in error_message or 'authentication' in error_message:
+        raise Exception('Invalid API key. Please check your API key configuration.') from llm_error
+    elif 'quota' in error_message or 'billing' in error_message:
+        raise Exception('API quota exceeded or billing issue. Please check your account.') from llm_error
+    else:
+        raise llm_error
 
-# Global memory storage for conversations (in production, use a database)
-conversation_memories = {}
+def prepare_analysis(data, priority='default', remember=True):
+    """Validate the request and build the LLM, prompt messages and cache key for an analysis
 
-def analyze_code(data):
-    """Analyze code and provide suggestions"""
+    remember=False keeps the analysis out of the session's conversation memory.
+    The returned job is answered by run_analysis, or by cached_analysis and
+    record_analysis around a provider call made elsewhere (the Batch API).
+    """
+    started = time.perf_counter()
     code = data.get('code')
     analysis_type = data.get('type', 'general')
     session_id = data.get('session_id', 'default')
@@ -40,6 +61,7 @@ def analyze_code(data):
     top_p = data.get('top_p')
     frequency_penalty = data.get('frequency_penalty')
     presence_penalty = data.get('presence_penalty')
+    use_cache = data.get('cache', True) is not False
 
     if not code:
         raise ValueError('Code content required')
@@ -66,79 +88,377 @@ def analyze_code(data):
         max_tokens=max_tokens,
         top_p=top_p,
         frequency_penalty=frequency_penalty,
-        presence_penalty=presence_penalty
+        presence_penalty=presence_penalty,
+        priority=priority,
+        fallbacks=data.get('fallbacks')
     )
     
-    # Get or create conversation memory for this session
-    if session_id not in conversation_memories:
-        conversation_memories[session_id] = SimpleMemory()
-
-    memory = conversation_memories[session_id]
-    
     prompt_template = ChatPromptTemplate.from_messages([
         ("system", SYSTEM_INSTRUCTIONS.get(analysis_type, SYSTEM_INSTRUCTIONS['general'])),
         ("human", ANALYSIS_PROMPTS.get(analysis_type, ANALYSIS_PROMPTS['general']))
     ])
     
-    # Check for context length issues and truncate if necessary
-    try:
-        messages = prompt_template.format_messages(code=code)
+    resolved_model = model or DEFAULT_PROVIDERS.get(provider, DEFAULT_PROVIDERS['openai'])['default_model']
+    cache_params = {
+        'provider': provider,
+        'model': resolved_model,
+        'base_url': base_url,
+        'temperature': temperature,
+        'max_tokens': max_tokens,
+        'top_p': top_p,
+        'frequency_penalty': frequency_penalty,
+        'presence_penalty': presence_penalty,
+        # Responses are only shared between callers with the same key, so one caller's answer
+        # (or auth, quota or rate-limit error) is never served to another
+        'credential': fingerprint(api_key)
+    }
 
-        # Estimate token count (rough approximation: 1 token ≈ 4 characters)
-        estimated_tokens = len(str(messages)) // 4
-        model_context_limits = get_model_context_limits()
+    # Fit code + prompt + completion into the model's context window up front,
+    # so the first call does not fail on context length
+    fitted = fit_code_to_budget(
+        prompt_template, code, resolved_model, max_tokens, context_limit=data.get('context_limit')
+    )
+    messages = fitted['messages']
 
-        # Get context limit for current model
-        context_limit = model_context_limits.get(model, 4096)
+    # Code that does not fit is split on syntactic boundaries and analyzed in parts
+    chunks = []
+    if fitted['truncated'] and data.get('chunking', True) is not False:
+        language = data.get('language') or detect_language(code, data.get('filename'))
+        chunk_budget = fitted['code_budget'] - _chunk_header_tokens(code, resolved_model)
+        chunks = split_code(code, int(chunk_budget * CHUNK_BUDGET_RATIO), language, resolved_model, numbered=True)
+        if len(chunks) < 2:
+            chunks = []
+    cache_params['chunked'] = bool(chunks)
+    # Chunk prompts are built up front so a chunk cut short is reported even on a cache hit
+    chunk_prompts = [
+        _chunk_prompt(prompt_template, chunks, index, resolved_model, max_tokens, fitted['context_limit'])
+        for index in range(len(chunks))
+    ]
+    truncated_chunks = [
+        [chunks[index]['start_line'], chunks[index]['end_line']]
+        for index, chunk_fitted in enumerate(chunk_prompts) if chunk_fitted['truncated']
+    ]
 
-        # If estimated tokens exceed 70% of context limit, truncate code
-        if estimated_tokens > context_limit * 0.7:
-            max_code_length = int((context_limit * 0.7 - 1000) * 4)  # Reserve 1000 tokens for prompt
-            if len(code) > max_code_length:
-                truncated_code = code[:max_code_length] + "\n\n... [Code truncated due to length limits] ..."
-                messages = prompt_template.format_messages(code=truncated_code)
+    job = {
+        'llm': llm,
+        'code': code,
+        'analysis_type': analysis_type,
+        'session_id': session_id,
+        'provider': provider,
+        'model': resolved_model,
+        'prompt_template': prompt_template,
+        'messages': messages,
+        'cache_key': make_cache_key(messages, cache_params),
+        'use_cache': use_cache,
+        'remember': remember,
+        'max_tokens': max_tokens,
+        'prompt_tokens': fitted['prompt_tokens'],
+        'context_limit': fitted['context_limit'],
+        'truncated': (fitted['truncated'] and not chunks) or bool(truncated_chunks),
+        'chunks': chunks,
+        'chunk_messages': [chunk_fitted['messages'] for chunk_fitted in chunk_prompts],
+        'truncated_chunks': truncated_chunks,
+        'failed_chunks': [],
+        'concurrency': data.get('concurrency'),
+        'usage': TokenUsage()
+    }
+    PROMPT_BUILD_SECONDS.observe(time.perf_counter() - started, operation='analysis')
+    return job
+
+def _chunk_header(part, parts, total_lines, start_line, end_line):
+    return (
+        f"This is part {part} of {parts} of a {total_lines}-line file "
+        f"(lines {start_line}-{end_line}). Line numbers from the original file "
+        f"are shown on the left; cite them in your findings.\n\n"
+    )
+
+def _chunk_header_tokens(code, model):
+    """Tokens of the longest chunk header a file can get, with every number at its largest"""
+    total_lines = len(code.splitlines())
+    return count_tokens(_chunk_header(total_lines, total_lines, total_lines, total_lines, total_lines), model)
+
+def _chunk_prompt(prompt_template, chunks, index, model, max_tokens, context_limit):
+    """Fit the prompt for one chunk of a large file, with line numbers from the original file"""
+    chunk = chunks[index]
+    header = _chunk_header(index + 1, len(chunks), chunks[-1]['end_line'], chunk['start_line'], chunk['end_line'])
+    return fit_code_to_budget(
+        prompt_template, header + number_lines(chunk['code'], chunk['start_line']),
+        model, max_tokens, context_limit=context_limit
+    )
 
-        response = llm.invoke(messages)
+def _chunk_section(job, index, content, chunk_error=None):
+    """Format one chunk's findings as a markdown section"""
+    chunk = job['chunks'][index]
+    if chunk_error is not None:
+        job['failed_chunks'].append([chunk['start_line'], chunk['end_line']])
+        content = f"_Analysis failed for this section: {chunk_error}_"
+    elif [chunk['start_line'], chunk['end_line']] in job['truncated_chunks']:
+        content = f"_The end of this section did not fit the context window and was not analyzed._\n\n{content}"
+    return f"## Lines {chunk['start_line']}-{chunk['end_line']}\n\n{content}\n\n"
 
+def _iter_chunk_sections(job):
+    """Analyze chunks concurrently, yielding one markdown section per chunk in file order
+
+    Failed chunks are listed in job['failed_chunks'], which keeps the partial report out of the cache.
+    """
+    chunks = job['chunks']
+    workers = min(resolve_concurrency(job['concurrency']), len(chunks))
+
+    def run(index):
+        try:
+            response = job['llm'].invoke(job['chunk_messages'][index])
+            job['usage'].add(response)
+            return response.content, None
+        except Exception as chunk_error:
+            return None, chunk_error
+
+    failures = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for index, (content, chunk_error) in enumerate(executor.map(run, range(len(chunks)))):
+            if chunk_error is not None:
+                failures.append(chunk_error)
+            yield _chunk_section(job, index, content, chunk_error)
+
+    if len(failures) == len(chunks):
+        _raise_friendly_error(failures[0])
+
+def _analyze_chunks(job):
+    """Analyze every chunk of a large file and merge the sections"""
+    return ''.join(_iter_chunk_sections(job)).rstrip()
+
+def cached_analysis(job):
+    """Look up a cached analysis, counting hits and misses"""
+    cached_content = get_response_cache().get(job['cache_key'])
+    RESPONSE_CACHE_REQUESTS.inc(result='hit' if cached_content is not None else 'miss')
+    return cached_content
+
+def record_analysis(job, analysis_content, cached, coalesced=False):
+    """Cache the analysis, store it in the session memory and build the response payload"""
+    # A report with failed sections is not cached; the next request retries them
+    if job['use_cache'] and not cached and not coalesced and not job['failed_chunks']:
+        get_response_cache().set(job['cache_key'], analysis_content)
+    if coalesced:
+        RESPONSE_CACHE_REQUESTS.inc(result='coalesced')
+
+    # Store in conversation memory with truncated version for memory efficiency
+    if job['remember']:
+        code = job['code']
+        memory = get_conversation_memory(job['session_id'])
+        memory_code = code[:200] + "..." if len(code) > 200 else code
+        memory.add_user_message(f"Analyze this {job['analysis_type']} code: {memory_code}")
+        memory.add_ai_message(analysis_content[:1000] + "..." if len(analysis_content) > 1000 else analysis_content)
+
+    usage = job['usage'].to_dict()
+    return {
+        'analysis': analysis_content,
+        'type': job['analysis_type'],
+        'session_id': job['session_id'],
+        'provider': job['provider'],
+        'model': job['model'],
+        'cached': cached,
+        'coalesced': coalesced,
+        # Provider-reported usage; the prompt token count when none was reported (e.g. cached)
+        'tokens_used': usage['total_tokens'] if usage else job['prompt_tokens'],
+        'usage': usage,
+        'context_limit': job['context_limit'],
+        'truncated': job['truncated'],
+        'chunks': len(job['chunks']),
+        # [start_line, end_line] of chunks cut short to fit the context window
+        'truncated_chunks': job['truncated_chunks'],
+        # [start_line, end_line] of chunks whose analysis failed
+        'failed_chunks': job['failed_chunks']
+    }
+
+def _invoke_analysis(job):
+    """Run the provider call(s) for an analysis and return the analysis text"""
+    llm = job['llm']
+
+    if job['chunks']:
+        return _analyze_chunks(job)
+
+    try:
+        response = llm.invoke(job['messages'])
     except Exception as llm_error:
         # Handle specific LLM errors
         error_message = str(llm_error).lower()
 
         if 'context length' in error_message or 'token limit' in error_message:
-            # Try with truncated code
-            max_code_length = len(code) // 2
-            truncated_code = code[:max_code_length] + "\n\n... [Code truncated due to context length limits] ..."
-            messages = prompt_template.format_messages(code=truncated_code)
-            response = llm.invoke(messages)
-        elif 'rate limit' in error_message:
-            raise Exception('Rate limit exceeded. Please wait a moment and try again.') from llm_error
-        elif 'api key' in error_message or 'authentication' in error_message:
-            raise Exception('Invalid API key. Please check your API key configuration.') from llm_error
-        elif 'quota' in error_message or 'billing' in error_message:
-            raise Exception('API quota exceeded or billing issue. Please check your account.') from llm_error
+            # The provider's window is smaller than configured; retry at half the budget
+            fitted = fit_code_to_budget(
+                job['prompt_template'], job['code'], job['model'], job['max_tokens'],
+                context_limit=job['context_limit'], budget_scale=0.5
+            )
+            job['truncated'] = True
+            response = llm.invoke(fitted['messages'])
         else:
-            raise llm_error
+            _raise_friendly_error(llm_error)
 
-    # Store in conversation memory with truncated version for memory efficiency
-    memory_code = code[:200] + "..." if len(code) > 200 else code
-    memory.add_user_message(f"Analyze this {analysis_type} code: {memory_code}")
-    memory.add_ai_message(response.content[:1000] + "..." if len(response.content) > 1000 else response.content)
+    job['usage'].add(response)
+    return response.content
 
-    return {
-        'analysis': response.content,
-        'type': analysis_type,
-        'session_id': session_id,
-        'provider': provider,
-        'model': model or DEFAULT_PROVIDERS[provider]['default_model'],
-        'tokens_used': estimated_tokens if 'estimated_tokens' in locals() else None,
-        'context_limit': context_limit if 'context_limit' in locals() else None
-    }
+def analyze_code(data):
+    """Analyze code and provide suggestions"""
+    return run_analysis(prepare_analysis(data))
+
+def run_analysis(job):
+    """Answer a prepared analysis from the cache, an identical in-flight call, or the provider"""
+    if not job['use_cache']:
+        return record_analysis(job, _invoke_analysis(job), cached=False)
+
+    cached_content = cached_analysis(job)
+    if cached_content is not None:
+        return record_analysis(job, cached_content, cached=True)
+
+    analysis_content, coalesced = _in_flight.do(job['cache_key'], lambda: _invoke_analysis(job))
+    return record_analysis(job, analysis_content, cached=False, coalesced=coalesced)
+
+def stream_analysis(data):
+    """Analyze code, yielding tokens as they arrive and the final result last
+
+    The request is validated before this returns, so a bad request raises
+    here rather than part-way through the stream. The returned generator
+    yields ('token', text) tuples followed by a single ('done', result)
+    tuple, where result matches the analyze_code response.
+    """
+    return _stream_job(prepare_analysis(data))
+
+def _stream_job(job):
+    cached_content = cached_analysis(job) if job['use_cache'] else None
+    if cached_content is not None:
+        yield 'token', cached_content
+        yield 'done', record_analysis(job, cached_content, cached=True)
+        return
+
+    parts = []
+    if job['chunks']:
+        # Chunks run concurrently; each section is flushed as soon as it is next in file order
+        for section in _iter_chunk_sections(job):
+            parts.append(section)
+            yield 'token', section
+        yield 'done', record_analysis(job, ''.join(parts).rstrip(), cached=False)
+        return
+
+    try:
+        for chunk in job['llm'].stream(job['messages']):
+            job['usage'].add(chunk)
+            if chunk.content:
+                parts.append(chunk.content)
+                yield 'token', chunk.content
+    except Exception as llm_error:
+        _raise_friendly_error(llm_error)
+
+    yield 'done', record_analysis(job, ''.join(parts), cached=False)
+
+async def _aiter_chunk_sections(job):
+    """Async counterpart of _iter_chunk_sections, bounded by a semaphore instead of a thread pool"""
+    chunks = job['chunks']
+    semaphore = asyncio.Semaphore(resolve_concurrency(job['concurrency']))
+
+    async def run(index):
+        async with semaphore:
+            try:
+                response = await job['llm'].ainvoke(job['chunk_messages'][index])
+                job['usage'].add(response)
+                return response.content, None
+            except Exception as chunk_error:
+                return None, chunk_error
+
+    tasks = [asyncio.ensure_future(run(index)) for index in range(len(chunks))]
+    failures = []
+    try:
+        for index, task in enumerate(tasks):
+            content, chunk_error = await task
+            if chunk_error is not None:
+                failures.append(chunk_error)
+            yield _chunk_section(job, index, content, chunk_error)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    if len(failures) == len(chunks):
+        _raise_friendly_error(failures[0])
+
+async def _ainvoke_analysis(job):
+    """Async counterpart of _invoke_analysis"""
+    llm = job['llm']
+
+    if job['chunks']:
+        sections = [section async for section in _aiter_chunk_sections(job)]
+        return ''.join(sections).rstrip()
+
+    try:
+        response = await llm.ainvoke(job['messages'])
+    except Exception as llm_error:
+        error_message = str(llm_error).lower()
+
+        if 'context length' in error_message or 'token limit' in error_message:
+            fitted = fit_code_to_budget(
+                job['prompt_template'], job['code'], job['model'], job['max_tokens'],
+                context_limit=job['context_limit'], budget_scale=0.5
+            )
+            job['truncated'] = True
+            response = await llm.ainvoke(fitted['messages'])
+        else:
+            _raise_friendly_error(llm_error)
 
-def analyze_multiple_files(data):
-    """Analyze multiple files and provide comprehensive analysis"""
-    files = data.get('files', [])
+    job['usage'].add(response)
+    return response.content
+
+async def analyze_code_async(data):
+    """Non-blocking analyze_code for the ASGI serving path
+
+    Prompt building (tokenizing) and the response cache and session writes
+    run on worker threads; only the provider calls run on the event loop.
+    """
+    job = await asyncio.to_thread(prepare_analysis, data)
+
+    if not job['use_cache']:
+        return await asyncio.to_thread(record_analysis, job, await _ainvoke_analysis(job), cached=False)
+
+    cached_content = await asyncio.to_thread(cached_analysis, job)
+    if cached_content is not None:
+        return await asyncio.to_thread(record_analysis, job, cached_content, cached=True)
+
+    analysis_content, coalesced = await _in_flight.do_async(job['cache_key'], lambda: _ainvoke_analysis(job))
+    return await asyncio.to_thread(record_analysis, job, analysis_content, cached=False, coalesced=coalesced)
+
+async def astream_analysis(data):
+    """Async counterpart of stream_analysis, returning an async generator once the request is validated"""
+    return _astream_job(await asyncio.to_thread(prepare_analysis, data))
+
+async def _astream_job(job):
+    cached_content = await asyncio.to_thread(cached_analysis, job) if job['use_cache'] else None
+    if cached_content is not None:
+        yield 'token', cached_content
+        yield 'done', await asyncio.to_thread(record_analysis, job, cached_content, cached=True)
+        return
+
+    parts = []
+    if job['chunks']:
+        async for section in _aiter_chunk_sections(job):
+            parts.append(section)
+            yield 'token', section
+        yield 'done', await asyncio.to_thread(record_analysis, job, ''.join(parts).rstrip(), cached=False)
+        return
+
+    try:
+        async for chunk in job['llm'].astream(job['messages']):
+            job['usage'].add(chunk)
+            if chunk.content:
+                parts.append(chunk.content)
+                yield 'token', chunk.content
+    except Exception as llm_error:
+        _raise_friendly_error(llm_error)
+
+    yield 'done', await asyncio.to_thread(record_analysis, job, ''.join(parts), cached=False)
+
+def _prepare_multiple(data, files=None):
+    """Validate a multi-file request and build its LLM; files, if given, replaces data['files']"""
+    started = time.perf_counter()
+    files = data.get('files', []) if files is None else files
     analysis_type = data.get('type', 'general')
     session_id = data.get('session_id', 'default')
+    mode = data.get('mode', 'combined')
     
     # LLM configuration from request
     provider = data.get('provider', 'openai')
@@ -158,15 +478,35 @@ def analyze_multiple_files(data):
         model=model,
         api_key=api_key,
         base_url=base_url,
-        temperature=temperature
+        temperature=temperature,
+        priority='batch',
+        fallbacks=data.get('fallbacks')
     )
-    
-    # Get or create conversation memory for this session
-    if session_id not in conversation_memories:
-        conversation_memories[session_id] = SimpleMemory()
 
-    memory = conversation_memories[session_id]
-    
+    job = {
+        'llm': llm,
+        'files': files,
+        'analysis_type': analysis_type,
+        'session_id': session_id,
+        'mode': mode,
+        'concurrency': data.get('concurrency'),
+        'provider': provider,
+        'model': model or DEFAULT_PROVIDERS[provider]['default_model']
+    }
+    if mode == 'retrieval':
+        job.update(
+            embeddings=get_embeddings(data),
+            index_id=data.get('index_id') or session_index_id(session_id),
+            index_scope=index_scope(data),
+            query=data.get('query'),
+            top_k=data.get('top_k') or CODE_INDEX_TOP_K,
+            context_tokens=data.get('context_tokens') or CODE_INDEX_CONTEXT_TOKENS
+        )
+    PROMPT_BUILD_SECONDS.observe(time.perf_counter() - started, operation='multiple_files')
+    return job
+
+def _combined_messages(files):
+    """Build the single-prompt analysis of the head of up to 10 files"""
     # Prepare files summary for analysis
     files_summary = ""
     for i, file in enumerate(files[:10]):  # Limit to 10 files to avoid token limits
@@ -176,7 +516,7 @@ def analyze_multiple_files(data):
     
     prompt_template = ChatPromptTemplate.from_messages([
         ("system", "You are an expert programmer analyzing multiple files from a codebase. Provide comprehensive analysis covering overall architecture, patterns, and improvements."),
-        ("human", f"""Analyze the following codebase files and provide:
+        ("human", """Analyze the following codebase files and provide:
         1. Overall code quality assessment
         2. Architecture and design patterns used
         3. Common issues across files
@@ -188,61 +528,199 @@ def analyze_multiple_files(data):
         Files to analyze:
         {files_summary}""")
     ])
-    
-    # Get LLM response
-    response = llm.invoke(prompt_template.format_messages())
-    
-    # Store in conversation memory
+    return prompt_template.format_messages(files_summary=files_summary)
+
+def _retrieval_messages(job):
+    """Index the files and build a prompt from the chunks most relevant to the analysis type or query"""
+    index = get_code_index(job['index_id'], job['embeddings'], job['index_scope'])
+    indexed = index.update(job['files'], job['embeddings'])
+    index.save()
+
+    query = job['query'] or RETRIEVAL_QUERIES.get(job['analysis_type'], RETRIEVAL_QUERIES['general'])
+    prompt_template = ChatPromptTemplate.from_messages([
+        ("system", SYSTEM_INSTRUCTIONS.get(job['analysis_type'], SYSTEM_INSTRUCTIONS['general']) +
+         " You are given the parts of a codebase most relevant to the review rather than every file; refer to files by path."),
+        ("human", """Analyze the following code from a codebase and provide:
+        1. Overall code quality assessment
+        2. Architecture and design patterns used
+        3. Common issues across files
+        4. Consistency in coding style
+        5. Recommendations for improvement
+        6. Security considerations
+        7. Performance optimization opportunities
+
+        Code retrieved as most relevant to: {query}
+        {code}""")
+    ]).partial(query=query)
+
+    budget, _ = code_token_budget(prompt_template, job['model'], RETRIEVAL_COMPLETION_TOKENS)
+    chunks = index.search(query, job['embeddings'], top_k=job['top_k'], max_tokens=min(budget, job['context_tokens']))
+    job['retrieval'] = dict(
+        indexed,
+        index_id=job['index_id'],
+        query=query,
+        chunks_retrieved=len(chunks),
+        files_retrieved=len({chunk['path'] for chunk in chunks}),
+        context_tokens=sum(chunk['tokens'] for chunk in chunks)
+    )
+    return prompt_template.format_messages(code=format_chunks(chunks))
+
+def _record_multiple(job, analysis_content, file_results=None):
+    """Store a multi-file analysis in the session memory and build the response payload"""
+    files = job['files']
+    memory = get_conversation_memory(job['session_id'])
     memory.add_user_message(f"Analyze {len(files)} files from codebase")
-    memory.add_ai_message(response.content)
-    
-    return {
-        'analysis': response.content,
+    memory.add_ai_message(analysis_content)
+
+    result = {
+        'analysis': analysis_content,
         'type': 'multiple_files',
+        'mode': job['mode'],
         'files_analyzed': len(files),
-        'session_id': session_id,
-        'provider': provider,
-        'model': model or DEFAULT_PROVIDERS[provider]['default_model']
+        'session_id': job['session_id'],
+        'provider': job['provider'],
+        'model': job['model']
     }
+    if file_results is not None:
+        result['files_analyzed'] = sum(1 for file_result in file_results if 'analysis' in file_result)
+        result['files_failed'] = sum(1 for file_result in file_results if 'error' in file_result)
+        result['file_results'] = file_results
+        reused = sum(1 for file_result in file_results if file_result.get('reused'))
+        if reused:
+            result['files_reused'] = reused
+    if job.get('retrieval'):
+        result['retrieval'] = job['retrieval']
+    return result
+
+def _merge_file_results(files, previous_results, mapped):
+    """Per-file results in input order, taking reused ones from previous_results"""
+    mapped = iter(mapped)
+    return [
+        dict(previous_results[file.get('path')], reused=True) if file.get('path') in previous_results else next(mapped)
+        for file in files
+    ]
+
+def analyze_multiple_files(data, on_file_result=None, previous_results=None):
+    """Analyze multiple files and provide comprehensive analysis
+
+    The default 'combined' mode sends one prompt with the head of up to 10 files.
+    The 'retrieval' mode indexes every file in the local code index and sends
+    one prompt with the chunks most relevant to the analysis type (or
+    'query'), within the model's token budget. The 'map_reduce' mode analyzes every file concurrently (bounded by
+    'concurrency') and then synthesizes the per-file results; on_file_result
+    is called as each file's analysis completes. previous_results maps paths
+    to per-file results that are still valid; those files are not analyzed
+    again and need no content.
+    """
+    job = _prepare_multiple(data)
+    llm = job['llm']
+
+    if job['mode'] == 'map_reduce':
+        previous_results = previous_results or {}
+        pending = [file for file in job['files'] if file.get('path') not in previous_results]
+        mapped = map_files(
+            llm, pending, job['analysis_type'],
+            concurrency=job['concurrency'], on_result=on_file_result
+        ) if pending else []
+        file_results = _merge_file_results(job['files'], previous_results, mapped)
+        return _record_multiple(job, reduce_results(llm, file_results), file_results)
+
+    if job['mode'] == 'retrieval':
+        response = llm.invoke(_retrieval_messages(job))
+        return _record_multiple(job, response.content)
+
+    job['mode'] = 'combined'
+    response = llm.invoke(_combined_messages(job['files']))
+    return _record_multiple(job, response.content)
+
+def _file_record(file, file_result):
+    """Per-file stream record: the file's metadata and its analysis or error, without its content"""
+    return dict({key: file.get(key) for key in ('name', 'path', 'sha', 'size')}, **file_result)
+
+def _streamed_result(job, file_results, analysis_content):
+    job['files'] = file_results
+    result = _record_multiple(job, analysis_content, file_results)
+    # Per-file analyses were already sent as they completed
+    del result['file_results']
+    return result
+
+def iter_map_reduce(data, files):
+    """Map-reduce analysis of a stream of files, holding only a small window of them at a time
+
+    files may be any iterable, such as a generator of downloads. Validation
+    errors are raised before the first result. Yields ('file', record) for
+    each file in input order as soon as its analysis completes, the record
+    holding the file's metadata and 'analysis' or 'error' but not its
+    content, then ('done', result) with the synthesis.
+    """
+    job = _prepare_multiple(dict(data, mode='map_reduce'), files=files)
+
+    def run():
+        file_results = []
+        for file, file_result in iter_map_files(job['llm'], files, job['analysis_type'], concurrency=job['concurrency']):
+            file_results.append(file_result)
+            yield 'file', _file_record(file, file_result)
+        yield 'done', _streamed_result(job, file_results, reduce_results(job['llm'], file_results))
+
+    return run()
+
+def aiter_map_reduce(data, files):
+    """Async counterpart of iter_map_reduce for an async iterable of files"""
+    job = _prepare_multiple(dict(data, mode='map_reduce'), files=files)
+
+    async def run():
+        file_results = []
+        async for file, file_result in aiter_map_files(job['llm'], files, job['analysis_type'], concurrency=job['concurrency']):
+            file_results.append(file_result)
+            yield 'file', _file_record(file, file_result)
+        analysis_content = await reduce_results_async(job['llm'], file_results)
+        yield 'done', await asyncio.to_thread(_streamed_result, job, file_results, analysis_content)
+
+    return run()
+
+async def analyze_multiple_files_async(data):
+    """Non-blocking analyze_multiple_files for the ASGI serving path"""
+    job = _prepare_multiple(data)
+    llm = job['llm']
+
+    if job['mode'] == 'map_reduce':
+        file_results = await map_files_async(
+            llm, job['files'], job['analysis_type'], concurrency=job['concurrency']
+        )
+        return await asyncio.to_thread(_record_multiple, job, await reduce_results_async(llm, file_results), file_results)
+
+    if job['mode'] == 'retrieval':
+        # Indexing embeds and writes files; keep it off the event loop
+        messages = await asyncio.to_thread(_retrieval_messages, job)
+        response = await llm.ainvoke(messages)
+        return await asyncio.to_thread(_record_multiple, job, response.content)
+
+    job['mode'] = 'combined'
+    response = await llm.ainvoke(_combined_messages(job['files']))
+    # Session writes go to the database; keep them off the event loop too
+    return await asyncio.to_thread(_record_multiple, job, response.content)
 
 def get_conversation_memory(session_id):
-    """Get or create conversation memory for a session"""
-    if session_id not in conversation_memories:
-        conversation_memories[session_id] = SimpleMemory()
-    return conversation_memories[session_id]
+    """Get conversation memory for a session in the active session store"""
+    return SessionMemory(get_session_store(), session_id)
 
 def clear_session_memory(session_id):
     """Clear conversation memory for a session"""
-    if session_id in conversation_memories:
-        del conversation_memories[session_id]
-        return True
-    return False
+    return get_session_store().clear(session_id)
 
 def get_all_sessions():
-    """Get list of active sessions"""
-    sessions = []
-    for session_id, memory in conversation_memories.items():
-        message_count = len(memory.get_messages())
-        sessions.append({
-            'session_id': session_id,
-            'message_count': message_count,
-            'last_activity': 'recent'  # In production, track actual timestamps
-        })
-    return sessions
+    """Get list of active sessions, most recently active first"""
+    return get_session_store().list_sessions()
 
 def get_session_history(session_id):
-    """Get conversation history for a session"""
-    if session_id not in conversation_memories:
-        return []
-
-    memory = conversation_memories[session_id]
+    """Get conversation history for a session; compacted earlier turns appear as one 'summary' message"""
     messages = []
 
-    for msg in memory.get_messages():
+    for msg in get_session_store().get_messages(session_id):
         messages.append({
-            'type': 'user' if msg['type'] == 'human' else 'assistant',
+            'type': {'human': 'user', 'summary': 'summary'}.get(msg['type'], 'assistant'),
             'content': msg['content'],
-            'timestamp': 'recent'  # In production, use actual timestamps
+            'timestamp': msg['timestamp']
         })
 
     return messages
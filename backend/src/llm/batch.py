@@ -0,0 +1,292 @@
+"""Batch analysis of many code snippets with shared LLM settings
+
+Items are deduplicated, then either analyzed concurrently with results
+yielded as they complete, or submitted through the OpenAI-compatible Batch
+API (JSONL input file, asynchronous completion, lower cost) for work that
+can wait.
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from types import SimpleNamespace
+
+from openai import OpenAI
+
+from .analysis import prepare_analysis, run_analysis, cached_analysis, record_analysis
+from .error_handling import handle_llm_error
+from .metrics import record_usage
+from .providers import DEFAULT_PROVIDERS, get_http_clients, model_label, provider_label
+
+BATCH_MAX_ITEMS = int(os.getenv('LLM_BATCH_MAX_ITEMS', '5000'))
+DEFAULT_BATCH_CONCURRENCY = int(os.getenv('LLM_BATCH_CONCURRENCY', '8'))
+MAX_BATCH_CONCURRENCY = int(os.getenv('LLM_BATCH_MAX_CONCURRENCY', '32'))
+PROVIDER_BATCH_POLL_INTERVAL = float(os.getenv('LLM_PROVIDER_BATCH_POLL_INTERVAL', '30'))
+PROVIDER_BATCH_COMPLETION_WINDOW = '24h'
+PROVIDER_BATCH_FINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+# Providers whose endpoint implements the OpenAI Files and Batches APIs
+PROVIDER_BATCH_PROVIDERS = ('openai', 'custom')
+
+# Per-item fields; every other request field is a setting shared by all items
+ITEM_FIELDS = ('code', 'type', 'filename', 'language')
+
+MESSAGE_ROLES = {'system': 'system', 'human': 'user', 'ai': 'assistant'}
+
+
+def resolve_batch_concurrency(requested=None):
+    """Clamp a requested batch concurrency to the configured bounds"""
+    try:
+        concurrency = int(requested) if requested is not None else DEFAULT_BATCH_CONCURRENCY
+    except (TypeError, ValueError):
+        concurrency = DEFAULT_BATCH_CONCURRENCY
+    return max(1, min(concurrency, MAX_BATCH_CONCURRENCY))
+
+
+def prepare_batch(data):
+    """Validate a batch request and group its items by content
+
+    Returns (settings, groups): settings are the LLM options shared by all
+    items, and groups is a list of (item request, [(index, id), ...]) with one
+    entry per distinct (code, type, filename, language).
+    """
+    items = data.get('items') or []
+    if not items:
+        raise ValueError('Items array required')
+    if len(items) > BATCH_MAX_ITEMS:
+        raise ValueError(f'Too many items: at most {BATCH_MAX_ITEMS} per batch')
+
+    settings = {key: value for key, value in data.items() if key not in ('items', 'provider_batch', 'concurrency')}
+    if not settings.get('api_key') and settings.get('provider', 'openai') != 'ollama':
+        raise ValueError('API key required. Please configure your API key in Settings.')
+
+    groups = {}
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get('code'):
+            raise ValueError(f'Item {index}: code content required')
+        fields = {key: item[key] for key in ITEM_FIELDS if item.get(key) is not None}
+        key = json.dumps(fields, sort_keys=True)
+        if key not in groups:
+            groups[key] = (dict(settings, **fields), [])
+        groups[key][1].append((index, item.get('id', index)))
+    return settings, list(groups.values())
+
+
+def _item_results(members, payload):
+    """One result line per item sharing an analysis; repeats are marked as deduplicated"""
+    return [
+        dict(payload, index=index, id=item_id, **({'deduplicated': True} if position else {}))
+        for position, (index, item_id) in enumerate(members)
+    ]
+
+
+def _error_payload(error):
+    error_response, status_code = handle_llm_error(error)
+    error_response['status'] = status_code
+    return error_response
+
+
+def _analyze_item(item):
+    return run_analysis(prepare_analysis(item, priority='batch', remember=False))
+
+
+def iter_batch_results(data):
+    """Analyze every distinct item concurrently, yielding per-item results as they complete
+
+    Validation errors are raised before the first result. Each yielded dict
+    has the item's 'index' and 'id' plus either the analyze_code response
+    fields or an 'error'; a final dict with 'done' summarizes the batch.
+    """
+    settings, groups = prepare_batch(data)
+
+    def run():
+        succeeded = failed = 0
+        workers = min(resolve_batch_concurrency(data.get('concurrency')), len(groups))
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch-analysis')
+        try:
+            futures = {executor.submit(_analyze_item, item): members for item, members in groups}
+            for future in as_completed(futures):
+                members = futures[future]
+                try:
+                    payload = future.result()
+                    succeeded += len(members)
+                except Exception as item_error:
+                    payload = _error_payload(item_error)
+                    failed += len(members)
+                yield from _item_results(members, payload)
+        finally:
+            # A client that disconnects stops the items not yet started
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        yield {
+            'done': True,
+            'total': succeeded + failed,
+            'unique': len(groups),
+            'succeeded': succeeded,
+            'failed': failed
+        }
+
+    return run()
+
+
+def _openai_messages(messages):
+    return [{'role': MESSAGE_ROLES.get(message.type, 'user'), 'content': message.content} for message in messages]
+
+
+def _batch_request_line(custom_id, job, settings):
+    body = {
+        'model': job['model'],
+        'messages': _openai_messages(job['messages']),
+        'temperature': settings.get('temperature', 0.7),
+        'max_tokens': job['max_tokens']
+    }
+    for name in ('top_p', 'frequency_penalty', 'presence_penalty'):
+        if settings.get(name) is not None:
+            body[name] = settings[name]
+    return json.dumps({'custom_id': custom_id, 'method': 'POST', 'url': '/v1/chat/completions', 'body': body})
+
+
+def _batch_client(settings):
+    provider = settings.get('provider', 'openai')
+    if provider not in PROVIDER_BATCH_PROVIDERS:
+        raise ValueError(f'Provider batch submission is not supported for {provider}')
+    base_url = settings.get('base_url') or DEFAULT_PROVIDERS[provider]['base_url']
+    if provider == 'custom' and not base_url:
+        raise ValueError('Base URL required for custom providers')
+    http_client, _ = get_http_clients(base_url)
+    return OpenAI(api_key=settings.get('api_key'), base_url=base_url, http_client=http_client)
+
+
+def _read_file_lines(client, file_id):
+    if not file_id:
+        return []
+    return [json.loads(line) for line in client.files.content(file_id).text.splitlines() if line.strip()]
+
+
+def _collect_outputs(client, batch):
+    """Map custom_id to (content, usage) or an error message from a finished batch"""
+    outputs = {}
+    for line in _read_file_lines(client, batch.output_file_id) + _read_file_lines(client, batch.error_file_id):
+        response = line.get('response') or {}
+        body = response.get('body') or {}
+        if response.get('status_code') == 200 and body.get('choices'):
+            outputs[line['custom_id']] = (body['choices'][0]['message'].get('content') or '', body.get('usage'))
+        else:
+            error = line.get('error') or body.get('error') or {}
+            outputs[line['custom_id']] = error.get('message') or f"Request failed with status {response.get('status_code')}"
+    return outputs
+
+
+def prepare_provider_batch(data):
+    """Validate a batch for the provider's Batch API and build its client"""
+    settings, groups = prepare_batch(data)
+    return {'settings': settings, 'groups': groups, 'client': _batch_client(settings)}
+
+
+def _record_batch_output(job, content, usage):
+    # Report usage the way a provider response would, for the metrics and the response payload
+    message = SimpleNamespace(usage_metadata={
+        'input_tokens': usage.get('prompt_tokens', 0),
+        'output_tokens': usage.get('completion_tokens', 0)
+    } if usage else None)
+    job['usage'].add(message)
+    record_usage(message, provider_label(job['provider']), model_label(job['model']))
+    return record_analysis(job, content, cached=False)
+
+
+def start_provider_batch(batch, on_item_done=None, check_cancelled=None):
+    """Answer what can be answered at once and submit the rest through the provider's Batch API
+
+    Cached items are answered right away and items too large for a single
+    prompt are analyzed directly; the rest go into one batch input file.
+    Returns the run's state, to pass to poll_provider_batch until it returns
+    the results.
+    """
+    run = {
+        'client': batch['client'],
+        'groups': batch['groups'],
+        'results': [None] * sum(len(members) for _, members in batch['groups']),
+        'pending': {},
+        'on_item_done': on_item_done,
+        'provider_batch': None
+    }
+    lines = []
+
+    for position, (item, members) in enumerate(batch['groups']):
+        try:
+            job = prepare_analysis(item, priority='batch', remember=False)
+            cached_content = cached_analysis(job) if job['use_cache'] else None
+            if cached_content is not None:
+                _finish_items(run, members, record_analysis(job, cached_content, cached=True))
+            elif job['chunks']:
+                _finish_items(run, members, run_analysis(job))
+            else:
+                custom_id = f"item-{position}"
+                run['pending'][custom_id] = (job, members)
+                lines.append(_batch_request_line(custom_id, job, batch['settings']))
+        except Exception as item_error:
+            _finish_items(run, members, _error_payload(item_error))
+        if check_cancelled:
+            check_cancelled()
+
+    if lines:
+        input_file = run['client'].files.create(
+            file=('analysis-batch.jsonl', '\n'.join(lines).encode('utf-8')), purpose='batch'
+        )
+        run['provider_batch'] = run['client'].batches.create(
+            input_file_id=input_file.id,
+            endpoint='/v1/chat/completions',
+            completion_window=PROVIDER_BATCH_COMPLETION_WINDOW
+        )
+    return run
+
+
+def _finish_items(run, members, payload):
+    for result in _item_results(members, payload):
+        run['results'][result['index']] = result
+    if run['on_item_done']:
+        run['on_item_done']()
+
+
+def poll_provider_batch(run, check_cancelled=None):
+    """Check a started provider batch once; return per-item results in request order once it has finished
+
+    Returns None while the provider is still working; call again later
+    (every PROVIDER_BATCH_POLL_INTERVAL seconds) rather than waiting here.
+    Cancels the provider batch if check_cancelled raises.
+    """
+    client = run['client']
+    provider_batch = run['provider_batch']
+    if provider_batch is not None and provider_batch.status not in PROVIDER_BATCH_FINAL_STATUSES:
+        if check_cancelled:
+            try:
+                check_cancelled()
+            except BaseException:
+                client.batches.cancel(provider_batch.id)
+                raise
+        provider_batch = run['provider_batch'] = client.batches.retrieve(provider_batch.id)
+        if provider_batch.status not in PROVIDER_BATCH_FINAL_STATUSES:
+            return None
+
+    if provider_batch is not None:
+        outputs = _collect_outputs(client, provider_batch)
+        for custom_id, (job, members) in run['pending'].items():
+            output = outputs.get(custom_id)
+            if isinstance(output, tuple):
+                _finish_items(run, members, _record_batch_output(job, *output))
+            else:
+                _finish_items(run, members, {
+                    'error': output or f'Batch {provider_batch.status} before this item finished',
+                    'type': 'batch_error'
+                })
+
+    results = run['results']
+    return {
+        'batch_id': provider_batch.id if provider_batch else None,
+        'batch_status': provider_batch.status if provider_batch else None,
+        'total': len(results),
+        'unique': len(run['groups']),
+        'succeeded': sum(1 for result in results if 'error' not in result),
+        'failed': sum(1 for result in results if 'error' in result),
+        'results': results
+    }
@@ -0,0 +1,113 @@
+"""Thread-safe in-process LRU cache with optional TTL expiry"""
+
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Bounded mapping that evicts least recently used entries and expires stale ones
+
+    Entries are bounded by count (max_size) and, when a weigher is given, by the
+    sum of their weights (max_weight), e.g. bytes for cached file contents.
+    on_evict(key, value), if given, is called outside the lock for entries
+    dropped by the bounds or expiry, e.g. to close a pooled connection.
+    """
+
+    def __init__(self, max_size=128, ttl=None, max_weight=None, weigher=None, on_evict=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_weight = max_weight
+        self.weigher = weigher
+        self.on_evict = on_evict
+        self._entries = OrderedDict()
+        self._weight = 0
+        self._lock = threading.Lock()
+
+    def _weigh(self, value):
+        return self.weigher(value) if self.weigher else 0
+
+    def _remove(self, key):
+        value, _ = self._entries.pop(key)
+        self._weight -= self._weigh(value)
+        return value
+
+    def _evicted(self, entries):
+        if self.on_evict:
+            for key, value in entries:
+                self.on_evict(key, value)
+
+    def _expired(self, stored_at):
+        return self.ttl is not None and self.ttl > 0 and time.monotonic() - stored_at > self.ttl
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+
+            value, stored_at = entry
+            expired = self._expired(stored_at)
+            if expired:
+                self._remove(key)
+            else:
+                self._entries.move_to_end(key)
+
+        if expired:
+            self._evicted([(key, value)])
+            return default
+        return value
+
+    def set(self, key, value):
+        """Store value under key, evicting the oldest entries beyond the bounds"""
+        weight = self._weigh(value)
+        if self.max_weight is not None and weight > self.max_weight:
+            return
+
+        evicted = []
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic())
+            self._weight += weight
+            while len(self._entries) > self.max_size or (
+                    self.max_weight is not None and self._weight > self.max_weight):
+                oldest = next(iter(self._entries))
+                evicted.append((oldest, self._remove(oldest)))
+        self._evicted(evicted)
+
+    def pop(self, key, default=None):
+        """Remove key and return its value"""
+        with self._lock:
+            if key not in self._entries:
+                return default
+            return self._remove(key)
+
+    def items(self):
+        """Return (key, value) pairs of unexpired entries, oldest first"""
+        with self._lock:
+            return [
+                (key, value) for key, (value, stored_at) in self._entries.items()
+                if not self._expired(stored_at)
+            ]
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+            self._weight = 0
+
+    @property
+    def weight(self):
+        """Total weight of the cached entries"""
+        return self._weight
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
@@ -1,11 +1,30 @@
 """Chat functionality for follow-up questions and conversations"""
 
+import asyncio
+import time
+
 from langchain_core.prompts import ChatPromptTemplate
 from .providers import get_llm, DEFAULT_PROVIDERS
 from .analysis import get_conversation_memory
+from .code_index import CODE_INDEX_CHAT_TOKENS, get_code_index, get_embeddings, format_chunks, index_scope, session_index_id
+from .compaction import history_context, schedule_compaction
+from .metrics import PROMPT_BUILD_SECONDS, TokenUsage
 
-def handle_chat_followup(data):
-    """Handle follow-up questions and conversations"""
+def _code_context(data, session_id, message):
+    """Chunks of the session's code index (or the requested 'index_id') relevant to the question"""
+    embeddings = get_embeddings(data)
+    index = get_code_index(data.get('index_id') or session_index_id(session_id), embeddings, index_scope(data),
+                           create=False)
+    if index is None:
+        return ""
+    chunks = index.search(message, embeddings, max_tokens=CODE_INDEX_CHAT_TOKENS)
+    if not chunks:
+        return ""
+    return f"Relevant code from the indexed files:\n{format_chunks(chunks)}\n"
+
+def _prepare_chat(data):
+    """Validate the request and build the LLM and prompt messages for a follow-up"""
+    started = time.perf_counter()
     message = data.get('message')
     session_id = data.get('session_id', 'default')
     
@@ -27,38 +46,108 @@ def handle_chat_followup(data):
         model=model,
         api_key=api_key,
         base_url=base_url,
-        temperature=temperature
+        temperature=temperature,
+        priority='interactive',
+        fallbacks=data.get('fallbacks')
     )
     
     # Get conversation memory for this session
     memory = get_conversation_memory(session_id)
     
-    # Build context from conversation history
-    context = ""
-    messages = memory.get_messages()
-    if messages:
-        context = "Previous conversation context:\n"
-        for msg in messages[-6:]:  # Last 6 messages for context
-            role = "User" if msg['type'] == "human" else "Assistant"
-            content = msg['content'][:300] + "..." if len(msg['content']) > 300 else msg['content']
-            context += f"{role}: {content}\n"
-        context += "\n"
+    # Running summary of earlier turns plus the recent ones, within a fixed token budget
+    context = history_context(memory.get_messages(), model)
+    
+    # Code indexed by a retrieval analysis in this session, limited to what relates to the question
+    code_context = _code_context(data, session_id, message)
     
     prompt_template = ChatPromptTemplate.from_messages([
         ("system", "You are an expert programming assistant. Use the conversation context to provide relevant and helpful responses. Be specific and actionable in your advice."),
-        ("human", f"{context}Current question: {message}")
+        ("human", "{context}{code_context}Current question: {message}")
     ])
     
-    # Get LLM response
-    response = llm.invoke(prompt_template.format_messages())
-    
-    # Update conversation memory
-    memory.add_user_message(message)
-    memory.add_ai_message(response.content)
-    
-    return {
-        'response': response.content,
+    chat = {
+        'llm': llm,
+        'memory': memory,
+        'message': message,
+        'messages': prompt_template.format_messages(context=context, code_context=code_context, message=message),
         'session_id': session_id,
         'provider': provider,
-        'model': model or DEFAULT_PROVIDERS[provider]['default_model']
+        'model': model or DEFAULT_PROVIDERS[provider]['default_model'],
+        'llm_config': {
+            'provider': provider,
+            'model': model,
+            'api_key': api_key,
+            'base_url': base_url,
+            'fallbacks': data.get('fallbacks')
+        },
+        'usage': TokenUsage()
     }
+    PROMPT_BUILD_SECONDS.observe(time.perf_counter() - started, operation='chat')
+    return chat
+
+def _record_chat(chat, response_content):
+    """Update conversation memory and build the response payload"""
+    chat['memory'].add_user_message(chat['message'])
+    chat['memory'].add_ai_message(response_content)
+    # Summarize older turns off the request path once the session outgrows its budget
+    schedule_compaction(chat['session_id'], chat['llm_config'])
+
+    return {
+        'response': response_content,
+        'session_id': chat['session_id'],
+        'provider': chat['provider'],
+        'model': chat['model'],
+        'usage': chat['usage'].to_dict()
+    }
+
+def handle_chat_followup(data):
+    """Handle follow-up questions and conversations"""
+    chat = _prepare_chat(data)
+
+    # Get LLM response
+    response = chat['llm'].invoke(chat['messages'])
+    chat['usage'].add(response)
+
+    return _record_chat(chat, response.content)
+
+def stream_chat_followup(data):
+    """Handle a follow-up question, yielding tokens as they arrive and the final result last
+
+    The request is validated before this returns; the returned generator
+    yields ('token', text) tuples followed by a single ('done', result) tuple.
+    """
+    return _stream_chat(_prepare_chat(data))
+
+def _stream_chat(chat):
+    parts = []
+    for chunk in chat['llm'].stream(chat['messages']):
+        chat['usage'].add(chunk)
+        if chunk.content:
+            parts.append(chunk.content)
+            yield 'token', chunk.content
+
+    yield 'done', _record_chat(chat, ''.join(parts))
+
+
+async def handle_chat_followup_async(data):
+    """Non-blocking handle_chat_followup for the ASGI serving path"""
+    # Retrieval may embed the question; keep it off the event loop
+    chat = await asyncio.to_thread(_prepare_chat, data)
+    response = await chat['llm'].ainvoke(chat['messages'])
+    chat['usage'].add(response)
+    # Session writes go to the database; keep them off the event loop too
+    return await asyncio.to_thread(_record_chat, chat, response.content)
+
+async def astream_chat_followup(data):
+    """Async counterpart of stream_chat_followup, returning an async generator once the request is validated"""
+    return _astream_chat(await asyncio.to_thread(_prepare_chat, data))
+
+async def _astream_chat(chat):
+    parts = []
+    async for chunk in chat['llm'].astream(chat['messages']):
+        chat['usage'].add(chunk)
+        if chunk.content:
+            parts.append(chunk.content)
+            yield 'token', chunk.content
+
+    yield 'done', await asyncio.to_thread(_record_chat, chat, ''.join(parts))
@@ -0,0 +1,189 @@
+"""Structure-aware splitting of large source files into analysis chunks"""
+
+import ast
+import re
+
+from .tokens import count_tokens
+
+# Same extension table as the frontend's languageDetection utility
+LANGUAGE_EXTENSIONS = {
+    'javascript': ['.js', '.jsx', '.mjs', '.ts', '.tsx'],
+    'python': ['.py', '.pyw', '.pyx'],
+    'java': ['.java'],
+    'cpp': ['.cpp', '.cc', '.cxx', '.c++', '.hpp'],
+    'c': ['.c', '.h'],
+    'csharp': ['.cs'],
+    'php': ['.php', '.phtml'],
+    'ruby': ['.rb', '.rbw'],
+    'go': ['.go'],
+    'rust': ['.rs'],
+    'sql': ['.sql'],
+    'html': ['.html', '.htm'],
+    'css': ['.css', '.scss', '.sass', '.less']
+}
+
+LANGUAGE_PATTERNS = {
+    'python': [r'^\s*def\s+\w+\s*\(', r'^\s*class\s+\w+.*:\s*$', r'^\s*from\s+[\w.]+\s+import\s', r'^\s*import\s+\w+'],
+    'javascript': [r'\bfunction\s+\w+\s*\(', r'\b(const|let|var)\s+\w+\s*=', r'=>\s*{', r'\brequire\s*\(', r'^\s*import\s+.*from'],
+    'java': [r'public\s+class\s+\w+', r'System\.out\.print', r'^\s*package\s+[\w.]+;', r'^\s*import\s+java\.'],
+    'cpp': [r'#include\s*<\w+>', r'\bstd::', r'using\s+namespace\s+std', r'\btemplate\s*<'],
+    'c': [r'#include\s*<.*\.h>', r'\btypedef\s+struct\b', r'\bprintf\s*\(', r'\bmalloc\s*\('],
+    'csharp': [r'^\s*using\s+System', r'^\s*namespace\s+[\w.]+', r'Console\.Write', r'\bpublic\s+(partial\s+)?class\s+\w+'],
+    'php': [r'<\?php', r'\$\w+\s*=', r'\bfunction\s+\w+\s*\(.*\$'],
+    'ruby': [r'^\s*def\s+\w+[^:(]*$', r'^\s*end\s*$', r'^\s*require\s+[\'"]', r'\bputs\s'],
+    'go': [r'^\s*package\s+\w+\s*$', r'\bfunc\s+(\(\w+\s+\*?\w+\)\s*)?\w+\s*\(', r':=', r'\bfmt\.'],
+    'rust': [r'\bfn\s+\w+\s*[<(]', r'\blet\s+mut\b', r'\bimpl\b', r'\bpub\s+(fn|struct|enum)\b']
+}
+
+# Languages whose blocks are delimited by braces rather than indentation
+BRACE_LANGUAGES = {'javascript', 'java', 'cpp', 'c', 'csharp', 'php', 'go', 'rust', 'css'}
+
+_STRING_OR_COMMENT = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|`[^`]*`|//.*$|/\*.*?\*/')
+
+
+def detect_language(code, filename=None):
+    """Detect a source language from the file extension, falling back to content patterns"""
+    if filename:
+        lower_name = filename.lower()
+        for language, extensions in LANGUAGE_EXTENSIONS.items():
+            if any(lower_name.endswith(ext) for ext in extensions):
+                return language
+
+    sample = code[:20000]
+    best_language, best_score = 'unknown', 0
+    for language, patterns in LANGUAGE_PATTERNS.items():
+        score = sum(1 for pattern in patterns if re.search(pattern, sample, re.MULTILINE))
+        if score > best_score:
+            best_language, best_score = language, score
+    return best_language
+
+
+def _python_boundaries(lines, code):
+    """Start lines (0-based) of top-level statements, with decorators and leading comments attached"""
+    tree = ast.parse(code)
+    boundaries = []
+    for node in tree.body:
+        start = node.lineno
+        for decorator in getattr(node, 'decorator_list', []):
+            start = min(start, decorator.lineno)
+        start -= 1
+        # Keep comments directly above a definition with it
+        while start > 0 and lines[start - 1].lstrip().startswith('#'):
+            start -= 1
+        boundaries.append(start)
+    return boundaries
+
+
+def _brace_boundaries(lines):
+    """Start lines of top-level blocks, found by tracking brace depth outside strings and comments"""
+    boundaries = []
+    depth = 0
+    in_block_comment = False
+    for index, line in enumerate(lines):
+        if depth == 0 and line.strip() and (index == 0 or not lines[index - 1].strip()):
+            boundaries.append(index)
+
+        text = line
+        if in_block_comment:
+            if '*/' not in text:
+                continue
+            text = text.split('*/', 1)[1]
+            in_block_comment = False
+        text = _STRING_OR_COMMENT.sub('', text)
+        if '/*' in text:
+            text = text.split('/*', 1)[0]
+            in_block_comment = True
+
+        depth = max(0, depth + text.count('{') - text.count('}'))
+    return boundaries
+
+
+def _indent_boundaries(lines):
+    """Start lines of unindented statements that follow a blank line"""
+    return [
+        index for index, line in enumerate(lines)
+        if line.strip() and not line[0].isspace() and (index == 0 or not lines[index - 1].strip())
+    ]
+
+
+def _segment_boundaries(lines, code, language):
+    if language == 'python':
+        try:
+            return _python_boundaries(lines, code)
+        except (SyntaxError, ValueError):
+            return _indent_boundaries(lines)
+    if language in BRACE_LANGUAGES:
+        return _brace_boundaries(lines)
+    return _indent_boundaries(lines)
+
+
+def _segment_tokens(lines, start, end, model, numbered):
+    """Tokens of lines[start:end], as sent: with number_lines prefixes when numbered"""
+    code = ''.join(lines[start:end])
+    return count_tokens(number_lines(code, start + 1) if numbered else code, model)
+
+
+def _split_lines(lines, start, end, max_tokens, model, numbered):
+    """Split an oversized segment on line boundaries"""
+    pieces = []
+    piece_start, piece_tokens = start, 0
+    for index in range(start, end):
+        line_tokens = _segment_tokens(lines, index, index + 1, model, numbered) + 1
+        if piece_tokens and piece_tokens + line_tokens > max_tokens:
+            pieces.append((piece_start, index))
+            piece_start, piece_tokens = index, 0
+        piece_tokens += line_tokens
+    pieces.append((piece_start, end))
+    return pieces
+
+
+def split_code(code, max_tokens, language=None, model=None, numbered=False):
+    """Split code into chunks of at most max_tokens, cutting on syntactic boundaries
+
+    Top-level functions/classes (Python via ast, brace languages via depth
+    tracking, others via indentation) are packed greedily into chunks; a single
+    definition larger than the budget is split on line boundaries. With
+    numbered, chunks are sized by their text after number_lines, as they are
+    sent. Returns a list of dicts with 'start_line', 'end_line' (1-based,
+    inclusive) and 'code'.
+    """
+    lines = code.splitlines(keepends=True)
+    if not lines:
+        return []
+
+    boundaries = sorted(set([0] + [b for b in _segment_boundaries(lines, code, language) if 0 < b < len(lines)]))
+    segments = list(zip(boundaries, boundaries[1:] + [len(lines)]))
+
+    ranges = []
+    chunk_start, chunk_tokens = None, 0
+    for start, end in segments:
+        segment_tokens = _segment_tokens(lines, start, end, model, numbered)
+        if segment_tokens > max_tokens:
+            if chunk_start is not None:
+                ranges.append((chunk_start, start))
+                chunk_start, chunk_tokens = None, 0
+            ranges.extend(_split_lines(lines, start, end, max_tokens, model, numbered))
+            continue
+
+        if chunk_start is not None and chunk_tokens + segment_tokens > max_tokens:
+            ranges.append((chunk_start, start))
+            chunk_start, chunk_tokens = None, 0
+        if chunk_start is None:
+            chunk_start = start
+        chunk_tokens += segment_tokens
+
+    if chunk_start is not None:
+        ranges.append((chunk_start, len(lines)))
+
+    return [
+        {'start_line': start + 1, 'end_line': end, 'code': ''.join(lines[start:end])}
+        for start, end in ranges if start < end
+    ]
+
+
+def number_lines(code, first_line):
+    """Prefix each line with its line number in the original file"""
+    return ''.join(
+        f"{first_line + offset:>5} | {line}" if line.endswith('\n') else f"{first_line + offset:>5} | {line}\n"
+        for offset, line in enumerate(code.splitlines(keepends=True))
+    )
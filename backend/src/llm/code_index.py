@@ -0,0 +1,349 @@
+"""Local semantic code index for retrieval-augmented analysis and chat
+
+Files are split on syntactic boundaries and every chunk is embedded once; the
+unit vectors are rows of a float32 matrix, so a query is one matrix-vector
+product plus a partial sort. Indexes persist as a .npy matrix (memory-mapped
+when loaded) next to a JSON chunk table, and re-indexing a file set only
+embeds the files whose content changed.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+from openai import OpenAI
+
+from .cache import LRUCache
+from .chunking import detect_language, split_code
+from .providers import fingerprint, get_http_clients
+from .tokens import count_tokens
+
+DEFAULT_INDEX_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    'database', 'code_index'
+)
+CODE_INDEX_DIR = os.getenv('CODE_INDEX_DIR', DEFAULT_INDEX_DIR)
+CODE_INDEX_CHUNK_TOKENS = int(os.getenv('CODE_INDEX_CHUNK_TOKENS', '400'))
+CODE_INDEX_TOP_K = int(os.getenv('CODE_INDEX_TOP_K', '40'))
+# Upper bound on retrieved code per prompt; smaller prompts are faster and cheaper
+CODE_INDEX_CONTEXT_TOKENS = int(os.getenv('CODE_INDEX_CONTEXT_TOKENS', '12000'))
+CODE_INDEX_CHAT_TOKENS = int(os.getenv('CODE_INDEX_CHAT_TOKENS', '3000'))
+CODE_INDEX_EMBEDDINGS = os.getenv('CODE_INDEX_EMBEDDINGS', 'auto').lower()
+CODE_INDEX_EMBEDDING_MODEL = os.getenv('CODE_INDEX_EMBEDDING_MODEL', 'text-embedding-3-small')
+CODE_INDEX_HASH_DIMENSION = int(os.getenv('CODE_INDEX_HASH_DIMENSION', '1024'))
+CODE_INDEX_MAX_LOADED = int(os.getenv('CODE_INDEX_MAX_LOADED', '16'))
+
+EMBEDDING_BATCH_SIZE = 256
+
+_IDENTIFIER = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+_SUBWORD = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+')
+
+
+def _identifier_tokens(text):
+    """Lowercased identifiers plus their snake_case and camelCase parts"""
+    for identifier in _IDENTIFIER.findall(text):
+        lowered = identifier.lower()
+        if len(lowered) > 1:
+            yield lowered
+        parts = [part.lower() for part in _SUBWORD.findall(identifier)]
+        if len(parts) > 1:
+            for part in parts:
+                if len(part) > 1:
+                    yield part
+
+
+class HashingEmbeddings:
+    """Offline embeddings: signed feature hashing of identifiers and their sub-words
+
+    Needs no API calls, so it works with any provider; retrieval quality is
+    lexical rather than semantic.
+    """
+
+    def __init__(self, dimension=CODE_INDEX_HASH_DIMENSION):
+        self.dimension = dimension
+        self.name = f"hashing-{dimension}"
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in _identifier_tokens(text):
+                digest = zlib.crc32(token.encode('utf-8'))
+                vectors[row, digest % self.dimension] += 1.0 if digest & 0x80000000 else -1.0
+        return vectors
+
+
+class OpenAIEmbeddings:
+    """Embeddings from an OpenAI-compatible /embeddings endpoint"""
+
+    def __init__(self, api_key, base_url=None, model=CODE_INDEX_EMBEDDING_MODEL):
+        http_client, _ = get_http_clients(base_url)
+        self.client = OpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+        self.model = model
+        self.name = f"openai-{model}"
+
+    def embed(self, texts):
+        rows = []
+        for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+            response = self.client.embeddings.create(model=self.model, input=texts[start:start + EMBEDDING_BATCH_SIZE])
+            rows.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+        return np.asarray(rows, dtype=np.float32)
+
+
+EMBEDDING_PROVIDERS = {
+    'hashing': HashingEmbeddings,
+    'openai': OpenAIEmbeddings
+}
+
+
+def get_embeddings(data):
+    """Embedding provider for a request: 'embeddings' in the request, else CODE_INDEX_EMBEDDINGS
+
+    'auto' uses OpenAI embeddings when the request's provider is OpenAI with
+    an API key, and the offline hashing embeddings otherwise.
+    """
+    name = (data.get('embeddings') or CODE_INDEX_EMBEDDINGS).lower()
+    if name == 'auto':
+        name = 'openai' if data.get('provider', 'openai') == 'openai' and data.get('api_key') else 'hashing'
+    if name not in EMBEDDING_PROVIDERS:
+        raise ValueError(f"Unknown embeddings provider '{name}'. Use one of: {', '.join(EMBEDDING_PROVIDERS)}")
+    if name == 'openai':
+        # Embeddings are paid for with the caller's key, never the server's
+        if not data.get('api_key'):
+            raise ValueError('API key required. Please configure your API key in Settings.')
+        return OpenAIEmbeddings(
+            data['api_key'],
+            base_url=data.get('base_url'),
+            model=data.get('embedding_model') or CODE_INDEX_EMBEDDING_MODEL
+        )
+    return EMBEDDING_PROVIDERS[name]()
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _content_hash(content):
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def _chunk_text(chunk):
+    return f"File: {chunk['path']}\n{chunk['code']}"
+
+
+class CodeIndex:
+    """Chunk embeddings of one file set, searchable by cosine similarity
+
+    Indexes are shared between requests, so the embeddings provider, which
+    carries the caller's credentials, is passed to each update and search;
+    only its name is kept, to tell which vectors the index holds.
+    """
+
+    def __init__(self, index_id, embeddings_name, directory=None):
+        self.index_id = index_id
+        self.embeddings_name = embeddings_name
+        self.directory = directory
+        self.files = {}  # path -> content hash
+        self.chunks = []  # {'path', 'start_line', 'end_line', 'code', 'tokens'}, one per matrix row
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self._lock = threading.Lock()
+
+    def update(self, files, embeddings):
+        """Make the index mirror files ({'path', 'content'} dicts)
+
+        Only new or modified files are chunked and embedded; chunks of files
+        that are no longer listed are dropped. Returns indexing counts.
+        """
+        current = {file['path']: file for file in files if file.get('path') and file.get('content')}
+        with self._lock:
+            hashes = {path: _content_hash(file['content']) for path, file in current.items()}
+            changed = {path for path, content_hash in hashes.items() if self.files.get(path) != content_hash}
+            keep = [
+                row for row, chunk in enumerate(self.chunks)
+                if chunk['path'] in hashes and chunk['path'] not in changed
+            ]
+
+            new_chunks = []
+            for path in sorted(changed):
+                content = current[path]['content']
+                for chunk in split_code(content, CODE_INDEX_CHUNK_TOKENS, detect_language(content, path)):
+                    new_chunks.append({
+                        'path': path,
+                        'start_line': chunk['start_line'],
+                        'end_line': chunk['end_line'],
+                        'code': chunk['code'],
+                        'tokens': count_tokens(chunk['code'])
+                    })
+
+            if new_chunks:
+                new_vectors = _normalize(embeddings.embed([_chunk_text(chunk) for chunk in new_chunks]))
+                kept_vectors = self.vectors[keep] if keep else new_vectors[:0]
+                self.vectors = np.vstack([kept_vectors, new_vectors])
+            elif len(keep) != len(self.chunks):
+                self.vectors = self.vectors[keep]
+            self.chunks = [self.chunks[row] for row in keep] + new_chunks
+            self.files = hashes
+
+            return {
+                'files': len(hashes),
+                'files_indexed': len(changed),
+                'chunks': len(self.chunks),
+                'chunks_embedded': len(new_chunks)
+            }
+
+    def search(self, query, embeddings, top_k=CODE_INDEX_TOP_K, max_tokens=None):
+        """Chunks similar to query, best first, skipping any that would exceed max_tokens"""
+        if not self.chunks or not query:
+            return []
+        query_vector = _normalize(embeddings.embed([query]))[0]
+
+        with self._lock:
+            scores = self.vectors @ query_vector
+            count = min(top_k, len(scores))
+            top = np.argpartition(-scores, count - 1)[:count]
+            top = top[np.argsort(-scores[top])]
+
+            results = []
+            used = 0
+            for row in top:
+                if scores[row] <= 0:
+                    # Nothing in common with the query; the rest score no higher
+                    break
+                chunk = self.chunks[row]
+                if max_tokens and used + chunk['tokens'] > max_tokens:
+                    continue
+                used += chunk['tokens']
+                results.append(dict(chunk, score=round(float(scores[row]), 4)))
+            return results
+
+    def _paths(self):
+        return os.path.join(self.directory, 'vectors.npy'), os.path.join(self.directory, 'chunks.json')
+
+    def save(self):
+        """Write the matrix and chunk table; a no-op for in-memory indexes"""
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        vectors_path, chunks_path = self._paths()
+        with self._lock:
+            np.save(vectors_path + '.tmp.npy', np.ascontiguousarray(self.vectors))
+            with open(chunks_path + '.tmp', 'w') as chunks_file:
+                json.dump({
+                    'index_id': self.index_id,
+                    'embeddings': self.embeddings_name,
+                    'files': self.files,
+                    'chunks': self.chunks
+                }, chunks_file)
+            os.replace(vectors_path + '.tmp.npy', vectors_path)
+            os.replace(chunks_path + '.tmp', chunks_path)
+
+    def load(self):
+        """Read a saved index, memory-mapping the matrix; returns whether one was found"""
+        vectors_path, chunks_path = self._paths()
+        try:
+            with open(chunks_path) as chunks_file:
+                table = json.load(chunks_file)
+            vectors = np.load(vectors_path, mmap_mode='r')
+        except (OSError, ValueError):
+            return False
+        # A crash between the two writes leaves them out of step; start over then
+        if table.get('embeddings') != self.embeddings_name or vectors.shape[0] != len(table['chunks']):
+            return False
+        self.files = table['files']
+        self.chunks = table['chunks']
+        self.vectors = vectors
+        return True
+
+
+def format_chunks(chunks):
+    """Retrieved chunks as prompt context, grouped by file in line order"""
+    by_path = {}
+    for chunk in chunks:
+        by_path.setdefault(chunk['path'], []).append(chunk)
+
+    sections = []
+    for path, path_chunks in by_path.items():
+        for chunk in sorted(path_chunks, key=lambda chunk: chunk['start_line']):
+            sections.append(f"--- {path} (lines {chunk['start_line']}-{chunk['end_line']}) ---\n{chunk['code'].rstrip()}\n")
+    return '\n'.join(sections)
+
+
+def session_index_id(session_id):
+    """Index id used for files analyzed in a conversation session"""
+    return f"session:{session_id}"
+
+
+def repository_index_id(repo_name):
+    """Index id used for a repository's analyze-all files"""
+    return f"repo:{repo_name}"
+
+
+def index_scope(data):
+    """Credential a request's indexes are kept under: its api_key, else its github_token
+
+    Only the fingerprint is used. An index id names a different index for
+    every scope, so code indexed with one credential (say, from a private
+    repository) cannot be searched with another. Requests with neither share
+    an unscoped namespace.
+    """
+    return fingerprint(data.get('api_key')) or fingerprint(data.get('github_token'))
+
+
+_indexes = LRUCache(max_size=CODE_INDEX_MAX_LOADED)
+_indexes_lock = threading.Lock()
+
+
+def get_code_index(index_id, embeddings, scope=None, create=True):
+    """Return the index for an id, scope and embedding provider, loading it from disk if saved
+
+    scope is the index_scope of the request. Returns None when the index
+    does not exist and create is False.
+    """
+    key = hashlib.sha256(f"{scope or ''}\0{index_id}\0{embeddings.name}".encode('utf-8')).hexdigest()[:32]
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = CodeIndex(index_id, embeddings.name, directory=os.path.join(CODE_INDEX_DIR, key) if CODE_INDEX_DIR else None)
+            if not (index.directory and index.load()) and not create:
+                return None
+            _indexes.set(key, index)
+    return index
+
+
+def _request_index_id(data):
+    return data.get('index_id') or session_index_id(data.get('session_id', 'default'))
+
+
+def index_files(data):
+    """Index a request's files under 'index_id' (the session's index by default)
+
+    The index mirrors the files sent: unchanged files are not embedded
+    again, and previously indexed files missing from the request are dropped.
+    """
+    files = data.get('files') or []
+    if not files:
+        raise ValueError('Files array required')
+    index_id = _request_index_id(data)
+    embeddings = get_embeddings(data)
+    index = get_code_index(index_id, embeddings, index_scope(data))
+    indexed = index.update(files, embeddings)
+    index.save()
+    return dict(indexed, index_id=index_id)
+
+
+def search_code_index(data):
+    """Return the chunks of an index most similar to the request's 'query'"""
+    query = data.get('query')
+    if not query:
+        raise ValueError('Query required')
+    index_id = _request_index_id(data)
+    embeddings = get_embeddings(data)
+    index = get_code_index(index_id, embeddings, index_scope(data), create=False)
+    if index is None:
+        raise ValueError(f"Code index '{index_id}' not found. Index files first.")
+    chunks = index.search(query, embeddings, top_k=data.get('top_k') or CODE_INDEX_TOP_K, max_tokens=data.get('max_tokens'))
+    return {'index_id': index_id, 'query': query, 'chunks': chunks}
@@ -0,0 +1,181 @@
+"""Conversation history compaction for long chat sessions
+
+Chat prompts carry a running summary of the session plus its newest turns,
+kept verbatim up to CHAT_RECENT_TOKENS. Once the turns after the summary
+pass CHAT_COMPACT_TOKENS, a background worker folds the older ones into the
+summary and replaces them in the session store with a single 'summary'
+message, so both prompts and stored sessions stay bounded however long the
+conversation runs.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.prompts import ChatPromptTemplate
+
+from .metrics import CHAT_COMPACTIONS
+from .providers import get_llm
+from .sessions import get_session_store
+from .tokens import TOKENS_PER_MESSAGE, count_tokens, truncate_to_tokens
+
+# Verbatim turns kept in chat prompts, newest first
+CHAT_RECENT_TOKENS = int(os.getenv('CHAT_RECENT_TOKENS', '1500'))
+# Turns after the summary that trigger a compaction (0 = never compact)
+CHAT_COMPACT_TOKENS = int(os.getenv('CHAT_COMPACT_TOKENS', '3000'))
+CHAT_SUMMARY_TOKENS = int(os.getenv('CHAT_SUMMARY_TOKENS', '500'))
+CHAT_COMPACTION_WORKERS = int(os.getenv('CHAT_COMPACTION_WORKERS', '2'))
+
+SUMMARY_MESSAGE_TYPE = 'summary'
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You maintain a running summary of a conversation between a developer and a programming "
+    "assistant. Merge the existing summary with the new turns into one concise summary that keeps "
+    "the code, files, decisions, open questions and preferences later answers may depend on. "
+    "Write plain prose or short bullet points, at most {summary_words} words."
+)
+
+SUMMARY_HUMAN_PROMPT = """Existing summary:
+{summary}
+
+New turns:
+{turns}"""
+
+_executor = ThreadPoolExecutor(max_workers=CHAT_COMPACTION_WORKERS, thread_name_prefix='chat-compaction')
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def _role(message):
+    return "User" if message['type'] == "human" else "Assistant"
+
+
+def _message_tokens(message, model=None):
+    return TOKENS_PER_MESSAGE + count_tokens(message['content'], model)
+
+
+def split_history(messages, recent_tokens=CHAT_RECENT_TOKENS, model=None):
+    """Split session messages into (summary, older, recent)
+
+    summary is the content of the latest summary message or None, recent
+    holds the newest turns that fit in recent_tokens (always at least the
+    last one), and older the turns between them not yet summarized.
+    """
+    summary = None
+    turns = []
+    for message in messages:
+        if message['type'] == SUMMARY_MESSAGE_TYPE:
+            # Whatever came before a summary is already covered by it
+            summary = message['content']
+            turns = []
+        else:
+            turns.append(message)
+
+    start = len(turns)
+    used = 0
+    while start > 0:
+        tokens = _message_tokens(turns[start - 1], model)
+        if used + tokens > recent_tokens and start < len(turns):
+            break
+        used += tokens
+        start -= 1
+    return summary, turns[:start], turns[start:]
+
+
+def history_context(messages, model=None):
+    """Conversation context for a chat prompt: the running summary and the recent turns
+
+    Turns older than the recent window are left out even before a compaction
+    has summarized them, so the context never grows past the budget.
+    """
+    summary, _, recent = split_history(messages, model=model)
+    context = ""
+    if summary:
+        context += f"Summary of the earlier conversation:\n{summary}\n\n"
+    if recent:
+        context += "Previous conversation context:\n"
+        for message in recent:
+            content = truncate_to_tokens(message['content'], CHAT_RECENT_TOKENS, model)
+            if content != message['content']:
+                content += "..."
+            context += f"{_role(message)}: {content}\n"
+        context += "\n"
+    return context
+
+
+def needs_compaction(messages, model=None):
+    """Whether the turns after the latest summary have outgrown CHAT_COMPACT_TOKENS"""
+    if not CHAT_COMPACT_TOKENS:
+        return False
+    tokens = 0
+    for message in reversed(messages):
+        if message['type'] == SUMMARY_MESSAGE_TYPE:
+            break
+        tokens += _message_tokens(message, model)
+    return tokens > CHAT_COMPACT_TOKENS
+
+
+def compact_session(session_id, llm, model=None, store=None):
+    """Fold a session's turns outside the recent window into its summary
+
+    Returns whether the session was compacted. Turns added while the summary
+    is being written are kept, since only the summarized ones are replaced.
+    """
+    store = store or get_session_store()
+    messages = store.get_messages(session_id)
+    if not needs_compaction(messages, model):
+        return False
+    summary, older, _ = split_history(messages, model=model)
+    if not older:
+        return False
+
+    turns = "\n".join(
+        f"{_role(message)}: {truncate_to_tokens(message['content'], CHAT_RECENT_TOKENS, model)}"
+        for message in older
+    )
+    prompt_template = ChatPromptTemplate.from_messages([
+        ("system", SUMMARY_SYSTEM_PROMPT),
+        ("human", SUMMARY_HUMAN_PROMPT)
+    ])
+    response = llm.invoke(prompt_template.format_messages(
+        summary_words=CHAT_SUMMARY_TOKENS * 3 // 4,
+        summary=summary or "(none)",
+        turns=turns
+    ))
+    new_summary = truncate_to_tokens(response.content.strip(), CHAT_SUMMARY_TOKENS, model)
+    if not new_summary:
+        return False
+    return store.compact(session_id, new_summary, older[-1]['id'])
+
+
+def _run_compaction(session_id, llm_config):
+    try:
+        llm = get_llm(
+            priority='batch',
+            temperature=0.2,
+            max_tokens=CHAT_SUMMARY_TOKENS,
+            **llm_config
+        )
+        compacted = compact_session(session_id, llm, model=llm_config.get('model'))
+        CHAT_COMPACTIONS.inc(result='compacted' if compacted else 'skipped')
+    except Exception:
+        # The turns stay verbatim and the next chat request tries again
+        CHAT_COMPACTIONS.inc(result='error')
+    finally:
+        with _pending_lock:
+            _pending.discard(session_id)
+
+
+def schedule_compaction(session_id, llm_config):
+    """Compact a session in the background if it needs it, at most one run per session at a time
+
+    llm_config holds the provider, model, api_key, base_url and fallbacks of
+    the request, so the summary is written with the caller's credentials.
+    """
+    if not CHAT_COMPACT_TOKENS:
+        return
+    with _pending_lock:
+        if session_id in _pending:
+            return
+        _pending.add(session_id)
+    _executor.submit(_run_compaction, session_id, llm_config)
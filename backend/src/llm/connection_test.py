@@ -3,8 +3,8 @@
 from langchain_core.prompts import ChatPromptTemplate
 from .providers import get_llm, DEFAULT_PROVIDERS
 
-def test_llm_connection(data):
-    """Test connection to LLM provider with given configuration"""
+def _prepare_connection_test(data):
+    """Validate the request and build the test LLM and prompt"""
     provider = data.get('provider', 'openai')
     model = data.get('model')
     api_key = data.get('api_key')
@@ -19,7 +19,9 @@ def test_llm_connection(data):
         model=model,
         api_key=api_key,
         base_url=base_url,
-        temperature=0.1
+        temperature=0.1,
+        priority='interactive',
+        fallbacks=[]  # Test exactly the configured provider
     )
     
     # Send a simple test message
@@ -28,8 +30,9 @@ def test_llm_connection(data):
         ("human", "Say 'Connection successful' if you can read this message.")
     ])
 
-    response = llm.invoke(test_prompt.format_messages())
-    
+    return llm, test_prompt.format_messages(), provider, model
+
+def _connection_result(response, provider, model):
     return {
         'success': True,
         'message': 'Connection test successful',
@@ -37,3 +40,15 @@ def test_llm_connection(data):
         'provider': provider,
         'model': model or DEFAULT_PROVIDERS[provider]['default_model']
     }
+
+def test_llm_connection(data):
+    """Test connection to LLM provider with given configuration"""
+    llm, messages, provider, model = _prepare_connection_test(data)
+    response = llm.invoke(messages)
+    return _connection_result(response, provider, model)
+
+async def test_llm_connection_async(data):
+    """Non-blocking test_llm_connection for the ASGI serving path"""
+    llm, messages, provider, model = _prepare_connection_test(data)
+    response = await llm.ainvoke(messages)
+    return _connection_result(response, provider, model)
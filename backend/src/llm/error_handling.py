@@ -1,7 +1,15 @@
 """Error handling utilities for LLM operations"""
 
+from .metrics import ERRORS
+
 def handle_llm_error(error):
-    """Handle and categorize LLM errors"""
+    """Handle and categorize LLM errors, counting each type in the error metrics"""
+    error_response, status_code = _classify_llm_error(error)
+    ERRORS.inc(type=error_response['type'])
+    return error_response, status_code
+
+def _classify_llm_error(error):
+    """Map an LLM error to a user-facing payload and HTTP status"""
     error_message = str(error).lower()
     
     if 'connection' in error_message or 'network' in error_message:
@@ -29,6 +37,12 @@ def handle_llm_error(error):
             'error': 'API quota exceeded or billing issue. Please check your account.',
             'type': 'quota_error'
         }, 402
+    elif isinstance(error, ValueError):
+        # Request validation, e.g. a missing field; the message is meant for the client
+        return {
+            'error': str(error),
+            'type': 'validation_error'
+        }, 400
     else:
         return {
             'error': f'Analysis failed: {str(error)}',
@@ -0,0 +1,223 @@
+"""Concurrent map-reduce analysis of multiple files"""
+
+import asyncio
+import itertools
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from langchain_core.prompts import ChatPromptTemplate
+
+from .prompts import ANALYSIS_PROMPTS, SYSTEM_INSTRUCTIONS
+
+DEFAULT_CONCURRENCY = int(os.getenv('LLM_MAP_CONCURRENCY', '4'))
+MAX_CONCURRENCY = int(os.getenv('LLM_MAP_MAX_CONCURRENCY', '16'))
+MAX_FILE_CHARS = int(os.getenv('LLM_MAP_MAX_FILE_CHARS', '48000'))
+# Upper bound on the size of all per-file results fed into the reduce prompt
+REDUCE_INPUT_CHARS = int(os.getenv('LLM_REDUCE_INPUT_CHARS', '60000'))
+
+REDUCE_SYSTEM_PROMPT = (
+    "You are an expert programmer analyzing multiple files from a codebase. You are given "
+    "independent reviews of individual files. Synthesize them into one comprehensive analysis "
+    "covering overall architecture, patterns, and improvements. Refer to files by path."
+)
+
+REDUCE_HUMAN_PROMPT = """Based on the following per-file reviews, provide:
+        1. Overall code quality assessment
+        2. Architecture and design patterns used
+        3. Common issues across files
+        4. Consistency in coding style
+        5. Recommendations for improvement
+        6. Security considerations
+        7. Performance optimization opportunities
+
+        Per-file reviews:
+        {file_reviews}"""
+
+
+def resolve_concurrency(requested=None):
+    """Clamp a requested concurrency level to the configured bounds"""
+    try:
+        concurrency = int(requested) if requested is not None else DEFAULT_CONCURRENCY
+    except (TypeError, ValueError):
+        concurrency = DEFAULT_CONCURRENCY
+    return max(1, min(concurrency, MAX_CONCURRENCY))
+
+
+def build_map_prompt(analysis_type):
+    """Build the per-file prompt template for an analysis type"""
+    system = SYSTEM_INSTRUCTIONS.get(analysis_type, SYSTEM_INSTRUCTIONS['general'])
+    human = ANALYSIS_PROMPTS.get(analysis_type, ANALYSIS_PROMPTS['general'])
+    return ChatPromptTemplate.from_messages([
+        ("system", system + " You are reviewing a single file from a larger codebase; keep the analysis concise and specific to this file."),
+        ("human", "File: {path}\n\n" + human)
+    ])
+
+
+def file_messages(file, prompt_template):
+    """Format the map step prompt for one file"""
+    content = file.get('content', '')
+    if len(content) > MAX_FILE_CHARS:
+        content = content[:MAX_FILE_CHARS] + "\n\n... [File truncated due to length limits] ..."
+
+    return prompt_template.format_messages(path=file.get('path', 'Unknown'), code=content)
+
+
+def analyze_file(llm, file, prompt_template):
+    """Run the map step for one file"""
+    return llm.invoke(file_messages(file, prompt_template)).content
+
+
+def map_files(llm, files, analysis_type='general', concurrency=None, on_result=None):
+    """Analyze files concurrently over a bounded thread pool
+
+    Returns one result per file, in input order, holding either an 'analysis'
+    or an 'error'. on_result, if given, is called with each result as it completes.
+    """
+    prompt_template = build_map_prompt(analysis_type)
+    results = [None] * len(files)
+    workers = min(resolve_concurrency(concurrency), len(files)) or 1
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(analyze_file, llm, file, prompt_template): index
+            for index, file in enumerate(files)
+        }
+        try:
+            for future in as_completed(futures):
+                index = futures[future]
+                result = {'path': files[index].get('path', 'Unknown')}
+                try:
+                    result['analysis'] = future.result()
+                except Exception as file_error:
+                    result['error'] = str(file_error)
+
+                results[index] = result
+                if on_result:
+                    on_result(result)
+        except BaseException:
+            # on_result may abort the run (e.g. a cancelled job); drop the files not yet started
+            for future in futures:
+                future.cancel()
+            raise
+
+    return results
+
+
+async def map_files_async(llm, files, analysis_type='general', concurrency=None, on_result=None):
+    """Async counterpart of map_files, bounded by a semaphore instead of a thread pool"""
+    prompt_template = build_map_prompt(analysis_type)
+    semaphore = asyncio.Semaphore(resolve_concurrency(concurrency))
+
+    async def run(file):
+        result = {'path': file.get('path', 'Unknown')}
+        async with semaphore:
+            try:
+                result['analysis'] = (await llm.ainvoke(file_messages(file, prompt_template))).content
+            except Exception as file_error:
+                result['error'] = str(file_error)
+        if on_result:
+            on_result(result)
+        return result
+
+    return list(await asyncio.gather(*(run(file) for file in files)))
+
+
+def iter_map_files(llm, files, analysis_type='general', concurrency=None):
+    """Analyze an iterable of files concurrently, yielding (file, result) pairs in input order
+
+    files may be a generator (e.g. of downloads); at most twice the
+    concurrency files are pulled from it ahead of the consumer, so their
+    contents need not all be in memory at once.
+    """
+    prompt_template = build_map_prompt(analysis_type)
+    workers = resolve_concurrency(concurrency)
+    files = iter(files)
+    pending = deque()
+
+    def run(file):
+        result = {'path': file.get('path', 'Unknown')}
+        try:
+            result['analysis'] = analyze_file(llm, file, prompt_template)
+        except Exception as file_error:
+            result['error'] = str(file_error)
+        return result
+
+    def submit(file):
+        pending.append((file, executor.submit(run, file)))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for file in itertools.islice(files, 2 * workers):
+                submit(file)
+            while pending:
+                file, future = pending.popleft()
+                result = future.result()
+                for next_file in itertools.islice(files, 1):
+                    submit(next_file)
+                yield file, result
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+
+async def aiter_map_files(llm, files, analysis_type='general', concurrency=None):
+    """Async counterpart of iter_map_files for an async iterable of files"""
+    prompt_template = build_map_prompt(analysis_type)
+    workers = resolve_concurrency(concurrency)
+    semaphore = asyncio.Semaphore(workers)
+    pending = deque()
+
+    async def run(file):
+        async with semaphore:
+            result = {'path': file.get('path', 'Unknown')}
+            try:
+                result['analysis'] = (await llm.ainvoke(file_messages(file, prompt_template))).content
+            except Exception as file_error:
+                result['error'] = str(file_error)
+            return result
+
+    try:
+        async for file in files:
+            pending.append((file, asyncio.ensure_future(run(file))))
+            # Hold at most twice the concurrency files before handing results over
+            while len(pending) > 2 * workers or (pending and pending[0][1].done()):
+                head, task = pending.popleft()
+                yield head, await task
+        while pending:
+            head, task = pending.popleft()
+            yield head, await task
+    finally:
+        for _, task in pending:
+            task.cancel()
+
+
+def reduce_messages(file_results):
+    """Format the reduce prompt from the successful per-file analyses"""
+    succeeded = [result for result in file_results if 'analysis' in result]
+    if not succeeded:
+        raise Exception('Analysis failed for every file')
+
+    per_file_chars = max(1000, REDUCE_INPUT_CHARS // len(succeeded))
+    file_reviews = ""
+    for result in succeeded:
+        analysis = result['analysis']
+        if len(analysis) > per_file_chars:
+            analysis = analysis[:per_file_chars] + "..."
+        file_reviews += f"\n--- {result['path']} ---\n{analysis}\n"
+
+    prompt_template = ChatPromptTemplate.from_messages([
+        ("system", REDUCE_SYSTEM_PROMPT),
+        ("human", REDUCE_HUMAN_PROMPT)
+    ])
+    return prompt_template.format_messages(file_reviews=file_reviews)
+
+
+def reduce_results(llm, file_results):
+    """Synthesize per-file analyses into a single codebase analysis"""
+    return llm.invoke(reduce_messages(file_results)).content
+
+
+async def reduce_results_async(llm, file_results):
+    """Async counterpart of reduce_results"""
+    return (await llm.ainvoke(reduce_messages(file_results))).content
@@ -0,0 +1,230 @@
+"""In-process latency, token and cache metrics in the Prometheus text format
+
+Metrics are kept per process; with several server workers, each worker
+reports its own series and the scraper or dashboard sums them.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + (extra or [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for values, state in series:
+            lines.extend(self._render_series(values, state))
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing count per label set"""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._series.get(self._key(labels), 0)
+
+    def _render_series(self, values, total):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(total)}"]
+
+
+class Histogram(_Metric):
+    """Bucketed distribution of observed values (seconds unless stated otherwise)"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._series.get(key)
+            if state is None:
+                state = self._series[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][index] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _render_series(self, values, state):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, state['counts']):
+            cumulative += count
+            labels = _format_labels(self.labelnames, values, [('le', _format_value(float(bound)))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, values, [('le', '+Inf')])
+        lines.append(f"{self.name}_bucket{labels} {state['count']}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(state['sum'])}")
+        lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together for the /metrics endpoint"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+PROMPT_BUILD_SECONDS = Histogram(
+    'llm_prompt_build_seconds', 'Time spent validating requests and building prompts', ('operation',)
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    'llm_queue_wait_seconds', 'Time calls waited for rate-limit capacity', ('provider', 'priority')
+)
+REQUEST_SECONDS = Histogram(
+    'llm_request_seconds', 'Provider call latency per attempt', ('provider', 'model', 'method', 'outcome')
+)
+TIME_TO_FIRST_TOKEN_SECONDS = Histogram(
+    'llm_time_to_first_token_seconds', 'Time from sending a streaming call to its first chunk', ('provider', 'model')
+)
+TOKENS = Counter(
+    'llm_tokens_total', 'Tokens reported by providers', ('provider', 'model', 'kind')
+)
+RETRIES = Counter(
+    'llm_retries_total', 'Provider calls retried by the scheduler', ('provider', 'reason')
+)
+FAILOVERS = Counter(
+    'llm_failovers_total', 'Calls moved on from a failing provider route', ('provider',)
+)
+HEDGED_REQUESTS = Counter(
+    'llm_hedged_requests_total', 'Backup requests sent because the primary route was slow', ('provider',)
+)
+RESPONSE_CACHE_REQUESTS = Counter(
+    'llm_response_cache_requests_total', 'Analysis response cache lookups', ('result',)
+)
+ERRORS = Counter(
+    'llm_errors_total', 'LLM errors returned to clients, by handle_llm_error type', ('type',)
+)
+CHAT_COMPACTIONS = Counter(
+    'llm_chat_compactions_total', 'Background chat history compactions', ('result',)
+)
+GITHUB_REQUEST_SECONDS = Histogram(
+    'github_request_seconds', 'GitHub API call latency', ('operation',)
+)
+GITHUB_CACHE_REQUESTS = Counter(
+    'github_cache_requests_total', 'GitHub blob and listing cache lookups', ('cache', 'result')
+)
+GITHUB_THROTTLE_SECONDS = Histogram(
+    'github_throttle_seconds', 'Time GitHub calls were held back to stay within the rate limit', ('priority',)
+)
+GITHUB_RATE_LIMITED = Counter(
+    'github_rate_limited_total', 'GitHub calls refused for lack of budget or rejected by GitHub', ('reason',)
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_seconds', 'HTTP request latency', ('method', 'endpoint', 'status')
+)
+
+
+def record_usage(message, provider, model):
+    """Count the prompt/completion tokens a provider reported on a response or final chunk"""
+    usage = getattr(message, 'usage_metadata', None)
+    if not usage:
+        return
+    TOKENS.inc(usage.get('input_tokens', 0), provider=provider, model=model, kind='prompt')
+    TOKENS.inc(usage.get('output_tokens', 0), provider=provider, model=model, kind='completion')
+
+
+def render_metrics():
+    """Return every metric in the Prometheus text exposition format"""
+    return REGISTRY.render()
+
+
+class TokenUsage:
+    """Thread-safe sum of the provider-reported usage of the calls behind one response"""
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.reported = False
+        self._lock = threading.Lock()
+
+    def add(self, message):
+        usage = getattr(message, 'usage_metadata', None)
+        if not usage:
+            return
+        with self._lock:
+            self.prompt_tokens += usage.get('input_tokens', 0)
+            self.completion_tokens += usage.get('output_tokens', 0)
+            self.reported = True
+
+    def to_dict(self):
+        """Usage totals, or None when the provider did not report usage"""
+        if not self.reported:
+            return None
+        return {
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'total_tokens': self.prompt_tokens + self.completion_tokens
+        }
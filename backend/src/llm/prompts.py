@@ -316,3 +316,13 @@ SYSTEM_INSTRUCTIONS = {
     'security': "You are a cybersecurity expert specializing in secure code review. Identify vulnerabilities with CVSS scores where applicable and provide secure implementations.",
     'performance': "You are a performance optimization expert. Analyze algorithmic efficiency, memory usage, and provide quantifiable improvement recommendations with benchmarking guidance."
 }
+
+# Search queries used to retrieve the most relevant indexed code for each analysis type
+RETRIEVAL_QUERIES = {
+    'general': "core logic, architecture, entry points, request handling, data flow, error handling, configuration",
+    'debug': "error handling, exceptions, edge cases, null or missing values, state mutation, retries, parsing",
+    'improve': "complex functions, duplicated logic, long classes, tight coupling, legacy patterns, refactoring candidates",
+    'correct': "error handling, validation, type conversion, boundary conditions, return values, resource cleanup",
+    'security': "authentication, authorization, user input, query construction, secrets, tokens, passwords, encryption, file paths, subprocess, deserialization",
+    'performance': "loops, database queries, caching, file and network I/O, concurrency, batching, large data processing, memory allocation"
+}
@@ -1,8 +1,17 @@
 """LLM Provider configurations and management"""
 
+import asyncio
+import hashlib
 import os
+import threading
+
+import httpx
 from langchain_openai import ChatOpenAI
 
+from .cache import LRUCache
+from .scheduler import ScheduledLLM, get_rate_limiter
+from .routing import FAILOVER_RETRIES, FALLBACK_PROVIDERS, Route, RoutedLLM, get_provider_health
+
 # Default LLM configurations
 DEFAULT_PROVIDERS = {
     'openai': {
@@ -81,9 +90,156 @@ DEFAULT_PROVIDERS = {
     }
 }
 
+# Constructed clients are reused across requests; each one is bound to a shared
+# keep-alive connection pool for its endpoint so hot paths skip the TLS handshake
+_llm_cache = LRUCache(
+    max_size=int(os.getenv('LLM_CLIENT_CACHE_SIZE', '32')),
+    ttl=float(os.getenv('LLM_CLIENT_CACHE_TTL', '900'))
+)
+_http_pools_lock = threading.Lock()
+
+
+def _close_http_pool(base_url, clients):
+    """Close an evicted endpoint's pools and drop the cached clients bound to them"""
+    for key, _ in _llm_cache.items():
+        settings = dict(key[1:])
+        if settings.get('base_url', settings.get('azure_endpoint')) == base_url:
+            _llm_cache.pop(key)
+    http_client, http_async_client = clients
+    http_client.close()
+    http_async_client.close_pools()
+
+
+# Endpoints come from requests, so their pools are bounded too
+_http_pools = LRUCache(max_size=int(os.getenv('LLM_HTTP_POOL_CACHE_SIZE', '32')), on_evict=_close_http_pool)
+
+
+def fingerprint(secret):
+    """Return a short, non-reversible identifier for an API key"""
+    if not secret:
+        return None
+    return hashlib.sha256(secret.encode('utf-8')).hexdigest()[:16]
+
+
+class LoopLocalAsyncClient(httpx.AsyncClient):
+    """httpx.AsyncClient that sends through a separate connection pool per event loop
+
+    An AsyncClient's connections belong to the loop that opened them, and one
+    client is shared by every cached ChatOpenAI. Requests are still built by
+    this client; each running loop sends them through its own inner client,
+    created on first use and dropped once the loop is closed.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._client_kwargs = kwargs
+        self._loop_clients = {}
+        self._loop_clients_lock = threading.Lock()
+
+    def _loop_client(self):
+        loop = asyncio.get_running_loop()
+        with self._loop_clients_lock:
+            for closed_loop in [other for other in self._loop_clients if other.is_closed()]:
+                del self._loop_clients[closed_loop]
+            client = self._loop_clients.get(loop)
+            if client is None:
+                client = httpx.AsyncClient(**self._client_kwargs)
+                self._loop_clients[loop] = client
+            return client
+
+    async def send(self, request, **kwargs):
+        return await self._loop_client().send(request, **kwargs)
+
+    def close_pools(self):
+        """Close every loop's pool from any thread; pools of loops already closed are just dropped"""
+        with self._loop_clients_lock:
+            loop_clients, self._loop_clients = self._loop_clients, {}
+        for loop, client in loop_clients.items():
+            if not loop.is_closed():
+                try:
+                    asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+                except RuntimeError:
+                    # The loop closed in the meantime
+                    pass
+
+    async def aclose(self):
+        """Close the current loop's pool"""
+        with self._loop_clients_lock:
+            client = self._loop_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+        await super().aclose()
+
+
+def get_http_clients(base_url=None):
+    """Return the shared (sync, async) httpx clients for an endpoint
+
+    The async client keeps one connection pool per event loop. The least
+    recently used endpoints beyond LLM_HTTP_POOL_CACHE_SIZE are closed, along
+    with the cached clients that send through them.
+    """
+    with _http_pools_lock:
+        clients = _http_pools.get(base_url)
+        if clients is None:
+            limits = httpx.Limits(
+                max_connections=int(os.getenv('LLM_HTTP_MAX_CONNECTIONS', '100')),
+                max_keepalive_connections=int(os.getenv('LLM_HTTP_MAX_KEEPALIVE', '20')),
+                keepalive_expiry=float(os.getenv('LLM_HTTP_KEEPALIVE_EXPIRY', '60'))
+            )
+            timeout = httpx.Timeout(float(os.getenv('LLM_HTTP_TIMEOUT', '600')), connect=10.0)
+            clients = (
+                httpx.Client(limits=limits, timeout=timeout),
+                LoopLocalAsyncClient(limits=limits, timeout=timeout)
+            )
+            _http_pools.set(base_url, clients)
+        return clients
+
+
+def _llm_cache_key(provider, llm_kwargs):
+    """Build the client cache key, replacing the API key with its fingerprint"""
+    return (provider,) + tuple(sorted(
+        (name, fingerprint(value) if name == 'api_key' else value)
+        for name, value in llm_kwargs.items()
+    ))
+
+
+def clear_llm_cache():
+    """Drop all cached LLM clients (connection pools are kept)"""
+    _llm_cache.clear()
+
+
 def get_llm(provider='openai', model=None, api_key=None, base_url=None, temperature=0.7, 
-           max_tokens=None, top_p=None, frequency_penalty=None, presence_penalty=None):
-    """Initialize and return LLM instance with configurable provider and advanced parameters"""
+           max_tokens=None, top_p=None, frequency_penalty=None, presence_penalty=None,
+           use_cache=True, priority='default', fallbacks=None):
+    """Initialize and return LLM instance with configurable provider and advanced parameters
+
+    Instances are cached per provider, model, endpoint, API key fingerprint and
+    sampling parameters, so repeated calls with the same configuration reuse a
+    warm client. Pass use_cache=False to force a fresh instance.
+
+    The model is returned wrapped in a ScheduledLLM: calls wait for capacity
+    under the provider/key's rate limits, ordered by priority ('interactive',
+    'default' or 'batch'), and rate limits are retried with backoff.
+
+    fallbacks is an ordered list of provider names or {'provider', 'model',
+    'api_key', 'base_url'} dicts to fail over to (LLM_FALLBACK_PROVIDERS when
+    None; pass an empty list to disable). Only LLM_FALLBACK_PROVIDERS use the
+    server's environment keys; requested fallbacks without their own api_key
+    (other than Ollama, which needs none) are skipped.
+
+    The server's environment keys are only ever sent to the provider's
+    configured endpoint: a request base_url requires its own api_key.
+    """
+    server_fallbacks = fallbacks is None
+    if server_fallbacks:
+        fallbacks = FALLBACK_PROVIDERS
+    if fallbacks:
+        return _get_routed_llm(
+            fallbacks, priority, use_cache, server_fallbacks,
+            provider=provider, model=model, api_key=api_key, base_url=base_url,
+            temperature=temperature, max_tokens=max_tokens, top_p=top_p,
+            frequency_penalty=frequency_penalty, presence_penalty=presence_penalty
+        )
 
     # Get provider configuration
     provider_config = DEFAULT_PROVIDERS.get(provider, DEFAULT_PROVIDERS['openai'])
@@ -101,6 +257,9 @@ def get_llm(provider='openai', model=None, api_key=None, base_url=None, temperat
     if not api_key and provider != 'ollama':
         api_key_env = provider_config['api_key_env']
         if api_key_env:  # Some providers might not need API keys
+            if base_url:
+                # Never send the server's key to an endpoint chosen by the caller
+                raise ValueError("API key required when a custom base URL is given")
             api_key = os.getenv(api_key_env)
             if not api_key:
                 raise ValueError(f"API key not found. Please set {api_key_env} environment variable or provide api_key parameter")
@@ -128,6 +287,8 @@ def get_llm(provider='openai', model=None, api_key=None, base_url=None, temperat
         'model': model,
         'temperature': temperature,
         'max_tokens': max_tokens,
+        # Retries are handled by the scheduler, which also honors Retry-After
+        'max_retries': 0,
     }
 
     # Add optional parameters if provided (with compatibility checks)
@@ -156,27 +317,142 @@ def get_llm(provider='openai', model=None, api_key=None, base_url=None, temperat
         if 'base_url' in llm_kwargs:
             del llm_kwargs['base_url']
 
+    limiter = get_rate_limiter(provider, base_url, fingerprint(api_key))
+    cache_key = _llm_cache_key(provider, llm_kwargs)
+    if use_cache:
+        cached_llm = _llm_cache.get(cache_key)
+        if cached_llm is not None:
+            return ScheduledLLM(cached_llm, limiter, priority=priority, model=model, provider=provider)
+
+    http_client, http_async_client = get_http_clients(base_url)
+
     # Try to create LLM with all parameters, fallback to basic if needed
     try:
-        return ChatOpenAI(**llm_kwargs)
+        llm = ChatOpenAI(http_client=http_client, http_async_client=http_async_client, **llm_kwargs)
     except Exception as llm_error:
         # If advanced parameters cause issues, try with basic parameters only
         if any(param in llm_kwargs for param in ['top_p', 'frequency_penalty', 'presence_penalty']):
             basic_kwargs = {k: v for k, v in llm_kwargs.items()
                            if k not in ['top_p', 'frequency_penalty', 'presence_penalty']}
             print(f"Warning: Falling back to basic parameters for {provider}/{model}: {llm_error}")
-            return ChatOpenAI(**basic_kwargs)
+            llm = ChatOpenAI(http_client=http_client, http_async_client=http_async_client, **basic_kwargs)
         else:
             raise llm_error
 
+    if use_cache:
+        _llm_cache.set(cache_key, llm)
+    return ScheduledLLM(llm, limiter, priority=priority, model=model, provider=provider)
+
+def _route(llm_config, priority, use_cache):
+    """Build one failover route with its shared health record"""
+    provider = llm_config['provider']
+    model = llm_config.get('model') or DEFAULT_PROVIDERS.get(provider, DEFAULT_PROVIDERS['openai'])['default_model']
+    llm = get_llm(priority=priority, use_cache=use_cache, fallbacks=[], **dict(llm_config, model=model))
+    health = get_provider_health(provider, model, llm_config.get('base_url'), fingerprint(llm_config.get('api_key')))
+    return Route(provider, model, llm, health)
+
+
+def _get_routed_llm(fallbacks, priority, use_cache, server_fallbacks, **primary_config):
+    """Build a RoutedLLM over the requested provider followed by its fallbacks
+
+    server_fallbacks tells whether fallbacks come from LLM_FALLBACK_PROVIDERS
+    and may use the server's keys, or from the request and must carry their own.
+    """
+    routes = [_route(primary_config, priority, use_cache)]
+    seen = {(primary_config['provider'], routes[0].model)}
+
+    for fallback in fallbacks:
+        if isinstance(fallback, str):
+            fallback_config = {'provider': fallback}
+        else:
+            fallback_config = {
+                name: value for name, value in dict(fallback).items()
+                if name in ('provider', 'model', 'api_key', 'base_url')
+            }
+        if fallback_config.get('provider') not in DEFAULT_PROVIDERS:
+            continue
+        if not server_fallbacks and not fallback_config.get('api_key') and fallback_config['provider'] != 'ollama':
+            # A requested fallback would otherwise be sent with the server's key
+            continue
+        # Sampling settings carry over; a fallback never inherits the primary's key, endpoint or model
+        for name in ('temperature', 'max_tokens', 'top_p', 'frequency_penalty', 'presence_penalty'):
+            fallback_config.setdefault(name, primary_config[name])
+        try:
+            route = _route(fallback_config, priority, use_cache)
+        except ValueError:
+            # No API key or endpoint configured for this provider
+            continue
+        if (route.provider, route.model) not in seen:
+            seen.add((route.provider, route.model))
+            routes.append(route)
+
+    if len(routes) == 1:
+        return routes[0].llm
+    # Move on quickly from a struggling provider; only the last route waits out the full backoff
+    for route in routes[:-1]:
+        route.llm.max_retries = min(route.llm.max_retries, FAILOVER_RETRIES)
+    return RoutedLLM(routes)
+
 def get_model_context_limits():
-    """Get context limits for different models"""
+    """Get context limits for different models
+
+    Keys are model name prefixes; use get_context_limit() to resolve a model.
+    """
     return {
         'gpt-4': 8192,
+        'gpt-4-32k': 32768,
         'gpt-4-turbo': 128000,
+        'gpt-4-1106': 128000,
+        'gpt-4-0125': 128000,
         'gpt-4o': 128000,
-        'gpt-3.5-turbo': 4096,
+        'gpt-3.5-turbo': 16385,
+        'gpt-35-turbo': 16385,
+        'o1': 128000,
+        'claude-3': 200000,
         'claude-3-sonnet': 200000,
         'claude-3-opus': 200000,
-        'claude-3-haiku': 200000
+        'claude-3-haiku': 200000,
+        'llama3': 8192,
+        'llama-2': 4096,
+        'codellama': 16384,
+        'mistral': 32768,
+        'qwen3': 32768,
+        'deepseek-coder-v2': 131072,
+        'deepseek-r1': 131072,
+        'gemma3': 131072,
+        'phi3.5': 131072
     }
+
+def _context_limit_prefix(model):
+    """The longest known model name prefix matching model, or None"""
+    if not model:
+        return None
+
+    model_name = model.lower()
+    # Strip provider/namespace prefixes such as "openai/" or "library/"
+    model_name = model_name.rsplit('/', 1)[-1]
+
+    best_prefix = None
+    for prefix in get_model_context_limits():
+        if model_name.startswith(prefix) and (best_prefix is None or len(prefix) > len(best_prefix)):
+            best_prefix = prefix
+    return best_prefix
+
+def get_context_limit(model, default=4096):
+    """Resolve a model's context limit by longest matching name prefix"""
+    best_prefix = _context_limit_prefix(model)
+    return get_model_context_limits()[best_prefix] if best_prefix else default
+
+def provider_label(provider):
+    """Metric label for a requested provider: a known provider name, else 'other'"""
+    return provider if provider in DEFAULT_PROVIDERS else 'other'
+
+def model_label(model):
+    """Metric label for a requested model, from a fixed set so callers cannot add series
+
+    A model listed by a provider keeps its name, any other is labeled with its
+    context-limit prefix (e.g. 'llama3'), and unknown models are 'other'.
+    """
+    if any(model in config['models'] for config in DEFAULT_PROVIDERS.values()):
+        return model
+    return _context_limit_prefix(model) or 'other'
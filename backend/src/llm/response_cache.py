@@ -0,0 +1,152 @@
+"""Content-addressed cache for LLM responses"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from .cache import LRUCache
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    'database', 'llm_cache.db'
+)
+
+
+def make_cache_key(messages, params):
+    """Hash the formatted prompt messages together with the model parameters"""
+    payload = {
+        'messages': [[getattr(m, 'type', ''), getattr(m, 'content', str(m))] for m in messages],
+        'params': params
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class MemoryBackend:
+    """In-process LRU backend; entries are lost on restart and not shared across workers"""
+
+    def __init__(self, max_entries=1000, ttl=None):
+        self._cache = LRUCache(max_size=max_entries, ttl=ttl)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value):
+        self._cache.set(key, value)
+
+    def clear(self):
+        self._cache.clear()
+
+
+class SQLiteBackend:
+    """On-disk backend shared by every worker process on the host"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=10000, ttl=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS llm_response_cache ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+            'created_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+        )
+        conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_llm_response_cache_accessed '
+            'ON llm_response_cache (accessed_at)'
+        )
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._connection()
+        row = conn.execute(
+            'SELECT value, created_at FROM llm_response_cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        now = time.time()
+        if self.ttl and now - row[1] > self.ttl:
+            conn.execute('DELETE FROM llm_response_cache WHERE key = ?', (key,))
+            conn.commit()
+            return None
+
+        conn.execute('UPDATE llm_response_cache SET accessed_at = ? WHERE key = ?', (now, key))
+        conn.commit()
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        conn = self._connection()
+        now = time.time()
+        conn.execute(
+            'INSERT OR REPLACE INTO llm_response_cache (key, value, created_at, accessed_at) '
+            'VALUES (?, ?, ?, ?)',
+            (key, json.dumps(value), now, now)
+        )
+        # Evict least recently used entries beyond the size bound
+        conn.execute(
+            'DELETE FROM llm_response_cache WHERE key IN ('
+            'SELECT key FROM llm_response_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,)
+        )
+        conn.commit()
+
+    def clear(self):
+        conn = self._connection()
+        conn.execute('DELETE FROM llm_response_cache')
+        conn.commit()
+
+
+class NullBackend:
+    """Backend used when response caching is disabled"""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def clear(self):
+        pass
+
+
+CACHE_BACKENDS = {
+    'memory': MemoryBackend,
+    'sqlite': SQLiteBackend,
+    'off': NullBackend
+}
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Return the process-wide response cache configured from the environment"""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            backend = os.getenv('LLM_RESPONSE_CACHE', 'memory').lower()
+            ttl = float(os.getenv('LLM_RESPONSE_CACHE_TTL', '86400')) or None
+            max_entries = int(os.getenv('LLM_RESPONSE_CACHE_MAX_ENTRIES', '1000'))
+
+            if backend == 'sqlite':
+                path = os.getenv('LLM_RESPONSE_CACHE_PATH', DEFAULT_CACHE_PATH)
+                _response_cache = SQLiteBackend(path=path, max_entries=max_entries, ttl=ttl)
+            elif backend in CACHE_BACKENDS and backend != 'memory':
+                _response_cache = CACHE_BACKENDS[backend]()
+            else:
+                _response_cache = MemoryBackend(max_entries=max_entries, ttl=ttl)
+        return _response_cache
@@ -0,0 +1,341 @@
+"""Provider failover, circuit breaking and hedged requests"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from .cache import LRUCache
+from .metrics import FAILOVERS, HEDGED_REQUESTS
+from .scheduler import RateLimitExceeded, is_retryable
+
+# Ordered providers tried after the requested one, e.g. "azure,ollama"; empty disables failover
+FALLBACK_PROVIDERS = [
+    name.strip() for name in os.getenv('LLM_FALLBACK_PROVIDERS', '').split(',') if name.strip()
+]
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('LLM_CIRCUIT_FAILURE_THRESHOLD', '5'))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv('LLM_CIRCUIT_RESET_TIMEOUT', '30'))
+# Send a backup request once the primary is slower than this latency percentile; 0 disables hedging
+HEDGE_PERCENTILE = float(os.getenv('LLM_HEDGE_PERCENTILE', '0'))
+HEDGE_MIN_SAMPLES = int(os.getenv('LLM_HEDGE_MIN_SAMPLES', '20'))
+LATENCY_WINDOW = 200
+# Scheduler retries per route before moving on to the next provider
+FAILOVER_RETRIES = int(os.getenv('LLM_FAILOVER_RETRIES', '1'))
+
+_hedge_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix='llm-hedge')
+
+
+class CircuitBreaker:
+    """Stops sending to a provider after repeated failures, probing again after a timeout
+
+    closed: calls flow. open: calls are skipped until reset_timeout has passed.
+    half_open: one probe call is let through (another one if it has not
+    reported back within reset_timeout); success closes, failure reopens.
+    """
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_started = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            now = time.monotonic()
+            if self.state == 'open' and now - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self._probe_started = None
+            if self.state == 'half_open' and (
+                    self._probe_started is None or now - self._probe_started >= self.reset_timeout):
+                self._probe_started = now
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._probe_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+            self._probe_started = None
+
+
+class ProviderHealth:
+    """Circuit breaker and recent successful-call latencies for one provider route"""
+
+    def __init__(self):
+        self.breaker = CircuitBreaker()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.successes = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def record_success(self, latency=None):
+        with self._lock:
+            if latency is not None:
+                self.latencies.append(latency)
+            self.successes += 1
+        self.breaker.record_success()
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+        self.breaker.record_failure()
+
+    def percentile(self, percent):
+        with self._lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * percent / 100.0))
+        return samples[index]
+
+    def hedge_delay(self):
+        """Seconds to wait on this route before hedging, or None when hedging is off"""
+        if HEDGE_PERCENTILE <= 0 or len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        return self.percentile(HEDGE_PERCENTILE)
+
+    def to_dict(self):
+        p50, p95, p99 = self.percentile(50), self.percentile(95), self.percentile(99)
+        return {
+            'state': self.breaker.state,
+            'consecutive_failures': self.breaker.failures,
+            'successes': self.successes,
+            'failures': self.failures,
+            'latency_p50': round(p50, 3) if p50 is not None else None,
+            'latency_p95': round(p95, 3) if p95 is not None else None,
+            'latency_p99': round(p99, 3) if p99 is not None else None
+        }
+
+
+_health = LRUCache(max_size=1024)
+_health_lock = threading.Lock()
+
+
+def get_provider_health(provider, model, base_url=None, key_fingerprint=None):
+    """Return the shared health record for a provider route"""
+    key = (provider, model, base_url, key_fingerprint)
+    with _health_lock:
+        health = _health.get(key)
+        if health is None:
+            health = ProviderHealth()
+            _health.set(key, health)
+        return health
+
+
+def get_health_snapshot():
+    """Health of every provider route seen by this process"""
+    return [
+        dict(health.to_dict(), provider=key[0], model=key[1], base_url=key[2])
+        for key, health in _health.items()
+    ]
+
+
+def should_fail_over(error):
+    """Provider-side failures move on to the next route; request errors do not"""
+    return isinstance(error, RateLimitExceeded) or is_retryable(error)
+
+
+class Route:
+    """One provider/model candidate of a RoutedLLM"""
+
+    def __init__(self, provider, model, llm, health):
+        self.provider = provider
+        # Imported here: providers builds the routes
+        from .providers import provider_label
+        self.provider_label = provider_label(provider)
+        self.model = model
+        self.llm = llm
+        self.health = health
+
+
+class RoutedLLM:
+    """Chat model that fails over along an ordered list of provider routes
+
+    Routes whose circuit breaker is open are skipped (if every breaker is open
+    the routes are still tried in order). With LLM_HEDGE_PERCENTILE set, a call
+    still running past that latency percentile of its route gets a backup
+    request on the next route, and the first success wins. Streams fail over
+    only before the first chunk and are never hedged.
+    """
+
+    def __init__(self, routes):
+        self.routes = routes
+
+    def __getattr__(self, name):
+        return getattr(self.routes[0].llm, name)
+
+    def _routes(self):
+        """Yield the routes in order, asking each breaker only when its route is reached
+
+        A half-open breaker lets one probe through, so a backup that is never
+        called must not be asked. If every breaker refuses, the routes are
+        still tried in order.
+        """
+        tried = False
+        for route in self.routes:
+            if route.health.breaker.allow():
+                tried = True
+                yield route
+        if not tried:
+            yield from self.routes
+
+    def _call(self, route, messages, kwargs):
+        started = time.monotonic()
+        try:
+            response = route.llm.invoke(messages, **kwargs)
+        except Exception as error:
+            if should_fail_over(error):
+                route.health.record_failure()
+            raise
+        route.health.record_success(time.monotonic() - started)
+        return response
+
+    async def _acall(self, route, messages, kwargs):
+        started = time.monotonic()
+        try:
+            response = await route.llm.ainvoke(messages, **kwargs)
+        except Exception as error:
+            if should_fail_over(error):
+                route.health.record_failure()
+            raise
+        route.health.record_success(time.monotonic() - started)
+        return response
+
+    def _hedged(self, primary, routes, messages, kwargs, delay):
+        """Call primary, and the next of routes too if primary is still running after delay"""
+        first = _hedge_executor.submit(self._call, primary, messages, kwargs)
+        try:
+            return first.result(timeout=delay)
+        except FutureTimeoutError:
+            pass
+
+        backup = next(routes, None)
+        if backup is None:
+            return first.result()
+        HEDGED_REQUESTS.inc(provider=primary.provider_label)
+        pending = {first, _hedge_executor.submit(self._call, backup, messages, kwargs)}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # The losing request cannot be interrupted; its result is discarded
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def _ahedged(self, primary, routes, messages, kwargs, delay):
+        """Async counterpart of _hedged"""
+        first = asyncio.ensure_future(self._acall(primary, messages, kwargs))
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        backup = None if done else next(routes, None)
+        if backup is None:
+            return await first
+
+        HEDGED_REQUESTS.inc(provider=primary.provider_label)
+        pending = {first, asyncio.ensure_future(self._acall(backup, messages, kwargs))}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def invoke(self, messages, **kwargs):
+        routes = self._routes()
+        route = next(routes)
+        while True:
+            delay = route.health.hedge_delay()
+            try:
+                if delay is not None:
+                    # A hedge that fired has already taken its backup from routes
+                    return self._hedged(route, routes, messages, kwargs, delay)
+                return self._call(route, messages, kwargs)
+            except Exception as error:
+                next_route = next(routes, None) if should_fail_over(error) else None
+                if next_route is None:
+                    raise
+                FAILOVERS.inc(provider=route.provider_label)
+                route = next_route
+
+    async def ainvoke(self, messages, **kwargs):
+        routes = self._routes()
+        route = next(routes)
+        while True:
+            delay = route.health.hedge_delay()
+            try:
+                if delay is not None:
+                    return await self._ahedged(route, routes, messages, kwargs, delay)
+                return await self._acall(route, messages, kwargs)
+            except Exception as error:
+                next_route = next(routes, None) if should_fail_over(error) else None
+                if next_route is None:
+                    raise
+                FAILOVERS.inc(provider=route.provider_label)
+                route = next_route
+
+    def stream(self, messages, **kwargs):
+        routes = self._routes()
+        route = next(routes)
+        while True:
+            started = False
+            try:
+                for chunk in route.llm.stream(messages, **kwargs):
+                    started = True
+                    yield chunk
+            except Exception as error:
+                if should_fail_over(error):
+                    route.health.record_failure()
+                next_route = None if started or not should_fail_over(error) else next(routes, None)
+                if next_route is None:
+                    raise
+                FAILOVERS.inc(provider=route.provider_label)
+                route = next_route
+                continue
+            # Whole-stream durations are not comparable with invoke latencies
+            route.health.record_success()
+            return
+
+    async def astream(self, messages, **kwargs):
+        routes = self._routes()
+        route = next(routes)
+        while True:
+            started = False
+            try:
+                async for chunk in route.llm.astream(messages, **kwargs):
+                    started = True
+                    yield chunk
+            except Exception as error:
+                if should_fail_over(error):
+                    route.health.record_failure()
+                next_route = None if started or not should_fail_over(error) else next(routes, None)
+                if next_route is None:
+                    raise
+                FAILOVERS.inc(provider=route.provider_label)
+                route = next_route
+                continue
+            # Whole-stream durations are not comparable with invoke latencies
+            route.health.record_success()
+            return
@@ -0,0 +1,471 @@
+"""Per-provider rate limiting, priority queueing and retries for LLM calls"""
+
+import asyncio
+import itertools
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from .cache import LRUCache
+from .metrics import QUEUE_WAIT_SECONDS, REQUEST_SECONDS, RETRIES, TIME_TO_FIRST_TOKEN_SECONDS, record_usage
+
+# Lower values are served first when callers queue for the same provider key
+PRIORITIES = {
+    'interactive': 0,
+    'default': 1,
+    'batch': 2
+}
+
+MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '4'))
+RETRY_BASE_DELAY = float(os.getenv('LLM_RETRY_BASE_DELAY', '1.0'))
+RETRY_MAX_DELAY = float(os.getenv('LLM_RETRY_MAX_DELAY', '60'))
+# Longest a call may wait for capacity before failing as rate limited
+QUEUE_TIMEOUT = float(os.getenv('LLM_QUEUE_TIMEOUT', '120'))
+
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+# Adaptive rate scaling after 429s: halve on each one, recover a step per success
+MIN_RATE_SCALE = 0.1
+RATE_RECOVERY_STEP = 0.05
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a call could not get provider capacity within the queue timeout"""
+
+
+def _limit_setting(name, provider, default='0'):
+    """Read a per-provider setting such as LLM_RATE_LIMIT_RPM_OPENAI, falling back to the global one"""
+    value = os.getenv(f"{name}_{provider.upper()}") or os.getenv(name, default)
+    try:
+        return max(0, int(float(value)))
+    except ValueError:
+        return 0
+
+
+class TokenBucket:
+    """Refills continuously at rate_per_minute up to one minute's worth of capacity
+
+    Not thread-safe on its own; RateLimiter guards it with its lock.
+    """
+
+    def __init__(self, rate_per_minute):
+        self.rate_per_minute = rate_per_minute
+        self.level = float(rate_per_minute)
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now, scale):
+        capacity = self.rate_per_minute * scale
+        self.level = min(capacity, self.level + (now - self.updated_at) * capacity / 60.0)
+        self.updated_at = now
+
+    def wait_time(self, amount, now, scale=1.0):
+        """Seconds until amount is available (0 when it is available now)"""
+        self._refill(now, scale)
+        # A single request larger than the bucket waits for a full bucket
+        amount = min(amount, self.rate_per_minute * scale)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60.0 / (self.rate_per_minute * scale)
+
+    def consume(self, amount):
+        self.level -= min(amount, self.rate_per_minute)
+
+    def refund(self, amount):
+        self.level = min(self.rate_per_minute, self.level + amount)
+
+
+class RateLimiter:
+    """Request and token budgets for one provider/API key
+
+    Callers wait in priority order for a request slot, for room in the
+    requests-per-minute and tokens-per-minute buckets and for any cooldown
+    announced by a 429. After a 429 the configured rates (or, without
+    configured rates, the number of concurrent requests) are cut back and then
+    recovered gradually as calls succeed.
+    """
+
+    def __init__(self, requests_per_minute=0, tokens_per_minute=0, max_concurrent=0):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrent = max_concurrent
+        self.rate_scale = 1.0
+        self.adaptive_concurrency = None
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self._successes = 0
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    def _concurrency_limit(self):
+        limits = [limit for limit in (self.max_concurrent, self.adaptive_concurrency) if limit]
+        return min(limits) if limits else None
+
+    def _try_acquire(self, ticket, tokens):
+        """Take capacity for ticket if it is next in line; otherwise return seconds to wait (None: until notified)"""
+        if ticket != min(self._waiting):
+            return None
+
+        now = time.monotonic()
+        if now < self.cooldown_until:
+            return self.cooldown_until - now
+
+        limit = self._concurrency_limit()
+        if limit and self.in_flight >= limit:
+            return None
+
+        wait = 0.0
+        if self.requests:
+            wait = max(wait, self.requests.wait_time(1, now, self.rate_scale))
+        if self.tokens and tokens:
+            wait = max(wait, self.tokens.wait_time(tokens, now, self.rate_scale))
+        if wait > 0:
+            return wait
+
+        if self.requests:
+            self.requests.consume(1)
+        if self.tokens and tokens:
+            self.tokens.consume(tokens)
+        self.in_flight += 1
+        self._waiting.remove(ticket)
+        self._condition.notify_all()
+        return 0.0
+
+    def _enqueue(self, priority):
+        ticket = (PRIORITIES.get(priority, PRIORITIES['default']), next(self._sequence))
+        self._waiting.append(ticket)
+        return ticket
+
+    def _abandon(self, ticket):
+        with self._condition:
+            if ticket in self._waiting:
+                self._waiting.remove(ticket)
+                self._condition.notify_all()
+
+    def acquire(self, tokens=0, priority='default', timeout=QUEUE_TIMEOUT):
+        """Block until a request of the given token size may be sent"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            ticket = self._enqueue(priority)
+            try:
+                while True:
+                    wait = self._try_acquire(ticket, tokens)
+                    if wait == 0.0:
+                        return
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise RateLimitExceeded('Rate limit exceeded: timed out waiting for provider capacity')
+                    self._condition.wait(min(wait, remaining) if wait is not None else remaining)
+            except BaseException:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                    self._condition.notify_all()
+                raise
+
+    async def acquire_async(self, tokens=0, priority='default', timeout=QUEUE_TIMEOUT):
+        """Async counterpart of acquire; polls instead of blocking the event loop"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            ticket = self._enqueue(priority)
+        try:
+            while True:
+                with self._condition:
+                    wait = self._try_acquire(ticket, tokens)
+                if wait == 0.0:
+                    return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise RateLimitExceeded('Rate limit exceeded: timed out waiting for provider capacity')
+                await asyncio.sleep(min(wait if wait is not None else 0.05, remaining))
+        except BaseException:
+            self._abandon(ticket)
+            raise
+
+    def release(self, reserved_tokens=0, used_tokens=None):
+        """Free the request slot and settle the token reservation against actual usage"""
+        with self._condition:
+            self.in_flight = max(0, self.in_flight - 1)
+            if self.tokens and used_tokens is not None and reserved_tokens:
+                self.tokens.refund(reserved_tokens - min(reserved_tokens, used_tokens))
+            self._condition.notify_all()
+
+    def record_success(self):
+        with self._condition:
+            self._successes += 1
+            self.rate_scale = min(1.0, self.rate_scale + RATE_RECOVERY_STEP)
+            if self.adaptive_concurrency and self._successes % 10 == 0:
+                self.adaptive_concurrency += 1
+                if self.adaptive_concurrency >= 64:
+                    self.adaptive_concurrency = None
+
+    def record_rate_limited(self, delay):
+        """Pause every caller on this key for delay seconds and back off the send rate"""
+        with self._condition:
+            self.cooldown_until = max(self.cooldown_until, time.monotonic() + delay)
+            self.rate_scale = max(MIN_RATE_SCALE, self.rate_scale / 2)
+            if not self.requests and not self.tokens:
+                self.adaptive_concurrency = max(1, (self.adaptive_concurrency or self.in_flight) // 2)
+            self._successes = 0
+            self._condition.notify_all()
+
+
+_limiters = LRUCache(max_size=1024)
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider, base_url=None, key_fingerprint=None):
+    """Return the shared rate limiter for a provider endpoint and API key
+
+    Limits come from LLM_RATE_LIMIT_RPM, LLM_RATE_LIMIT_TPM and
+    LLM_MAX_CONCURRENT_REQUESTS, each overridable per provider with a suffix
+    such as _OPENAI. 0 means unlimited.
+    """
+    key = (provider, base_url, key_fingerprint)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = RateLimiter(
+                requests_per_minute=_limit_setting('LLM_RATE_LIMIT_RPM', provider),
+                tokens_per_minute=_limit_setting('LLM_RATE_LIMIT_TPM', provider),
+                max_concurrent=_limit_setting('LLM_MAX_CONCURRENT_REQUESTS', provider)
+            )
+            _limiters.set(key, limiter)
+        return limiter
+
+
+def _error_status(error):
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status
+
+
+def retry_after(error):
+    """Seconds the provider asked us to wait, from Retry-After headers, or None"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get('retry-after-ms')
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000.0
+        except ValueError:
+            pass
+
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_rate_limit_error(error):
+    return _error_status(error) == 429 or 'rate limit' in str(error).lower()
+
+
+def is_retryable(error):
+    """Rate limits, transient server errors and connection failures are retried"""
+    if isinstance(error, RateLimitExceeded):
+        return False
+    status = _error_status(error)
+    if status is not None:
+        return status in RETRYABLE_STATUSES
+    name = type(error).__name__
+    return is_rate_limit_error(error) or name in ('APIConnectionError', 'APITimeoutError', 'ConnectError',
+                                                  'ReadTimeout', 'ConnectTimeout', 'RemoteProtocolError')
+
+
+def backoff_delay(attempt, error=None):
+    """Exponential backoff with full jitter, or the provider's Retry-After when given"""
+    requested = retry_after(error) if error is not None else None
+    if requested is not None:
+        return min(requested, RETRY_MAX_DELAY)
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+
+
+def _usage_tokens(message):
+    usage = getattr(message, 'usage_metadata', None) or {}
+    total = usage.get('total_tokens')
+    return total if total else None
+
+
+class ScheduledLLM:
+    """Chat model wrapper that sends every call through its provider's RateLimiter
+
+    invoke/ainvoke/stream/astream wait for capacity in priority order and
+    retry rate limits and transient failures with backoff. A stream is only
+    retried if it fails before producing its first chunk. Queue waits, call
+    latencies, time to first token and reported token usage are recorded in
+    the metrics registry. Other attributes are passed through to the wrapped
+    model.
+    """
+
+    def __init__(self, llm, limiter, priority='default', model=None, max_retries=MAX_RETRIES, provider=None):
+        self.llm = llm
+        self.limiter = limiter
+        self.priority = priority
+        self.model = model
+        self.max_retries = max_retries
+        self.provider = provider
+        # Imported here: providers builds this wrapper. Requested names map onto a fixed label set
+        from .providers import model_label, provider_label
+        self.provider_label = provider_label(provider)
+        self.model_label = model_label(model)
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+    def _reserve_tokens(self, messages):
+        if not self.limiter.tokens:
+            return 0
+        # Imported here: tokens depends on providers, which builds this wrapper
+        from .tokens import count_message_tokens
+        return count_message_tokens(messages, self.model) + (getattr(self.llm, 'max_tokens', None) or 0)
+
+    def _acquire(self, reserved):
+        started = time.perf_counter()
+        self.limiter.acquire(reserved, self.priority)
+        QUEUE_WAIT_SECONDS.observe(time.perf_counter() - started, provider=self.provider_label, priority=self.priority)
+
+    async def _acquire_async(self, reserved):
+        started = time.perf_counter()
+        await self.limiter.acquire_async(reserved, self.priority)
+        QUEUE_WAIT_SECONDS.observe(time.perf_counter() - started, provider=self.provider_label, priority=self.priority)
+
+    def _observe(self, method, started, succeeded, usage_message=None):
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - started, provider=self.provider_label, model=self.model_label,
+            method=method, outcome='success' if succeeded else 'error'
+        )
+        if usage_message is not None:
+            record_usage(usage_message, self.provider_label, self.model_label)
+
+    def _should_retry(self, error, attempt):
+        if attempt >= self.max_retries or not is_retryable(error):
+            return None
+        delay = backoff_delay(attempt, error)
+        if is_rate_limit_error(error):
+            self.limiter.record_rate_limited(delay)
+            RETRIES.inc(provider=self.provider_label, reason='rate_limit')
+        else:
+            RETRIES.inc(provider=self.provider_label, reason='error')
+        return delay
+
+    def invoke(self, messages, **kwargs):
+        reserved = self._reserve_tokens(messages)
+        attempt = 0
+        while True:
+            self._acquire(reserved)
+            response = None
+            started = time.perf_counter()
+            try:
+                response = self.llm.invoke(messages, **kwargs)
+            except Exception as error:
+                delay = self._should_retry(error, attempt)
+                if delay is None:
+                    raise
+            finally:
+                self.limiter.release(reserved, _usage_tokens(response))
+                self._observe('invoke', started, response is not None, response)
+
+            if response is not None:
+                self.limiter.record_success()
+                return response
+            time.sleep(delay)
+            attempt += 1
+
+    async def ainvoke(self, messages, **kwargs):
+        reserved = self._reserve_tokens(messages)
+        attempt = 0
+        while True:
+            await self._acquire_async(reserved)
+            response = None
+            started = time.perf_counter()
+            try:
+                response = await self.llm.ainvoke(messages, **kwargs)
+            except Exception as error:
+                delay = self._should_retry(error, attempt)
+                if delay is None:
+                    raise
+            finally:
+                self.limiter.release(reserved, _usage_tokens(response))
+                self._observe('ainvoke', started, response is not None, response)
+
+            if response is not None:
+                self.limiter.record_success()
+                return response
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def stream(self, messages, **kwargs):
+        reserved = self._reserve_tokens(messages)
+        attempt = 0
+        while True:
+            self._acquire(reserved)
+            started = time.perf_counter()
+            first_chunk = None
+            last_usage = None
+            try:
+                for chunk in self.llm.stream(messages, **kwargs):
+                    if first_chunk is None:
+                        first_chunk = chunk
+                        TIME_TO_FIRST_TOKEN_SECONDS.observe(
+                            time.perf_counter() - started, provider=self.provider_label, model=self.model_label
+                        )
+                    if getattr(chunk, 'usage_metadata', None):
+                        last_usage = chunk
+                    yield chunk
+                self.limiter.record_success()
+                self._observe('stream', started, True, last_usage)
+                return
+            except Exception as error:
+                self._observe('stream', started, False)
+                delay = None if first_chunk is not None else self._should_retry(error, attempt)
+                if delay is None:
+                    raise
+            finally:
+                self.limiter.release(reserved, _usage_tokens(last_usage))
+
+            time.sleep(delay)
+            attempt += 1
+
+    async def astream(self, messages, **kwargs):
+        reserved = self._reserve_tokens(messages)
+        attempt = 0
+        while True:
+            await self._acquire_async(reserved)
+            started = time.perf_counter()
+            first_chunk = None
+            last_usage = None
+            try:
+                async for chunk in self.llm.astream(messages, **kwargs):
+                    if first_chunk is None:
+                        first_chunk = chunk
+                        TIME_TO_FIRST_TOKEN_SECONDS.observe(
+                            time.perf_counter() - started, provider=self.provider_label, model=self.model_label
+                        )
+                    if getattr(chunk, 'usage_metadata', None):
+                        last_usage = chunk
+                    yield chunk
+                self.limiter.record_success()
+                self._observe('astream', started, True, last_usage)
+                return
+            except Exception as error:
+                self._observe('astream', started, False)
+                delay = None if first_chunk is not None else self._should_retry(error, attempt)
+                if delay is None:
+                    raise
+            finally:
+                self.limiter.release(reserved, _usage_tokens(last_usage))
+
+            await asyncio.sleep(delay)
+            attempt += 1
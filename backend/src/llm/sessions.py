@@ -0,0 +1,307 @@
+"""Conversation session storage shared by analysis and chat"""
+
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+SESSION_MAX_MESSAGES = int(os.getenv('SESSION_MAX_MESSAGES', '200'))
+SESSION_MAX_SESSIONS = int(os.getenv('SESSION_MAX_SESSIONS', '1000'))
+SESSION_IDLE_TTL = float(os.getenv('SESSION_IDLE_TTL', str(7 * 24 * 3600)))
+
+
+def _iso(timestamp):
+    return datetime.utcfromtimestamp(timestamp).isoformat()
+
+
+class SessionStore:
+    """Interface for conversation session backends"""
+
+    def add_message(self, session_id, message_type, content):
+        raise NotImplementedError
+
+    def get_messages(self, session_id):
+        """Return the session's messages as dicts with 'id', 'type', 'content' and 'timestamp'"""
+        raise NotImplementedError
+
+    def compact(self, session_id, summary, through_id):
+        """Replace the messages up to and including through_id with one 'summary' message
+
+        The summary keeps their place at the start of the session. Returns
+        whether anything was replaced.
+        """
+        raise NotImplementedError
+
+    def clear(self, session_id):
+        """Delete a session; returns whether it existed"""
+        raise NotImplementedError
+
+    def list_sessions(self):
+        """Return dicts with 'session_id', 'message_count' and 'last_activity'"""
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """Per-process store with LRU eviction, idle expiry and a per-session message cap"""
+
+    def __init__(self, max_sessions=SESSION_MAX_SESSIONS, max_messages=SESSION_MAX_MESSAGES,
+                 idle_ttl=SESSION_IDLE_TTL):
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self.idle_ttl = idle_ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def _expire(self):
+        if not self.idle_ttl:
+            return
+        cutoff = time.time() - self.idle_ttl
+        # Sessions are ordered by last activity, oldest first
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session['last_activity'] >= cutoff:
+                break
+            del self._sessions[session_id]
+
+    def add_message(self, session_id, message_type, content):
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = {'messages': deque(), 'last_activity': now}
+                self._sessions[session_id] = session
+            messages = session['messages']
+            messages.append({
+                'id': next(self._ids), 'type': message_type, 'content': content, 'timestamp': now
+            })
+            # Keep only the newest max_messages messages, plus the compaction summary standing for older ones
+            first_kept = 1 if messages[0]['type'] == 'summary' else 0
+            while len(messages) - first_kept > self.max_messages:
+                del messages[first_kept]
+            session['last_activity'] = now
+            self._sessions.move_to_end(session_id)
+
+            self._expire()
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def get_messages(self, session_id):
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(session_id)
+            if session is None:
+                return []
+            return [dict(message, timestamp=_iso(message['timestamp'])) for message in session['messages']]
+
+    def compact(self, session_id, summary, through_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return False
+            messages = session['messages']
+            first = messages[0] if messages else None
+            while messages and messages[0]['id'] <= through_id:
+                first = messages.popleft()
+            if first is None or first['id'] > through_id:
+                return False
+            # The summary takes the last replaced message's id, which sorts before every kept one
+            messages.appendleft({'id': through_id, 'type': 'summary', 'content': summary, 'timestamp': first['timestamp']})
+            return True
+
+    def clear(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def list_sessions(self):
+        with self._lock:
+            self._expire()
+            return [
+                {
+                    'session_id': session_id,
+                    'message_count': len(session['messages']),
+                    'last_activity': _iso(session['last_activity'])
+                }
+                for session_id, session in reversed(self._sessions.items())
+            ]
+
+
+class SQLSessionStore(SessionStore):
+    """Store backed by the application's SQLAlchemy database (SQLite in WAL mode)
+
+    Shared by every worker process, survives restarts, and caps messages per
+    session; idle sessions are pruned periodically.
+    """
+
+    PRUNE_EVERY = 100
+
+    def __init__(self, app, db, session_model, message_model, max_messages=SESSION_MAX_MESSAGES,
+                 idle_ttl=SESSION_IDLE_TTL):
+        self.app = app
+        self.db = db
+        self.ChatSession = session_model
+        self.ChatMessage = message_model
+        self.max_messages = max_messages
+        self.idle_ttl = idle_ttl
+        self._writes = 0
+
+    def add_message(self, session_id, message_type, content):
+        with self.app.app_context():
+            try:
+                self._add_message(session_id, message_type, content)
+            except IntegrityError:
+                # Another worker created the session between the lookup and the insert; it exists now
+                self.db.session.rollback()
+                self._add_message(session_id, message_type, content)
+
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self.prune()
+
+    def _add_message(self, session_id, message_type, content):
+        session = self.db.session
+        now = datetime.utcnow()
+        chat_session = session.get(self.ChatSession, session_id)
+        if chat_session is None:
+            chat_session = self.ChatSession(id=session_id, created_at=now, last_activity=now)
+            session.add(chat_session)
+        chat_session.last_activity = now
+        session.add(self.ChatMessage(session_id=session_id, type=message_type, content=content, created_at=now))
+        session.flush()
+
+        # Keep only the newest max_messages messages; the compaction summary stands for older ones and is kept
+        stale_ids = session.query(self.ChatMessage.id).filter(
+            self.ChatMessage.session_id == session_id, self.ChatMessage.type != 'summary'
+        ).order_by(self.ChatMessage.id.desc()).offset(self.max_messages).all()
+        if stale_ids:
+            session.query(self.ChatMessage).filter(
+                self.ChatMessage.id.in_([row[0] for row in stale_ids])
+            ).delete(synchronize_session=False)
+        session.commit()
+
+    def get_messages(self, session_id):
+        with self.app.app_context():
+            messages = self.ChatMessage.query.filter_by(session_id=session_id) \
+                .order_by(self.ChatMessage.id).all()
+            return [message.to_dict() for message in messages]
+
+    def compact(self, session_id, summary, through_id):
+        with self.app.app_context():
+            session = self.db.session
+            replaced = session.query(self.ChatMessage).filter(
+                self.ChatMessage.session_id == session_id, self.ChatMessage.id <= through_id
+            ).delete(synchronize_session=False)
+            if not replaced:
+                session.rollback()
+                return False
+            # The summary takes the last replaced message's id, which sorts before every kept one
+            session.add(self.ChatMessage(
+                id=through_id, session_id=session_id, type='summary', content=summary, created_at=datetime.utcnow()
+            ))
+            session.commit()
+            return True
+
+    def clear(self, session_id):
+        with self.app.app_context():
+            session = self.db.session
+            session.query(self.ChatMessage).filter_by(session_id=session_id).delete(synchronize_session=False)
+            deleted = session.query(self.ChatSession).filter_by(id=session_id).delete(synchronize_session=False)
+            session.commit()
+            return deleted > 0
+
+    def list_sessions(self):
+        with self.app.app_context():
+            counts = self.db.session.query(
+                self.ChatMessage.session_id, self.db.func.count(self.ChatMessage.id)
+            ).group_by(self.ChatMessage.session_id).all()
+            message_counts = dict(counts)
+            sessions = self.ChatSession.query.order_by(self.ChatSession.last_activity.desc()).all()
+            return [
+                {
+                    'session_id': chat_session.id,
+                    'message_count': message_counts.get(chat_session.id, 0),
+                    'last_activity': chat_session.last_activity.isoformat() if chat_session.last_activity else None
+                }
+                for chat_session in sessions
+            ]
+
+    def prune(self):
+        """Delete sessions idle for longer than the TTL"""
+        if not self.idle_ttl:
+            return
+        with self.app.app_context():
+            session = self.db.session
+            cutoff = datetime.utcnow() - timedelta(seconds=self.idle_ttl)
+            stale = [row[0] for row in session.query(self.ChatSession.id).filter(self.ChatSession.last_activity < cutoff).all()]
+            if stale:
+                session.query(self.ChatMessage).filter(self.ChatMessage.session_id.in_(stale)).delete(synchronize_session=False)
+                session.query(self.ChatSession).filter(self.ChatSession.id.in_(stale)).delete(synchronize_session=False)
+                session.commit()
+
+
+class SessionMemory:
+    """Conversation memory view of one session in the active store"""
+
+    def __init__(self, store, session_id):
+        self.store = store
+        self.session_id = session_id
+
+    def add_user_message(self, message):
+        self.store.add_message(self.session_id, 'human', message)
+
+    def add_ai_message(self, message):
+        self.store.add_message(self.session_id, 'ai', message)
+
+    def get_messages(self):
+        return self.store.get_messages(self.session_id)
+
+    def clear(self):
+        self.store.clear(self.session_id)
+
+
+def enable_sqlite_wal(engine):
+    """Put SQLite connections in WAL mode so readers don't block the writer across workers"""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    from sqlalchemy import event
+
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA busy_timeout=5000')
+        cursor.close()
+
+    event.listen(engine, 'connect', set_pragmas)
+    engine.dispose()  # Reopen pooled connections with the pragmas applied
+
+
+_session_store = MemorySessionStore()
+
+
+def get_session_store():
+    """Return the active session store"""
+    return _session_store
+
+
+def set_session_store(store):
+    """Replace the active session store"""
+    global _session_store
+    _session_store = store
+
+
+def init_session_store(app, db, session_model, message_model):
+    """Configure the session store from SESSION_STORE ('sqlite' by default, or 'memory')"""
+    backend = os.getenv('SESSION_STORE', 'sqlite').lower()
+    if backend == 'memory':
+        set_session_store(MemorySessionStore())
+        return
+
+    with app.app_context():
+        enable_sqlite_wal(db.engine)
+    set_session_store(SQLSessionStore(app, db, session_model, message_model))
@@ -0,0 +1,77 @@
+"""Request coalescing for identical in-flight LLM calls"""
+
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs a function at most once at a time per key
+
+    Concurrent callers with the same key wait for the leader's result instead
+    of repeating the work. Results are not retained after the call completes;
+    that is the response cache's job.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._async_calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Return (result, shared): shared is True when another caller's result was reused"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(self, key, coroutine_fn):
+        """Async counterpart of do for callers on the same event loop
+
+        The call runs as its own task, so cancelling the caller that started
+        it does not cancel it for the callers waiting on the same key.
+        """
+        task = self._async_calls.get(key)
+        shared = task is not None
+        if not shared:
+            task = asyncio.ensure_future(coroutine_fn())
+            self._async_calls[key] = task
+            task.add_done_callback(lambda done: self._finish_async(key, done))
+        return await asyncio.shield(task), shared
+
+    def _finish_async(self, key, task):
+        if self._async_calls.get(key) is task:
+            del self._async_calls[key]
+        if not task.cancelled():
+            # Mark the exception retrieved when every caller was cancelled
+            task.exception()
+
+    def in_flight(self):
+        """Number of distinct calls currently running"""
+        with self._lock:
+            return len(self._calls) + len(self._async_calls)
@@ -0,0 +1,135 @@
+"""Token counting and context budgeting for LLM prompts"""
+
+import functools
+import re
+
+from .providers import get_context_limit
+
+# Tokenizer encodings by model name prefix; other models use cl100k_base as a
+# close approximation of their BPE vocabularies
+MODEL_ENCODINGS = {
+    'gpt-4o': 'o200k_base',
+    'o1': 'o200k_base',
+    'gpt-4': 'cl100k_base',
+    'gpt-3.5': 'cl100k_base',
+    'gpt-35': 'cl100k_base'
+}
+DEFAULT_ENCODING = 'cl100k_base'
+
+# Chat formats add a few tokens of framing per message and per reply
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REPLY = 3
+
+# Prompt tokens kept free on top of the completion budget, absorbing tokenizer
+# differences between providers
+SAFETY_MARGIN = 256
+MIN_CODE_TOKENS = 256
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+TRUNCATION_NOTE = "\n\n... [Code truncated due to length limits] ..."
+
+
+def encoding_name_for_model(model):
+    """Return the tiktoken encoding name used to count tokens for a model"""
+    model_name = (model or '').lower().rsplit('/', 1)[-1]
+    for prefix, encoding_name in sorted(MODEL_ENCODINGS.items(), key=lambda item: -len(item[0])):
+        if model_name.startswith(prefix):
+            return encoding_name
+    return DEFAULT_ENCODING
+
+
+@functools.lru_cache(maxsize=8)
+def _load_encoding(encoding_name):
+    """Load a tiktoken encoding once per process; None when tiktoken is unavailable"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(encoding_name)
+    except Exception:
+        return None
+
+
+def get_encoder(model):
+    """Return the cached encoder for a model, or None to use the fast estimate"""
+    return _load_encoding(encoding_name_for_model(model))
+
+
+def estimate_tokens(text):
+    """Fast tokenizer-free estimate: words and punctuation, at least one token per 4 characters"""
+    if not text:
+        return 0
+    return max(len(text) // 4, len(_TOKEN_PATTERN.findall(text)))
+
+
+def count_tokens(text, model=None):
+    """Count the tokens in text for a model"""
+    if not text:
+        return 0
+    encoder = get_encoder(model)
+    if encoder is None:
+        return estimate_tokens(text)
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages, model=None):
+    """Count the prompt tokens of formatted chat messages"""
+    total = TOKENS_PER_REPLY
+    for message in messages:
+        total += TOKENS_PER_MESSAGE + count_tokens(getattr(message, 'content', str(message)), model)
+    return total
+
+
+def truncate_to_tokens(text, max_tokens, model=None):
+    """Return the longest prefix of text that fits in max_tokens"""
+    if max_tokens <= 0:
+        return ''
+
+    encoder = get_encoder(model)
+    if encoder is not None:
+        tokens = encoder.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return encoder.decode(tokens[:max_tokens])
+
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # Binary search on the character length against the estimate
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low]
+
+
+def code_token_budget(prompt_template, model, max_tokens, context_limit=None):
+    """Return (code_budget, context_limit): how many tokens of code fit beside the prompt and completion"""
+    context_limit = context_limit or get_context_limit(model)
+    overhead = count_message_tokens(prompt_template.format_messages(code=''), model)
+    budget = context_limit - (max_tokens or 0) - overhead - SAFETY_MARGIN
+    return max(budget, MIN_CODE_TOKENS), context_limit
+
+
+def fit_code_to_budget(prompt_template, code, model, max_tokens, context_limit=None, budget_scale=1.0):
+    """Format the prompt with as much code as fits the model's context window
+
+    Returns a dict with the formatted 'messages', 'prompt_tokens',
+    'context_limit', 'code_budget' and whether the code was 'truncated'.
+    """
+    code_budget, context_limit = code_token_budget(prompt_template, model, max_tokens, context_limit)
+    code_budget = int(code_budget * budget_scale)
+
+    truncated = count_tokens(code, model) > code_budget
+    if truncated:
+        code = truncate_to_tokens(code, code_budget, model) + TRUNCATION_NOTE
+
+    messages = prompt_template.format_messages(code=code)
+    return {
+        'messages': messages,
+        'prompt_tokens': count_message_tokens(messages, model),
+        'context_limit': context_limit,
+        'code_budget': code_budget,
+        'truncated': truncated
+    }
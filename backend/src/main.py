@@ -1,37 +1,79 @@
 import os
 import sys
+import time
 # Add the parent directory to the Python path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+# Add this directory as well, for the llm and repository packages
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from flask import Flask, send_from_directory
-from flask_cors import CORS
 from dotenv import load_dotenv
+
+# Load environment variables before the modules that read their settings at import
+load_dotenv()
+
+from flask import Flask, send_from_directory, request, g
+from flask_cors import CORS
 from src.models.user import db
+from src.models.session import ChatSession, ChatMessage
+from src.models.job import AnalysisJob
+from src.models.snapshot import RepositorySnapshot
 from src.routes.user import user_bp
 from src.routes.github import github_bp
 from src.routes.llm import llm_bp
-
-# Load environment variables
-load_dotenv()
+from src.routes.jobs import jobs_bp
+from src.routes.metrics import metrics_bp
+from llm.sessions import init_session_store
+from jobs.queue import init_job_queue
+from jobs.snapshots import init_snapshot_store
+from llm.metrics import HTTP_REQUEST_SECONDS
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'frontend', 'dist'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
 
 # Enable CORS for all routes
-CORS(app, origins="*")
+CORS(app, origins="*", expose_headers=[
+    'Retry-After', 'X-GitHub-RateLimit-Limit', 'X-GitHub-RateLimit-Remaining', 'X-GitHub-RateLimit-Reset'
+])
 
 # Register blueprints
 app.register_blueprint(user_bp, url_prefix='/api')
 app.register_blueprint(github_bp, url_prefix='/api/github')
 app.register_blueprint(llm_bp, url_prefix='/api/llm')
+app.register_blueprint(jobs_bp, url_prefix='/api/jobs')
+app.register_blueprint(metrics_bp)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    # Label by route pattern, not the raw path, to keep the series count bounded
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    HTTP_REQUEST_SECONDS.observe(
+        time.perf_counter() - g.get('request_started', time.perf_counter()),
+        method=request.method, endpoint=endpoint, status=response.status_code
+    )
+    return response
 
 # Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), '..', 'database', 'app.db')}"
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv(
+    'DATABASE_URL', f"sqlite:///{os.path.join(os.path.dirname(__file__), '..', 'database', 'app.db')}"
+)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 with app.app_context():
     db.create_all()
 
+# Conversation sessions live in the database so every worker sees them
+init_session_store(app, db, ChatSession, ChatMessage)
+
+# Long-running analyses run on a local worker pool, separate from request workers
+init_job_queue(app, db, AnalysisJob)
+
+# Repository analyses keep per-file results so re-runs only analyze changed files
+init_snapshot_store(app, db, RepositorySnapshot)
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
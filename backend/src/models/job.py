@@ -0,0 +1,46 @@
+import json
+from datetime import datetime
+from src.models.user import db
+
+class AnalysisJob(db.Model):
+    """Background repository/multi-file analysis job"""
+    __tablename__ = 'analysis_jobs'
+    
+    id = db.Column(db.String(36), primary_key=True)
+    kind = db.Column(db.String(32), nullable=False)
+    status = db.Column(db.String(16), nullable=False, default='queued', index=True)  # queued, running, succeeded, failed, cancelled
+    owner = db.Column(db.String(255), nullable=True)  # host:pid of the process running the job
+    submitter = db.Column(db.String(16), nullable=True, index=True)  # Fingerprint of the submitting credential
+    params = db.Column(db.Text, nullable=True)  # Request options without credentials
+    files_total = db.Column(db.Integer, default=0)
+    files_fetched = db.Column(db.Integer, default=0)
+    files_analyzed = db.Column(db.Integer, default=0)
+    result = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f'<AnalysisJob {self.id} ({self.status})>'
+    
+    def to_dict(self, include_result=False):
+        """Convert job to dictionary"""
+        job = {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'params': json.loads(self.params) if self.params else {},
+            'progress': {
+                'files_total': self.files_total or 0,
+                'files_fetched': self.files_fetched or 0,
+                'files_analyzed': self.files_analyzed or 0
+            },
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+        if include_result:
+            job['result'] = json.loads(self.result) if self.result else None
+        return job
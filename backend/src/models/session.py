@@ -0,0 +1,35 @@
+from datetime import datetime
+from src.models.user import db
+
+class ChatSession(db.Model):
+    """Conversation session shared by every worker process"""
+    __tablename__ = 'chat_sessions'
+    
+    id = db.Column(db.String(255), primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_activity = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<ChatSession {self.id}>'
+
+class ChatMessage(db.Model):
+    """Single message of a conversation session"""
+    __tablename__ = 'chat_messages'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.String(255), db.ForeignKey('chat_sessions.id', ondelete='CASCADE'), nullable=False, index=True)
+    type = db.Column(db.String(16), nullable=False)  # 'human', 'ai' or 'summary'
+    content = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ChatMessage {self.id} ({self.type})>'
+    
+    def to_dict(self):
+        """Convert message to the conversation memory format"""
+        return {
+            'id': self.id,
+            'type': self.type,
+            'content': self.content,
+            'timestamp': self.created_at.isoformat() if self.created_at else None
+        }
@@ -0,0 +1,36 @@
+import json
+from datetime import datetime
+from src.models.user import db
+
+class RepositorySnapshot(db.Model):
+    """Latest analyze-all analysis of a repository for one set of analysis settings"""
+    __tablename__ = 'repository_snapshots'
+
+    id = db.Column(db.String(64), primary_key=True)  # Hash of the repository and settings
+    repository = db.Column(db.String(255), nullable=False, index=True)
+    settings = db.Column(db.Text, nullable=True)  # Filters and analysis settings; credentials only as fingerprints
+    ref = db.Column(db.String(255), nullable=True)
+    commit_sha = db.Column(db.String(40), nullable=False)
+    truncated = db.Column(db.Boolean, default=False)
+    files = db.Column(db.Text, nullable=False)  # Tree entries (path, sha, size) at commit_sha
+    result = db.Column(db.Text, nullable=False)  # Analysis result with per-file results keyed by blob SHA
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<RepositorySnapshot {self.repository}@{self.commit_sha[:7]}>'
+
+    def to_dict(self):
+        """Convert snapshot to dictionary"""
+        return {
+            'id': self.id,
+            'repository': self.repository,
+            'settings': json.loads(self.settings) if self.settings else {},
+            'ref': self.ref,
+            'commit_sha': self.commit_sha,
+            'truncated': bool(self.truncated),
+            'files': json.loads(self.files),
+            'result': json.loads(self.result),
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
@@ -0,0 +1,28 @@
+"""Repository access helpers for the GitHub routes"""
+
+from .fetch import DEFAULT_EXTENSIONS, list_tree_files, fetch_files, iter_files, fetch_blob, load_file_content
+from .archive import fetch_archive_files, iter_archive_files
+from .blob_cache import get_blob_cache, get_listing_cache
+from .client import GITHUB_API_URL, get_github
+from .rate_limit import GitHubRateLimitExceeded, get_rate_limit
+from .repositories import list_repositories_page
+from .sources import get_repository_source
+
+__all__ = [
+    'DEFAULT_EXTENSIONS',
+    'list_tree_files',
+    'fetch_files',
+    'iter_files',
+    'fetch_archive_files',
+    'iter_archive_files',
+    'fetch_blob',
+    'load_file_content',
+    'get_blob_cache',
+    'get_listing_cache',
+    'GITHUB_API_URL',
+    'get_github',
+    'GitHubRateLimitExceeded',
+    'get_rate_limit',
+    'list_repositories_page',
+    'get_repository_source'
+]
@@ -0,0 +1,96 @@
+"""Repository file loading from a single tarball download
+
+One archive transfer replaces a blob request per file. The tarball is
+streamed through tarfile straight from the HTTP response, without being
+written to disk; only members matching the requested tree entries are read,
+and each is stored in the blob cache under its Git blob SHA. Zipballs are
+not used because zipfile needs a seekable file to read the central directory.
+"""
+
+import os
+import tarfile
+
+import requests
+
+from llm.metrics import GITHUB_REQUEST_SECONDS
+
+from .blob_cache import get_blob_cache, git_blob_sha
+
+# Connect and per-read timeouts for the archive download
+ARCHIVE_TIMEOUT = (10, float(os.getenv('GITHUB_ARCHIVE_READ_TIMEOUT', '60')))
+
+
+def _archive_path(name):
+    # Archive members are nested under a single '<owner>-<repo>-<sha>/' directory
+    parts = name.split('/', 1)
+    return parts[1] if len(parts) == 2 else None
+
+
+def _decoded(entry, data):
+    try:
+        return dict(entry, content=data.decode('utf-8'))
+    except UnicodeDecodeError:
+        return None
+
+
+def iter_archive_files(repo, ref, entries, on_fetched=None):
+    """Yield entries' files with their content, downloading the repository tarball at most once
+
+    Files already in the blob cache are yielded first without a download; the
+    rest follow in archive order as the tarball streams in. A file whose
+    content at ref differs from its entry is yielded with the archive's blob
+    SHA and size. Files missing from the archive or not valid UTF-8 are
+    skipped. on_fetched, if given, is called with each entry once its content is in.
+    """
+    blob_cache = get_blob_cache()
+    missing = {}
+    for entry in entries:
+        data = blob_cache.get(entry['sha'])
+        if data is None:
+            missing[entry['path']] = entry
+            continue
+        file = _decoded(entry, data)
+        if file is not None:
+            if on_fetched:
+                on_fetched(entry)
+            yield file
+
+    if not missing:
+        return
+
+    with GITHUB_REQUEST_SECONDS.time(operation='archive_link'):
+        url = repo.get_archive_link('tarball', ref)
+
+    with requests.get(url, stream=True, timeout=ARCHIVE_TIMEOUT) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        with tarfile.open(fileobj=response.raw, mode='r|*') as archive:
+            for member in archive:
+                if not missing:
+                    # Every requested file is in; skip the rest of the download
+                    break
+                if not member.isfile():
+                    continue
+                entry = missing.pop(_archive_path(member.name), None)
+                if entry is None:
+                    continue
+
+                data = archive.extractfile(member).read()
+                sha = git_blob_sha(data)
+                blob_cache.put(sha, data)
+                if sha != entry['sha']:
+                    # The ref moved since the tree was listed
+                    entry = dict(entry, sha=sha, size=len(data))
+                file = _decoded(entry, data)
+                if file is not None:
+                    if on_fetched:
+                        on_fetched(entry)
+                    yield file
+
+
+def fetch_archive_files(repo, ref, entries, on_fetched=None):
+    """Counterpart of fetch.fetch_files that reads the files from the repository tarball, in tree order"""
+    order = {entry['path']: index for index, entry in enumerate(entries)}
+    with GITHUB_REQUEST_SECONDS.time(operation='fetch_archive'):
+        files = list(iter_archive_files(repo, ref, entries, on_fetched=on_fetched))
+    return sorted(files, key=lambda file: order[file['path']])
@@ -0,0 +1,154 @@
+"""Non-blocking GitHub API calls for the ASGI serving path
+
+These back the async methods of sources.GitHubSource, which is what the
+routes use.
+"""
+
+import asyncio
+import itertools
+import threading
+import time
+from collections import deque
+from urllib.parse import quote
+
+import httpx
+
+from llm.metrics import GITHUB_REQUEST_SECONDS
+from llm.providers import LoopLocalAsyncClient
+
+from .blob_cache import get_blob_cache
+from .client import GITHUB_API_URL
+from .fetch import DEFAULT_MAX_FILE_SIZE, decode_blob, resolve_fetch_concurrency, tree_entries
+from .rate_limit import GitHubRateLimitExceeded, get_rate_limit, is_rate_limit_response
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class GitHubAPIError(Exception):
+    """Error response from the GitHub REST API"""
+
+    def __init__(self, status, message):
+        super().__init__(f"{status} {message}")
+        self.status = status
+
+
+def get_async_client():
+    """Return the shared keep-alive client for the GitHub API, pooling connections per event loop"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LoopLocalAsyncClient(
+                base_url=GITHUB_API_URL,
+                headers={'Accept': 'application/vnd.github+json'},
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+                timeout=httpx.Timeout(30.0, connect=10.0)
+            )
+        return _client
+
+
+async def get_json(token, path, params=None, operation='api'):
+    """GET a GitHub API path and return the decoded JSON body, within the token's rate limit budget"""
+    budget = get_rate_limit(token)
+    await budget.acquire_async()
+    with GITHUB_REQUEST_SECONDS.time(operation=operation):
+        response = await get_async_client().get(
+            path, params=params, headers={'Authorization': f'token {token}'}
+        )
+    if is_rate_limit_response(response.status_code, response.headers, response.text):
+        raise budget.record_rate_limited(response.headers)
+    budget.update(response.headers)
+    if response.status_code >= 400:
+        try:
+            message = response.json().get('message', response.text)
+        except ValueError:
+            message = response.text
+        raise GitHubAPIError(response.status_code, message)
+    return response.json()
+
+
+async def list_tree_files_async(token, repo_name, ref, extensions=None, max_files=None,
+                                max_file_size=DEFAULT_MAX_FILE_SIZE):
+    """Async counterpart of fetch.list_tree_files"""
+    tree = await get_json(token, f"/repos/{repo_name}/git/trees/{quote(ref, safe='')}", {'recursive': '1'}, operation='tree')
+    return tree_entries(tree.get('tree', []), extensions, max_files, max_file_size), bool(tree.get('truncated', False))
+
+
+async def fetch_blob_async(token, repo_name, sha):
+    """Return a blob's raw bytes, downloading it only on a cache miss"""
+    blob_cache = get_blob_cache()
+    data = await asyncio.to_thread(blob_cache.get, sha)
+    if data is not None:
+        return data
+
+    blob = await get_json(token, f"/repos/{repo_name}/git/blobs/{sha}", operation='blob')
+    data = decode_blob(blob.get('encoding'), blob.get('content'))
+    await asyncio.to_thread(blob_cache.put, sha, data)
+    return data
+
+
+async def _fetch_entry_async(token, repo_name, entry):
+    try:
+        content = (await fetch_blob_async(token, repo_name, entry['sha'])).decode('utf-8')
+    except GitHubRateLimitExceeded:
+        raise
+    except Exception:
+        return None
+    return dict(entry, content=content)
+
+
+async def iter_files_async(token, repo_name, entries, concurrency=None, window=None):
+    """Async counterpart of fetch.iter_files: files in tree order, at most window downloads held at a time"""
+    if not entries:
+        return
+
+    workers = resolve_fetch_concurrency(concurrency)
+    window = max(window or 2 * workers, workers)
+    semaphore = asyncio.Semaphore(workers)
+
+    async def fetch_entry(entry):
+        async with semaphore:
+            return await _fetch_entry_async(token, repo_name, entry)
+
+    entries = iter(entries)
+    pending = deque(asyncio.ensure_future(fetch_entry(entry)) for entry in itertools.islice(entries, window))
+    try:
+        while pending:
+            result = await pending.popleft()
+            for entry in itertools.islice(entries, 1):
+                pending.append(asyncio.ensure_future(fetch_entry(entry)))
+            if result is not None:
+                yield result
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def fetch_files_async(token, repo_name, entries, concurrency=None):
+    """Download file contents concurrently, preserving tree order
+
+    Files that cannot be downloaded or decoded as UTF-8 are skipped.
+    """
+    semaphore = asyncio.Semaphore(resolve_fetch_concurrency(concurrency))
+    started = time.perf_counter()
+
+    async def fetch_entry(entry):
+        async with semaphore:
+            return await _fetch_entry_async(token, repo_name, entry)
+
+    results = await asyncio.gather(*(fetch_entry(entry) for entry in entries))
+    GITHUB_REQUEST_SECONDS.observe(time.perf_counter() - started, operation='fetch_files')
+    return [result for result in results if result is not None]
+
+
+async def iterate_in_thread(iterator):
+    """Drive a blocking generator from the event loop, advancing it on a worker thread"""
+    finished = object()
+    try:
+        while True:
+            item = await asyncio.to_thread(next, iterator, finished)
+            if item is finished:
+                return
+            yield item
+    finally:
+        iterator.close()
@@ -0,0 +1,229 @@
+"""Content cache for immutable Git blobs and conditional directory listings"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import quote
+
+from llm.cache import LRUCache
+from llm.metrics import GITHUB_CACHE_REQUESTS, GITHUB_REQUEST_SECONDS
+from llm.providers import fingerprint
+
+DEFAULT_BLOB_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    'database', 'blob_cache'
+)
+
+
+def git_blob_sha(data):
+    """Compute the Git object id of a blob from its raw bytes"""
+    digest = hashlib.sha1(f"blob {len(data)}\0".encode('utf-8'))
+    # Updating instead of concatenating hashes memory maps without copying them
+    digest.update(data)
+    return digest.hexdigest()
+
+
+class BlobCache:
+    """Two-level blob cache keyed by Git blob SHA: a memory LRU in front of a disk store
+
+    Blobs are immutable, so entries never go stale; both levels are bounded by
+    total bytes and evict the least recently used blobs first.
+    """
+
+    def __init__(self, memory_bytes=64 * 1024 * 1024, disk_dir=DEFAULT_BLOB_CACHE_DIR,
+                 disk_bytes=512 * 1024 * 1024):
+        self._memory = LRUCache(max_size=100000, max_weight=memory_bytes, weigher=len)
+        self.disk_dir = disk_dir if disk_bytes else None
+        self.disk_bytes = disk_bytes
+        self._disk_lock = threading.Lock()
+        self._disk_usage = None
+
+    def _blob_path(self, sha):
+        return os.path.join(self.disk_dir, sha[:2], sha)
+
+    def get(self, sha):
+        """Return the cached bytes for a blob SHA, or None"""
+        if not sha:
+            return None
+
+        data = self._memory.get(sha)
+        if data is not None:
+            GITHUB_CACHE_REQUESTS.inc(cache='blob', result='memory')
+            return data
+        if not self.disk_dir:
+            GITHUB_CACHE_REQUESTS.inc(cache='blob', result='miss')
+            return None
+
+        path = self._blob_path(sha)
+        try:
+            with open(path, 'rb') as blob_file:
+                data = blob_file.read()
+            os.utime(path)  # Track recency for disk eviction
+        except OSError:
+            GITHUB_CACHE_REQUESTS.inc(cache='blob', result='miss')
+            return None
+
+        if git_blob_sha(data) != sha:
+            # Corrupt or partially written entry
+            self._discard(path)
+            GITHUB_CACHE_REQUESTS.inc(cache='blob', result='miss')
+            return None
+
+        GITHUB_CACHE_REQUESTS.inc(cache='blob', result='disk')
+        self._memory.set(sha, data)
+        return data
+
+    def put(self, sha, data):
+        """Store blob bytes under their SHA"""
+        if not sha or data is None:
+            return
+
+        self._memory.set(sha, data)
+        if not self.disk_dir or len(data) > self.disk_bytes:
+            return
+
+        path = self._blob_path(sha)
+        if os.path.exists(path):
+            return
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as blob_file:
+                blob_file.write(data)
+            os.replace(temp_path, path)
+        except OSError:
+            return
+
+        with self._disk_lock:
+            if self._disk_usage is None:
+                self._disk_usage = self._scan_usage()
+            else:
+                self._disk_usage += len(data)
+            if self._disk_usage > self.disk_bytes:
+                self._prune()
+
+    def _discard(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _scan_entries(self):
+        entries = []
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _scan_usage(self):
+        return sum(size for _, size, _ in self._scan_entries())
+
+    def _prune(self):
+        """Evict least recently used blobs until the store is under 90% of its budget"""
+        entries = sorted(self._scan_entries())
+        usage = sum(size for _, size, _ in entries)
+        target = int(self.disk_bytes * 0.9)
+        for _, size, path in entries:
+            if usage <= target:
+                break
+            self._discard(path)
+            usage -= size
+        self._disk_usage = usage
+
+
+class ListingCache:
+    """ETag-validated cache of API listings (contents, repositories), scoped per token"""
+
+    def __init__(self, max_entries=2000):
+        self._entries = LRUCache(max_size=max_entries)
+
+    def get_json(self, requester, token, url, parameters=None, operation='api', max_age=0, stored=None):
+        """GET an API URL, revalidating cached copies with If-None-Match
+
+        Copies younger than max_age seconds are returned without a request.
+        stored, if given, maps a response to what is kept in the cache (and
+        returned after a 304). Returns (data, headers) with lower-case header names.
+        """
+        key = (fingerprint(token), url, json.dumps(parameters, sort_keys=True) if parameters else None)
+        cached = self._entries.get(key)
+        now = time.monotonic()
+        if cached and max_age and now - cached[3] < max_age:
+            GITHUB_CACHE_REQUESTS.inc(cache='listing', result='fresh')
+            return cached[1], cached[2]
+
+        request_headers = {'If-None-Match': cached[0]} if cached else None
+        with GITHUB_REQUEST_SECONDS.time(operation=operation):
+            response_headers, data = requester.requestJsonAndCheck(
+                'GET', url, parameters=parameters, headers=request_headers
+            )
+        if data is None and cached:
+            # 304 Not Modified: does not count against the rate limit
+            GITHUB_CACHE_REQUESTS.inc(cache='listing', result='revalidated')
+            self._entries.set(key, cached[:3] + (now,))
+            return cached[1], cached[2]
+        GITHUB_CACHE_REQUESTS.inc(cache='listing', result='miss')
+
+        headers = {name.lower(): value for name, value in (response_headers or {}).items()}
+        if headers.get('etag'):
+            self._entries.set(key, (headers['etag'], stored(data) if stored else data, headers, now))
+        return data, headers
+
+    def get_contents(self, repo, token, path='', ref=None):
+        """Fetch a contents API response through the cache
+
+        Returns the raw JSON (a list for directories, a dict for files). File
+        bodies are not kept here; callers store them in the blob cache.
+        """
+        url = f"{repo.url}/contents/{quote(path)}" if path else f"{repo.url}/contents"
+        data, _ = self.get_json(
+            repo._requester, token, url,
+            parameters={'ref': ref} if ref else None,
+            operation='contents',
+            stored=_without_content
+        )
+        return data
+
+
+def _without_content(data):
+    if isinstance(data, dict):
+        return {name: value for name, value in data.items() if name != 'content'}
+    return data
+
+
+_blob_cache = None
+_listing_cache = None
+_caches_lock = threading.Lock()
+
+
+def get_blob_cache():
+    """Return the process-wide blob cache configured from the environment"""
+    global _blob_cache
+    with _caches_lock:
+        if _blob_cache is None:
+            _blob_cache = BlobCache(
+                memory_bytes=int(os.getenv('GITHUB_BLOB_CACHE_MEMORY_BYTES', str(64 * 1024 * 1024))),
+                disk_dir=os.getenv('GITHUB_BLOB_CACHE_DIR', DEFAULT_BLOB_CACHE_DIR),
+                disk_bytes=int(os.getenv('GITHUB_BLOB_CACHE_DISK_BYTES', str(512 * 1024 * 1024)))
+            )
+        return _blob_cache
+
+
+def get_listing_cache():
+    """Return the process-wide contents listing cache"""
+    global _listing_cache
+    with _caches_lock:
+        if _listing_cache is None:
+            _listing_cache = ListingCache(
+                max_entries=int(os.getenv('GITHUB_LISTING_CACHE_MAX_ENTRIES', '2000'))
+            )
+        return _listing_cache
@@ -0,0 +1,76 @@
+"""GitHub API clients, pooled per token
+
+Clients are kept between requests so their HTTP sessions, and the open
+connections in them, are reused. Every call a pooled client makes goes
+through the token's rate limit budget (see rate_limit): it is held back
+while the budget is low and fails with GitHubRateLimitExceeded instead of
+sleeping inside PyGithub when GitHub rejects it.
+"""
+
+import os
+import threading
+
+from github import Github
+from urllib3.util.retry import Retry
+
+from llm.cache import LRUCache
+from llm.providers import fingerprint
+
+from .fetch import MAX_FETCH_CONCURRENCY
+from .rate_limit import get_rate_limit, is_rate_limit_response
+
+# Point at GitHub Enterprise or a local stand-in such as the benchmark mock server
+GITHUB_API_URL = os.getenv('GITHUB_API_URL', 'https://api.github.com')
+CLIENT_POOL_SIZE = int(os.getenv('GITHUB_CLIENT_POOL_SIZE', '256'))
+
+# Transient server errors are retried; rate limits are left to the budget
+RETRY = Retry(total=3, backoff_factor=0.5, status_forcelist=(502, 503, 504), raise_on_status=False)
+
+# Requester methods that send a request; the *AndCheck variants and paginated lists call these
+REQUEST_METHODS = ('requestJson', 'requestMultipart', 'requestBlob')
+
+_clients = LRUCache(max_size=CLIENT_POOL_SIZE)
+_clients_lock = threading.Lock()
+
+
+def _budgeted(send, budget, priority):
+    def request(verb, url, *args, **kwargs):
+        budget.acquire(priority)
+        status, headers, output = send(verb, url, *args, **kwargs)
+        if is_rate_limit_response(status, headers, output):
+            raise budget.record_rate_limited(headers)
+        budget.update(headers)
+        return status, headers, output
+    return request
+
+
+def _create_client(token, priority):
+    client = Github(
+        token,
+        base_url=GITHUB_API_URL,
+        retry=RETRY,
+        pool_size=MAX_FETCH_CONCURRENCY,
+        # Pacing comes from the rate limit budget, not a fixed gap between requests
+        seconds_between_requests=None
+    )
+    # Every object a client returns shares its Requester
+    requester = client.get_user()._requester
+    budget = get_rate_limit(token)
+    for name in REQUEST_METHODS:
+        setattr(requester, name, _budgeted(getattr(requester, name), budget, priority))
+    return client
+
+
+def get_github(token, priority='interactive'):
+    """Return the pooled PyGithub client for a token against the configured API URL
+
+    priority is 'interactive' for request handlers, which fail fast when the
+    budget is exhausted, or 'batch' for background jobs, which wait it out.
+    """
+    key = (fingerprint(token), priority)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _create_client(token, priority)
+            _clients.set(key, client)
+        return client
@@ -0,0 +1,168 @@
+"""Repository file fetching through the Git Trees and Blobs APIs"""
+
+import base64
+import itertools
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from llm.metrics import GITHUB_REQUEST_SECONDS
+
+from .blob_cache import get_blob_cache
+from .rate_limit import GitHubRateLimitExceeded
+
+DEFAULT_EXTENSIONS = ['.py', '.js', '.jsx', '.ts', '.tsx', '.java', '.cpp', '.c', '.cs']
+DEFAULT_FETCH_CONCURRENCY = int(os.getenv('GITHUB_FETCH_CONCURRENCY', '8'))
+MAX_FETCH_CONCURRENCY = int(os.getenv('GITHUB_MAX_FETCH_CONCURRENCY', '32'))
+DEFAULT_MAX_FILE_SIZE = int(os.getenv('GITHUB_MAX_FILE_SIZE', str(1024 * 1024)))
+
+
+def resolve_fetch_concurrency(requested=None):
+    """Clamp a requested download concurrency to the configured bounds"""
+    try:
+        concurrency = int(requested) if requested is not None else DEFAULT_FETCH_CONCURRENCY
+    except (TypeError, ValueError):
+        concurrency = DEFAULT_FETCH_CONCURRENCY
+    return max(1, min(concurrency, MAX_FETCH_CONCURRENCY))
+
+
+def matches_filters(path, size, extensions=None, max_file_size=None):
+    """Check a file against the extension and size filters"""
+    name = path.rsplit('/', 1)[-1]
+    if extensions and not any(name.endswith(ext) for ext in extensions):
+        return False
+    if max_file_size and size and size > max_file_size:
+        return False
+    return True
+
+
+def tree_entries(elements, extensions=None, max_files=None, max_file_size=DEFAULT_MAX_FILE_SIZE):
+    """Filter recursive tree elements (dicts with 'type', 'path', 'sha', 'size') down to matching file entries"""
+    entries = []
+    for element in elements:
+        if max_files and len(entries) >= max_files:
+            break
+        if element['type'] != 'blob':
+            continue
+        if not matches_filters(element['path'], element.get('size'), extensions, max_file_size):
+            continue
+
+        entries.append({
+            'name': element['path'].rsplit('/', 1)[-1],
+            'path': element['path'],
+            'sha': element['sha'],
+            'size': element.get('size')
+        })
+    return entries
+
+
+def list_tree_files(repo, ref=None, extensions=None, max_files=None, max_file_size=DEFAULT_MAX_FILE_SIZE):
+    """List matching files with a single recursive tree request
+
+    Filtering happens on the tree entries, before any content is downloaded.
+    Returns (entries, truncated) where truncated is GitHub's flag for trees
+    too large to list in one response.
+    """
+    with GITHUB_REQUEST_SECONDS.time(operation='tree'):
+        tree = repo.get_git_tree(ref or repo.default_branch, recursive=True)
+
+    elements = ({'type': element.type, 'path': element.path, 'sha': element.sha, 'size': element.size}
+                for element in tree.tree)
+    return tree_entries(elements, extensions, max_files, max_file_size), bool(getattr(tree, 'truncated', False))
+
+
+def decode_blob(encoding, content):
+    """Raw bytes of a Git Blobs API response's content"""
+    if encoding == 'base64':
+        return base64.b64decode(content or '')
+    return (content or '').encode('utf-8')
+
+
+def fetch_blob(repo, sha):
+    """Return a blob's raw bytes, downloading it only on a cache miss"""
+    blob_cache = get_blob_cache()
+    data = blob_cache.get(sha)
+    if data is not None:
+        return data
+
+    with GITHUB_REQUEST_SECONDS.time(operation='blob'):
+        blob = repo.get_git_blob(sha)
+    data = decode_blob(blob.encoding, blob.content)
+    blob_cache.put(sha, data)
+    return data
+
+
+def load_file_content(repo, file_data):
+    """Return the raw bytes of a contents API file entry
+
+    Inline base64 content is stored in the blob cache; entries without it
+    (revalidated listings, or files over the contents API's 1 MB inline limit)
+    are resolved through the blob cache and the Git Blobs API.
+    """
+    sha = file_data.get('sha')
+    content = file_data.get('content')
+    if content and file_data.get('encoding') == 'base64':
+        data = base64.b64decode(content)
+        get_blob_cache().put(sha, data)
+        return data
+    return fetch_blob(repo, sha)
+
+
+def _fetch_entry(repo, entry, on_fetched=None):
+    try:
+        content = fetch_blob(repo, entry['sha']).decode('utf-8')
+    except GitHubRateLimitExceeded:
+        # Fail the whole fetch rather than silently dropping the rest of the files
+        raise
+    except Exception:
+        # Skip files that can't be downloaded or decoded
+        return None
+    if on_fetched:
+        on_fetched(entry)
+    return dict(entry, content=content)
+
+
+def iter_files(repo, entries, concurrency=None, on_fetched=None, window=None):
+    """Download file contents concurrently, yielding each file in tree order as it arrives
+
+    At most window downloads (twice the concurrency by default) are in
+    flight or waiting to be consumed, so memory stays bounded however many
+    entries there are. Files that cannot be downloaded or decoded as UTF-8
+    are skipped. on_fetched, if given, is called with each entry once its
+    content is in.
+    """
+    if not entries:
+        return
+
+    workers = min(resolve_fetch_concurrency(concurrency), len(entries))
+    window = max(window or 2 * workers, workers)
+    entries = iter(entries)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for entry in itertools.islice(entries, window):
+                pending.append(executor.submit(_fetch_entry, repo, entry, on_fetched))
+            while pending:
+                result = pending.popleft().result()
+                # Refill the window before handing the file over, so downloads continue meanwhile
+                for entry in itertools.islice(entries, 1):
+                    pending.append(executor.submit(_fetch_entry, repo, entry, on_fetched))
+                if result is not None:
+                    yield result
+        finally:
+            # A consumer that stops early (e.g. a disconnected client) drops the downloads not yet started
+            for future in pending:
+                future.cancel()
+
+
+def fetch_files(repo, entries, concurrency=None, on_fetched=None):
+    """Download file contents concurrently, preserving tree order
+
+    Files that cannot be downloaded or decoded as UTF-8 are skipped.
+    on_fetched, if given, is called with each entry once its content is in.
+    """
+    if not entries:
+        return []
+
+    with GITHUB_REQUEST_SECONDS.time(operation='fetch_files'):
+        return list(iter_files(repo, entries, concurrency=concurrency, on_fetched=on_fetched, window=len(entries)))
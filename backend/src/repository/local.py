@@ -0,0 +1,177 @@
+"""Repository source for git checkouts on this host
+
+Files are enumerated with git ls-files, so .gitignore and the other exclude
+files are honored, and read through memory maps, so the content is hashed
+and decoded straight from the page cache. Nothing goes over the network.
+Only work trees under LOCAL_REPO_ROOTS can be read, and only by requests
+bearing the server's LOCAL_REPO_TOKEN: with either unset, local sources are
+disabled, since anyone who can reach the API could otherwise read every
+checkout under the roots and spend LLM calls on it.
+"""
+
+import hmac
+import mmap
+import os
+import stat
+import subprocess
+from contextlib import contextmanager
+
+from .blob_cache import git_blob_sha
+from .fetch import DEFAULT_MAX_FILE_SIZE, matches_filters
+from .sources import RepositorySource
+
+LOCAL_REPO_ROOTS = [
+    os.path.realpath(root) for root in os.getenv('LOCAL_REPO_ROOTS', '').split(os.pathsep) if root.strip()
+]
+LOCAL_REPO_TOKEN = os.getenv('LOCAL_REPO_TOKEN', '')
+GIT_TIMEOUT = float(os.getenv('LOCAL_GIT_TIMEOUT', '60'))
+
+# Mode of gitlink (submodule) index entries, which have no content in this work tree
+GITLINK_MODE = b'160000'
+
+
+def local_access_allowed(token):
+    """Whether a request's bearer token may read local checkouts: it must equal LOCAL_REPO_TOKEN"""
+    if not LOCAL_REPO_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode('utf-8'), LOCAL_REPO_TOKEN.encode('utf-8'))
+
+
+def resolve_local_repository(name):
+    """Return the work tree path for a repository name relative to one of LOCAL_REPO_ROOTS"""
+    if not LOCAL_REPO_ROOTS:
+        raise ValueError('Local repositories are not enabled. Set LOCAL_REPO_ROOTS on the server.')
+
+    for root in LOCAL_REPO_ROOTS:
+        path = os.path.realpath(os.path.join(root, name))
+        # Names may not escape their root, e.g. through '..' or symlinks
+        if os.path.commonpath([root, path]) != root:
+            continue
+        if os.path.exists(os.path.join(path, '.git')):
+            return path
+    raise ValueError(f'Local repository "{name}" not found under LOCAL_REPO_ROOTS')
+
+
+def _git(path, *args):
+    try:
+        return subprocess.run(
+            ['git', '-C', path, *args],
+            capture_output=True, check=True, timeout=GIT_TIMEOUT
+        ).stdout
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"git {args[0]} failed: {e.stderr.decode('utf-8', 'replace').strip()}") from e
+
+
+def _paths(output):
+    return [os.fsdecode(path) for path in output.split(b'\0') if path]
+
+
+@contextmanager
+def _mapped(full_path):
+    """Map a file read-only; empty files, which cannot be mapped, give empty bytes"""
+    with open(full_path, 'rb') as handle:
+        if not os.fstat(handle.fileno()).st_size:
+            yield b''
+            return
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+
+class LocalGitSource(RepositorySource):
+    """The checked-out work tree of a local git repository, including uncommitted changes"""
+
+    immutable = False
+
+    def __init__(self, path):
+        self.path = path
+
+    @classmethod
+    def open(cls, name):
+        return cls(resolve_local_repository(name))
+
+    def default_ref(self):
+        return _git(self.path, 'rev-parse', '--abbrev-ref', 'HEAD').decode('utf-8').strip()
+
+    def head_commit(self):
+        return _git(self.path, 'rev-parse', 'HEAD').decode('utf-8').strip()
+
+    def resolve_commit(self, ref):
+        self._check_ref(ref)
+        return self.head_commit()
+
+    def _check_ref(self, ref):
+        if ref in (None, 'HEAD') or ref == self.default_ref() or ref == self.head_commit():
+            return
+        raise ValueError('Local repositories are read from their checked-out work tree; omit ref or pass the current branch')
+
+    def list_files(self, ref, extensions=None, max_files=None, max_file_size=DEFAULT_MAX_FILE_SIZE):
+        """Tracked and untracked, non-ignored files matching the filters, in path order
+
+        Blob SHAs come from the index for files unchanged in the work tree and
+        are computed from the content otherwise, so they match what GitHub
+        reports for the same content. The listing is never truncated.
+        """
+        self._check_ref(ref)
+        staged = {}
+        for record in _git(self.path, 'ls-files', '-z', '--stage').split(b'\0'):
+            if not record:
+                continue
+            info, name = record.split(b'\t', 1)
+            mode, sha, stage = info.split()
+            if mode == GITLINK_MODE:
+                continue
+            # Unmerged paths have several stages; hash their work tree content instead
+            staged[os.fsdecode(name)] = sha.decode('ascii') if stage == b'0' else None
+        modified = set(_paths(_git(self.path, 'ls-files', '-z', '--modified')))
+        untracked = _paths(_git(self.path, 'ls-files', '-z', '--others', '--exclude-standard'))
+
+        entries = []
+        for path in sorted(set(staged).union(untracked)):
+            if max_files and len(entries) >= max_files:
+                break
+            try:
+                info = os.lstat(os.path.join(self.path, path))
+            except OSError:
+                # Deleted from the work tree but still in the index
+                continue
+            if not stat.S_ISREG(info.st_mode):
+                continue
+            if not matches_filters(path, info.st_size, extensions, max_file_size):
+                continue
+
+            sha = staged.get(path)
+            if sha is None or path in modified:
+                with _mapped(os.path.join(self.path, path)) as data:
+                    sha = git_blob_sha(data)
+            entries.append({
+                'name': path.rsplit('/', 1)[-1],
+                'path': path,
+                'sha': sha,
+                'size': info.st_size
+            })
+
+        return entries, False
+
+    def _read_entry(self, entry):
+        try:
+            with _mapped(os.path.join(self.path, entry['path'])) as data:
+                content = str(data, 'utf-8')
+                sha = git_blob_sha(data)
+                size = len(data)
+        except (OSError, UnicodeDecodeError):
+            # Skip files removed since listing or not valid UTF-8
+            return None
+        if sha != entry['sha']:
+            # Edited since it was listed
+            entry = dict(entry, sha=sha, size=size)
+        return dict(entry, content=content)
+
+    def iter_files(self, ref, entries, concurrency=None, on_fetched=None):
+        """Read entries' files from the work tree, one at a time, in tree order"""
+        for entry in entries:
+            file = self._read_entry(entry)
+            if file is None:
+                continue
+            if on_fetched:
+                on_fetched(entry)
+            yield file
@@ -0,0 +1,213 @@
+"""Per-token GitHub API budget, tracked from X-RateLimit-* response headers
+
+GitHub grants each token a number of core API requests per window and
+reports what is left on every response. Once the remaining budget drops into
+the reserve (GITHUB_RATE_LIMIT_RESERVE, a fraction of the limit), calls are
+spaced evenly over the rest of the window, so a long scan slows down instead
+of running dry. A call that would have to wait longer than its priority's
+maximum fails right away with GitHubRateLimitExceeded, which the routes
+return as 429 with Retry-After. Interactive calls wait at most
+GITHUB_RATE_LIMIT_MAX_WAIT seconds; background jobs ('batch') wait up to
+GITHUB_RATE_LIMIT_BATCH_MAX_WAIT, long enough to ride out a whole window.
+"""
+
+import asyncio
+import math
+import os
+import threading
+import time
+
+from llm.cache import LRUCache
+from llm.metrics import GITHUB_RATE_LIMITED, GITHUB_THROTTLE_SECONDS
+from llm.providers import fingerprint
+
+RATE_LIMIT_RESERVE = float(os.getenv('GITHUB_RATE_LIMIT_RESERVE', '0.1'))
+MAX_WAIT = {
+    'interactive': float(os.getenv('GITHUB_RATE_LIMIT_MAX_WAIT', '30')),
+    'batch': float(os.getenv('GITHUB_RATE_LIMIT_BATCH_MAX_WAIT', '3900'))
+}
+
+# GitHub asks clients hit by a secondary rate limit without Retry-After to wait at least a minute
+SECONDARY_LIMIT_DELAY = 60.0
+
+
+class GitHubRateLimitExceeded(Exception):
+    """Raised when a GitHub call cannot be made within the rate limit before its deadline"""
+
+    def __init__(self, retry_after, state=None):
+        super().__init__(f"GitHub rate limit exceeded. Retry in {math.ceil(retry_after)} seconds.")
+        self.retry_after = retry_after
+        self.state = state or {}
+
+
+def _header(headers, name):
+    for key, value in (headers or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _int_header(headers, name):
+    try:
+        return int(_header(headers, name))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_rate_limit_response(status, headers, body=None):
+    """Whether a GitHub response is a primary or secondary rate limit rejection"""
+    if status == 429:
+        return True
+    if status != 403:
+        return False
+    if _header(headers, 'retry-after') is not None or _int_header(headers, 'x-ratelimit-remaining') == 0:
+        return True
+    if isinstance(body, bytes):
+        body = body.decode('utf-8', 'replace')
+    return 'rate limit' in str(body or '').lower()
+
+
+class GitHubRateLimit:
+    """Core API budget of one token, shared by every client and worker using it
+
+    The remaining count is decremented locally as calls go out, so concurrent
+    workers do not all spend the last requests, and corrected from response
+    headers as they come back. Times are Unix timestamps, like X-RateLimit-Reset.
+    """
+
+    def __init__(self):
+        self.limit = None
+        self.remaining = None
+        self.reset_at = 0.0
+        self.cooldown_until = 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self, now, max_wait):
+        """Take the next request slot and return how long to wait for it; raise if that is over max_wait"""
+        if self.remaining is not None and now >= self.reset_at:
+            # A new window: the budget is unknown until the next response
+            self.remaining = None
+
+        if now < self.cooldown_until:
+            delay = self.cooldown_until - now
+        elif self.remaining is None or self.remaining > self.limit * RATE_LIMIT_RESERVE:
+            delay = 0.0
+        elif self.remaining <= 0:
+            delay = self.reset_at - now + 1
+        else:
+            # Spread what is left evenly over the rest of the window
+            slot = max(now, self._next_slot)
+            delay = slot - now
+            if delay <= max_wait:
+                self._next_slot = slot + (self.reset_at - now) / self.remaining
+
+        if delay > max_wait:
+            GITHUB_RATE_LIMITED.inc(reason='budget')
+            raise GitHubRateLimitExceeded(delay, self._state(now))
+        if self.remaining is not None:
+            self.remaining = max(0, self.remaining - 1)
+        return delay
+
+    def _delay(self, priority):
+        max_wait = MAX_WAIT.get(priority, MAX_WAIT['interactive'])
+        with self._lock:
+            delay = self._reserve(time.time(), max_wait)
+        if delay > 0:
+            GITHUB_THROTTLE_SECONDS.observe(delay, priority=priority)
+        return delay
+
+    def acquire(self, priority='interactive'):
+        """Block until a call may be sent within the budget"""
+        delay = self._delay(priority)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, priority='interactive'):
+        """Async counterpart of acquire"""
+        delay = self._delay(priority)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def update(self, headers):
+        """Take the budget from a response's X-RateLimit-* headers"""
+        resource = _header(headers, 'x-ratelimit-resource')
+        if resource and resource != 'core':
+            # Search and GraphQL have budgets of their own
+            return
+        remaining = _int_header(headers, 'x-ratelimit-remaining')
+        limit = _int_header(headers, 'x-ratelimit-limit')
+        reset_at = _int_header(headers, 'x-ratelimit-reset')
+        if remaining is None or limit is None or reset_at is None:
+            return
+
+        with self._lock:
+            if reset_at != self.reset_at or self.remaining is None:
+                self.remaining = remaining
+            else:
+                # Calls sent after this response was produced are already deducted
+                self.remaining = min(self.remaining, remaining)
+            self.limit = limit
+            self.reset_at = reset_at
+
+    def record_rate_limited(self, headers):
+        """Hold every call on this token back after GitHub rejected one; return the exception to raise"""
+        self.update(headers)
+        now = time.time()
+        retry_after = _int_header(headers, 'retry-after')
+        if retry_after is not None:
+            delay = retry_after
+        elif _int_header(headers, 'x-ratelimit-remaining') == 0:
+            delay = max(0.0, self.reset_at - now) + 1
+        else:
+            delay = SECONDARY_LIMIT_DELAY
+
+        with self._lock:
+            self.cooldown_until = max(self.cooldown_until, now + delay)
+            state = self._state(now)
+        GITHUB_RATE_LIMITED.inc(reason='response')
+        return GitHubRateLimitExceeded(delay, state)
+
+    def _state(self, now):
+        return {
+            'limit': self.limit,
+            'remaining': self.remaining,
+            'reset': int(self.reset_at) if self.reset_at else None,
+            'throttled': now < self.cooldown_until or (
+                self.remaining is not None and self.remaining <= self.limit * RATE_LIMIT_RESERVE
+            )
+        }
+
+    def state(self):
+        """Snapshot of the budget for clients: limit, remaining, reset time and whether calls are being held back"""
+        with self._lock:
+            return self._state(time.time())
+
+
+_budgets = LRUCache(max_size=1024)
+_budgets_lock = threading.Lock()
+
+
+def get_rate_limit(token):
+    """Return the shared budget for a token"""
+    key = fingerprint(token)
+    with _budgets_lock:
+        budget = _budgets.get(key)
+        if budget is None:
+            budget = GitHubRateLimit()
+            _budgets.set(key, budget)
+        return budget
+
+
+def rate_limit_headers(token):
+    """Response headers describing a token's budget, or none before GitHub has reported it"""
+    if not token:
+        return {}
+    state = get_rate_limit(token).state()
+    if state['remaining'] is None:
+        return {}
+    return {
+        'X-GitHub-RateLimit-Limit': str(state['limit']),
+        'X-GitHub-RateLimit-Remaining': str(state['remaining']),
+        'X-GitHub-RateLimit-Reset': str(state['reset'])
+    }
@@ -0,0 +1,86 @@
+"""Paginated listing of the authenticated user's repositories
+
+Each call requests a single page of GET /user/repos, with the filters passed
+through to GitHub, so the time it takes does not depend on how many
+repositories the account has. Pages are cached per token: a page younger
+than GITHUB_REPOSITORY_LIST_TTL is served as is, and an older one is
+revalidated with its ETag, which costs no rate limit when unchanged.
+"""
+
+import os
+
+from .blob_cache import get_listing_cache
+
+REPOSITORY_LIST_TTL = float(os.getenv('GITHUB_REPOSITORY_LIST_TTL', '60'))
+DEFAULT_PER_PAGE = 30
+MAX_PER_PAGE = 100
+
+# Filters of GET /user/repos passed through, with their accepted values (None = any)
+REPOSITORY_FILTERS = {
+    'visibility': ('all', 'public', 'private'),
+    'affiliation': None,
+    'type': ('all', 'owner', 'public', 'private', 'member'),
+    'sort': ('created', 'updated', 'pushed', 'full_name'),
+    'direction': ('asc', 'desc')
+}
+
+# Fields returned for each repository
+REPOSITORY_FIELDS = ('id', 'name', 'full_name', 'description', 'private', 'html_url', 'language', 'updated_at')
+
+
+def _page_number(cursor):
+    if not cursor:
+        return 1
+    try:
+        page = int(cursor)
+    except (TypeError, ValueError):
+        raise ValueError('Invalid cursor')
+    if page < 1:
+        raise ValueError('Invalid cursor')
+    return page
+
+
+def _per_page(requested):
+    if requested is None:
+        return DEFAULT_PER_PAGE
+    try:
+        return max(1, min(int(requested), MAX_PER_PAGE))
+    except (TypeError, ValueError):
+        raise ValueError('per_page must be a number')
+
+
+def repository_filters(args):
+    """Validated GitHub filters from request arguments"""
+    filters = {}
+    for name, allowed in REPOSITORY_FILTERS.items():
+        value = args.get(name)
+        if not value:
+            continue
+        if allowed and value not in allowed:
+            raise ValueError(f"{name} must be one of: {', '.join(allowed)}")
+        filters[name] = value
+    return filters
+
+
+def list_repositories_page(user, token, cursor=None, per_page=None, filters=None):
+    """Return one page of the user's repositories
+
+    user is the authenticated PyGithub user and cursor the 'next_cursor' of
+    the previous page (None for the first). The result holds 'repositories'
+    and 'next_cursor', which is None on the last page.
+    """
+    page = _page_number(cursor)
+    parameters = dict(filters or {}, page=page, per_page=_per_page(per_page))
+    data, headers = get_listing_cache().get_json(
+        user._requester, token, '/user/repos',
+        parameters=parameters,
+        operation='repositories',
+        max_age=REPOSITORY_LIST_TTL
+    )
+
+    # GitHub links the next page while there is one
+    has_next = 'rel="next"' in headers.get('link', '')
+    return {
+        'repositories': [{field: repo.get(field) for field in REPOSITORY_FIELDS} for repo in data or []],
+        'next_cursor': str(page + 1) if has_next else None
+    }
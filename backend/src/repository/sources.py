@@ -0,0 +1,155 @@
+"""Repository sources: where analyze-all lists and reads a repository's files
+
+A source lists the files matching the request filters as tree entries
+('name', 'path', 'sha', 'size', with 'sha' the Git blob SHA) and then loads
+their contents, so the routes, streaming and background jobs work the same
+whether files come from the GitHub API or from a checkout on this host.
+Each method has an async counterpart (prefixed with 'a') for the ASGI
+serving path; by default it runs the blocking method on a worker thread.
+"""
+
+import asyncio
+
+from llm.metrics import GITHUB_REQUEST_SECONDS
+
+from .archive import fetch_archive_files, iter_archive_files
+from .async_fetch import get_json, list_tree_files_async, fetch_files_async, iter_files_async, iterate_in_thread
+from .client import get_github
+from .fetch import DEFAULT_MAX_FILE_SIZE, list_tree_files, fetch_files, iter_files
+
+SOURCES = ('github', 'local')
+
+
+class RepositorySource:
+    """Interface for repository sources"""
+
+    # Whether a resolved commit always lists the same files; not so for a working tree
+    immutable = True
+
+    def default_ref(self):
+        raise NotImplementedError
+
+    def resolve_commit(self, ref):
+        """Return the commit SHA a ref points to"""
+        raise NotImplementedError
+
+    def list_files(self, ref, extensions=None, max_files=None, max_file_size=DEFAULT_MAX_FILE_SIZE):
+        """Return (entries, truncated) for the files matching the filters"""
+        raise NotImplementedError
+
+    def iter_files(self, ref, entries, concurrency=None, on_fetched=None):
+        """Yield entries' files with their 'content', holding only a small window in memory"""
+        raise NotImplementedError
+
+    def fetch_files(self, ref, entries, concurrency=None, on_fetched=None):
+        """Return entries' files with their 'content', in tree order"""
+        return list(self.iter_files(ref, entries, concurrency=concurrency, on_fetched=on_fetched))
+
+    async def adefault_ref(self):
+        return await asyncio.to_thread(self.default_ref)
+
+    async def alist_files(self, ref, extensions=None, max_files=None, max_file_size=DEFAULT_MAX_FILE_SIZE):
+        return await asyncio.to_thread(self.list_files, ref, extensions=extensions, max_files=max_files,
+                                       max_file_size=max_file_size)
+
+    def aiter_files(self, ref, entries, concurrency=None):
+        """Async iterator over entries' files; see iter_files"""
+        return iterate_in_thread(self.iter_files(ref, entries, concurrency=concurrency))
+
+    async def afetch_files(self, ref, entries, concurrency=None):
+        return await asyncio.to_thread(self.fetch_files, ref, entries, concurrency=concurrency)
+
+
+class GitHubSource(RepositorySource):
+    """Files from the GitHub API: blob by blob, or from one tarball with fetch='archive'
+
+    The async methods call the REST API directly with the token instead of
+    going through PyGithub on worker threads; tarballs are still read on one.
+    """
+
+    def __init__(self, repo, fetch=None, token=None, repo_name=None):
+        self.repo = repo
+        self.use_archive = fetch == 'archive'
+        self.token = token
+        self.repo_name = repo_name
+
+    def default_ref(self):
+        return self.repo.default_branch
+
+    def resolve_commit(self, ref):
+        with GITHUB_REQUEST_SECONDS.time(operation='commit'):
+            return self.repo.get_commit(ref).sha
+
+    def list_files(self, ref, extensions=None, max_files=None, max_file_size=DEFAULT_MAX_FILE_SIZE):
+        # One recursive tree listing, filtered before any content is downloaded
+        return list_tree_files(self.repo, ref=ref, extensions=extensions, max_files=max_files,
+                               max_file_size=max_file_size)
+
+    def iter_files(self, ref, entries, concurrency=None, on_fetched=None):
+        if self.use_archive:
+            return iter_archive_files(self.repo, ref, entries, on_fetched=on_fetched)
+        return iter_files(self.repo, entries, concurrency=concurrency, on_fetched=on_fetched)
+
+    def fetch_files(self, ref, entries, concurrency=None, on_fetched=None):
+        if self.use_archive:
+            return fetch_archive_files(self.repo, ref, entries, on_fetched=on_fetched)
+        return fetch_files(self.repo, entries, concurrency=concurrency, on_fetched=on_fetched)
+
+    async def adefault_ref(self):
+        repo = await get_json(self.token, f"/repos/{self.repo_name}", operation='repository')
+        return repo['default_branch']
+
+    async def alist_files(self, ref, extensions=None, max_files=None, max_file_size=DEFAULT_MAX_FILE_SIZE):
+        return await list_tree_files_async(self.token, self.repo_name, ref, extensions=extensions,
+                                           max_files=max_files, max_file_size=max_file_size)
+
+    def aiter_files(self, ref, entries, concurrency=None):
+        if self.use_archive:
+            return super().aiter_files(ref, entries, concurrency=concurrency)
+        return iter_files_async(self.token, self.repo_name, entries, concurrency=concurrency)
+
+    async def afetch_files(self, ref, entries, concurrency=None):
+        if self.use_archive:
+            return await super().afetch_files(ref, entries, concurrency=concurrency)
+        return await fetch_files_async(self.token, self.repo_name, entries, concurrency=concurrency)
+
+
+def validate_source(data):
+    """Return the request's source name, rejecting unknown ones"""
+    source = data.get('source') or 'github'
+    if source not in SOURCES:
+        raise ValueError(f"Unknown repository source: {source}")
+    return source
+
+
+def get_repository_source(repo_name, github_token, data, priority='interactive'):
+    """Build the source an analyze-all request reads from
+
+    'source': 'local' reads a checkout under LOCAL_REPO_ROOTS named by
+    repo_name, for a token equal to LOCAL_REPO_TOKEN; the default 'github'
+    reads through the API with the token, at the given rate limit priority
+    ('batch' waits out an exhausted budget).
+    """
+    if validate_source(data) == 'local':
+        # Imported here because the local source builds on this module
+        from .local import LocalGitSource, local_access_allowed
+        if not local_access_allowed(github_token):
+            raise ValueError('Local repositories require the server\'s LOCAL_REPO_TOKEN')
+        return LocalGitSource.open(repo_name)
+
+    with GITHUB_REQUEST_SECONDS.time(operation='repository'):
+        repo = get_github(github_token, priority=priority).get_repo(repo_name)
+    return GitHubSource(repo, fetch=data.get('fetch'), token=github_token, repo_name=repo_name)
+
+
+async def get_repository_source_async(repo_name, github_token, data, priority='interactive'):
+    """Async counterpart of get_repository_source
+
+    The GitHub repository is not looked up up front; the first API call
+    made through the source reports a missing one.
+    """
+    if validate_source(data) == 'local':
+        return await asyncio.to_thread(get_repository_source, repo_name, github_token, data, priority)
+
+    repo = get_github(github_token, priority=priority).get_repo(repo_name, lazy=True)
+    return GitHubSource(repo, fetch=data.get('fetch'), token=github_token, repo_name=repo_name)
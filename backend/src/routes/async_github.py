@@ -0,0 +1,92 @@
+from quart import Blueprint, request, jsonify, Response
+import sys
+import os
+
+# Add the parent directory to the path to import from repository package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from repository.fetch import DEFAULT_EXTENSIONS, DEFAULT_MAX_FILE_SIZE
+from repository.sources import get_repository_source_async, validate_source
+from repository.local import local_access_allowed
+from repository.rate_limit import GitHubRateLimitExceeded
+from jobs.tasks import analyze_all_task, analyze_all_params
+from .async_llm import submit_job_async
+from .common import (
+    STREAM_HEADERS, aiter_analyze_all_events, aiter_stream_records, github_rate_limit_headers,
+    rate_limited_response, stream_mimetype
+)
+
+async_github_bp = Blueprint('async_github', __name__)
+
+@async_github_bp.after_request
+async def add_rate_limit_headers(response):
+    """Report the caller's GitHub rate limit budget, as last seen by this process"""
+    response.headers.update(github_rate_limit_headers(request.headers))
+    return response
+
+@async_github_bp.route('/repository/<path:repo_name>/analyze-all', methods=['POST'])
+async def analyze_all_files(repo_name):
+    """Recursively analyze all files in a repository
+
+    With "stream": "ndjson" (or "sse") each file is sent as a record as soon
+    as it is downloaded, or once analyzed when an 'analysis' object is given.
+    """
+    try:
+        data = await request.get_json()
+        github_token = request.headers.get('Authorization')
+
+        # Remove 'Bearer ' prefix if present
+        if github_token and github_token.startswith('Bearer '):
+            github_token = github_token[7:]
+
+        # 'source': 'local' reads a checkout on this host; it takes the server's local repository token instead
+        if validate_source(data) == 'local':
+            if not local_access_allowed(github_token):
+                return jsonify({'error': 'Local repository token required'}), 401
+        elif not github_token:
+            return jsonify({'error': 'GitHub token required'}), 401
+
+        if data.get('async'):
+            # Run in the background job queue and return the job id right away
+            return await submit_job_async('analyze-all', analyze_all_task(repo_name, github_token, data),
+                                          analyze_all_params(repo_name, data), github_token)
+
+        filters = {
+            'extensions': data.get('extensions', DEFAULT_EXTENSIONS),
+            'max_files': data.get('max_files', 50),  # Limit to prevent overwhelming
+            'max_file_size': data.get('max_file_size', DEFAULT_MAX_FILE_SIZE)
+        }
+        concurrency = data.get('concurrency')
+
+        # Local checkouts are read on worker threads; GitHub is called without blocking the loop
+        source = await get_repository_source_async(repo_name, github_token, data)
+        ref = data.get('ref') or await source.adefault_ref()
+        entries, truncated = await source.alist_files(ref, **filters)
+
+        if data.get('stream'):
+            # Each file is sent as soon as it is loaded (and analyzed); only a small window is held in memory
+            start = {'repository': repo_name, 'ref': ref, 'truncated': truncated, 'files_total': len(entries)}
+            events = aiter_analyze_all_events(start, source.aiter_files(ref, entries, concurrency=concurrency),
+                                              data.get('analysis'))
+            return Response(
+                aiter_stream_records(events, data['stream']),
+                mimetype=stream_mimetype(data['stream']),
+                headers=STREAM_HEADERS
+            )
+
+        all_files = await source.afetch_files(ref, entries, concurrency=concurrency)
+
+        return jsonify({
+            'files': all_files,
+            'total_files': len(all_files),
+            'repository': repo_name,
+            'ref': ref,
+            'truncated': truncated
+        })
+
+    except GitHubRateLimitExceeded as e:
+        return rate_limited_response(e)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,115 @@
+from quart import Blueprint, request, jsonify, Response
+import asyncio
+import sys
+import os
+
+# Add the parent directory to the path to import from llm package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm.analysis import analyze_code_async, astream_analysis, analyze_multiple_files_async
+from llm.chat import handle_chat_followup_async, astream_chat_followup
+from llm.connection_test import test_llm_connection_async
+from llm.error_handling import handle_llm_error
+from llm.providers import fingerprint
+from jobs.queue import QueueFull, get_job_queue
+from jobs.tasks import analyze_multiple_task, analyze_multiple_params
+from .common import STREAM_HEADERS, aiter_stream_records, stream_mimetype
+
+async_llm_bp = Blueprint('async_llm', __name__)
+
+async def submit_job_async(kind, task, params, credential):
+    """Queue a job without blocking the event loop and build the 202 response"""
+    try:
+        job = await asyncio.to_thread(get_job_queue().submit, kind, task, params, fingerprint(credential))
+    except QueueFull as e:
+        return jsonify({'error': str(e), 'type': 'queue_full'}), 429
+
+    return jsonify({
+        'job': job,
+        'status_url': f"/api/jobs/{job['id']}",
+        'result_url': f"/api/jobs/{job['id']}/result"
+    }), 202
+
+def _sse_response(events):
+    """Stream ('token' | 'done', payload) tuples from an async generator as server-sent events"""
+    return Response(
+        aiter_stream_records(events, 'sse'),
+        mimetype=stream_mimetype('sse'),
+        headers=STREAM_HEADERS
+    )
+
+@async_llm_bp.route('/analyze', methods=['POST'])
+async def analyze_code_route():
+    """Analyze code and provide suggestions"""
+    try:
+        data = await request.get_json()
+        result = await analyze_code_async(data)
+        return jsonify(result)
+    except Exception as e:
+        error_response, status_code = handle_llm_error(e)
+        return jsonify(error_response), status_code
+
+@async_llm_bp.route('/analyze/stream', methods=['POST'])
+async def analyze_code_stream_route():
+    """Analyze code, streaming tokens as server-sent events"""
+    try:
+        data = await request.get_json()
+        # Validated before the stream opens, so a bad request gets a real status code
+        events = await astream_analysis(data)
+    except Exception as e:
+        error_response, status_code = handle_llm_error(e)
+        return jsonify(error_response), status_code
+
+    return _sse_response(events)
+
+@async_llm_bp.route('/analyze-multiple', methods=['POST'])
+async def analyze_multiple_files_route():
+    """Analyze multiple files and provide comprehensive analysis"""
+    try:
+        data = await request.get_json()
+        if data.get('async'):
+            # Run in the background job queue and return the job id right away
+            return await submit_job_async('analyze-multiple', analyze_multiple_task(data),
+                                          analyze_multiple_params(data), data.get('api_key'))
+
+        result = await analyze_multiple_files_async(data)
+        return jsonify(result)
+    except Exception as e:
+        error_response, status_code = handle_llm_error(e)
+        return jsonify(error_response), status_code
+
+@async_llm_bp.route('/chat', methods=['POST'])
+async def chat_route():
+    """Handle follow-up questions and conversations"""
+    try:
+        data = await request.get_json()
+        result = await handle_chat_followup_async(data)
+        return jsonify(result)
+    except Exception as e:
+        error_response, status_code = handle_llm_error(e)
+        return jsonify(error_response), status_code
+
+@async_llm_bp.route('/chat/stream', methods=['POST'])
+async def chat_stream_route():
+    """Handle follow-up questions, streaming tokens as server-sent events"""
+    try:
+        data = await request.get_json()
+        events = await astream_chat_followup(data)
+    except Exception as e:
+        error_response, status_code = handle_llm_error(e)
+        return jsonify(error_response), status_code
+
+    return _sse_response(events)
+
+@async_llm_bp.route('/test-connection', methods=['POST'])
+async def test_connection_route():
+    """Test connection to LLM provider with given configuration"""
+    try:
+        data = await request.get_json()
+        result = await test_llm_connection_async(data)
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
@@ -0,0 +1,126 @@
+"""Helpers shared by the Flask blueprints and their Quart (ASGI) counterparts
+
+Both frameworks accept a (body, status, headers) tuple with a dict body and
+a Response wrapped around a generator, so these helpers return plain values
+and generators; each blueprint wraps them in its own framework's Response.
+"""
+
+import json
+import math
+
+from llm.analysis import iter_map_reduce, aiter_map_reduce
+from llm.error_handling import handle_llm_error
+from repository.rate_limit import rate_limit_headers
+
+STREAM_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+
+def bearer_token(headers):
+    """The request's Authorization header without its 'Bearer ' prefix, or ''"""
+    token = headers.get('Authorization', '')
+    if token.startswith('Bearer '):
+        token = token[7:]
+    return token
+
+
+def github_rate_limit_headers(headers):
+    """Headers reporting the caller's GitHub rate limit budget, as last seen by this process"""
+    return rate_limit_headers(bearer_token(headers))
+
+
+def rate_limited_response(error):
+    """429 for a GitHub call refused under the rate limit, telling the client when to retry"""
+    retry_after = math.ceil(error.retry_after)
+    body = {
+        'error': str(error),
+        'type': 'rate_limit',
+        'retry_after': retry_after,
+        'rate_limit': error.state
+    }
+    return body, 429, {'Retry-After': str(retry_after)}
+
+
+def sse_event(event, payload):
+    """Format a server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+def stream_mimetype(stream_format):
+    return 'text/event-stream' if stream_format == 'sse' else 'application/x-ndjson'
+
+
+def stream_record(event, payload, stream_format):
+    """Format one streamed record as an NDJSON line, or as a server-sent event when stream_format is 'sse'
+
+    'token' payloads are bare text and are sent as {'content': text}.
+    """
+    if event == 'token':
+        payload = {'content': payload}
+    if stream_format == 'sse':
+        return sse_event(event, payload)
+    return json.dumps(dict(payload, event=event)) + '\n'
+
+
+def _error_record(error, stream_format):
+    error_response, status_code = handle_llm_error(error)
+    error_response['status'] = status_code
+    return stream_record('error', error_response, stream_format)
+
+
+def iter_stream_records(events, stream_format):
+    """Format (event, payload) tuples, reporting a failure part-way as a final 'error' record"""
+    try:
+        for event, payload in events:
+            yield stream_record(event, payload, stream_format)
+    except Exception as e:
+        yield _error_record(e, stream_format)
+
+
+async def aiter_stream_records(events, stream_format):
+    """Async counterpart of iter_stream_records for an async generator of events"""
+    try:
+        async for event, payload in events:
+            yield stream_record(event, payload, stream_format)
+    except Exception as e:
+        yield _error_record(e, stream_format)
+
+
+def iter_analyze_all_events(start, files, analysis):
+    """Events of a streamed analyze-all: 'start', one 'file' per file, then 'done'
+
+    Without an analysis each 'file' record carries the file's content; with
+    one it carries the file's metadata and per-file analysis instead.
+    """
+    events = iter_map_reduce(analysis, files) if analysis else None
+
+    def generate():
+        yield 'start', start
+        if events is not None:
+            yield from events
+            return
+        total = 0
+        for file in files:
+            total += 1
+            yield 'file', file
+        yield 'done', {'total_files': total}
+
+    return generate()
+
+
+def aiter_analyze_all_events(start, files, analysis):
+    """Async counterpart of iter_analyze_all_events for an async iterable of files"""
+    events = aiter_map_reduce(analysis, files) if analysis else None
+
+    async def generate():
+        yield 'start', start
+        if events is not None:
+            async for event, payload in events:
+                yield event, payload
+            return
+        total = 0
+        async for file in files:
+            total += 1
+            yield 'file', file
+        yield 'done', {'total_files': total}
+
+    return generate()
@@ -1,12 +1,41 @@
-from flask import Blueprint, request, jsonify
-from github import Github
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+import hashlib
+import sys
 import os
 
+# Add the parent directory to the path to import from repository package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from repository.fetch import DEFAULT_EXTENSIONS, DEFAULT_MAX_FILE_SIZE, load_file_content
+from repository.sources import get_repository_source, validate_source
+from repository.local import local_access_allowed
+from repository.blob_cache import get_listing_cache
+from repository.repositories import list_repositories_page, repository_filters
+from repository.client import get_github
+from repository.rate_limit import GitHubRateLimitExceeded
+from jobs.tasks import analyze_all_task, analyze_all_params
+from .common import (
+    STREAM_HEADERS, github_rate_limit_headers, iter_analyze_all_events, iter_stream_records,
+    rate_limited_response, stream_mimetype
+)
+from .jobs import submit_job
+
 github_bp = Blueprint('github', __name__)
 
+@github_bp.after_request
+def add_rate_limit_headers(response):
+    """Report the caller's GitHub rate limit budget, as last seen by this process"""
+    response.headers.update(github_rate_limit_headers(request.headers))
+    return response
+
 @github_bp.route('/repositories', methods=['GET'])
 def get_repositories():
-    """Get list of repositories for authenticated user"""
+    """Get one page of repositories for authenticated user
+
+    Query arguments: cursor (the previous page's next_cursor), per_page (up
+    to 100) and the GitHub filters visibility, affiliation, type, sort and
+    direction. Responses carry an ETag, so unchanged pages revalidate with 304.
+    """
     try:
         github_token = request.headers.get('Authorization')
         if not github_token:
@@ -16,24 +45,25 @@ def get_repositories():
         if github_token.startswith('Bearer '):
             github_token = github_token[7:]
         
-        g = Github(github_token)
-        user = g.get_user()
-        repos = []
-        
-        for repo in user.get_repos():
-            repos.append({
-                'id': repo.id,
-                'name': repo.name,
-                'full_name': repo.full_name,
-                'description': repo.description,
-                'private': repo.private,
-                'html_url': repo.html_url,
-                'language': repo.language,
-                'updated_at': repo.updated_at.isoformat() if repo.updated_at else None
-            })
+        g = get_github(github_token)
+        page = list_repositories_page(
+            g.get_user(),
+            github_token,
+            cursor=request.args.get('cursor'),
+            per_page=request.args.get('per_page'),
+            filters=repository_filters(request.args)
+        )
         
-        return jsonify({'repositories': repos})
+        response = jsonify(page)
+        response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+        # Per-user data: browsers may keep it but must revalidate
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response.make_conditional(request)
     
+    except GitHubRateLimitExceeded as e:
+        return rate_limited_response(e)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -50,37 +80,41 @@ def get_repository_contents(repo_name):
             github_token = github_token[7:]
         
         path = request.args.get('path', '')
+        ref = request.args.get('ref')
         
-        g = Github(github_token)
-        repo = g.get_repo(repo_name)
-        contents = repo.get_contents(path)
+        g = get_github(github_token)
+        repo = g.get_repo(repo_name, lazy=True)
+        # Conditional request: unchanged listings are served from cache via 304
+        contents = get_listing_cache().get_contents(repo, github_token, path, ref)
         
         if isinstance(contents, list):
             # Directory contents
             items = []
             for content in contents:
                 items.append({
-                    'name': content.name,
-                    'path': content.path,
-                    'type': content.type,
-                    'size': content.size,
-                    'sha': content.sha,
-                    'download_url': content.download_url
+                    'name': content['name'],
+                    'path': content['path'],
+                    'type': content['type'],
+                    'size': content['size'],
+                    'sha': content['sha'],
+                    'download_url': content.get('download_url')
                 })
             return jsonify({'contents': items, 'type': 'directory'})
         else:
-            # Single file
-            file_content = contents.decoded_content.decode('utf-8') if contents.content else ''
+            # Single file, resolved through the blob cache by SHA
+            file_content = load_file_content(repo, contents).decode('utf-8')
             return jsonify({
-                'name': contents.name,
-                'path': contents.path,
-                'type': contents.type,
-                'size': contents.size,
-                'sha': contents.sha,
+                'name': contents['name'],
+                'path': contents['path'],
+                'type': contents['type'],
+                'size': contents['size'],
+                'sha': contents['sha'],
                 'content': file_content,
-                'encoding': contents.encoding
+                'encoding': contents.get('encoding')
             })
     
+    except GitHubRateLimitExceeded as e:
+        return rate_limited_response(e)
     except Exception as e:
         error_msg = str(e)
         if "401" in error_msg or "Bad credentials" in error_msg:
@@ -106,85 +140,93 @@ def get_file_content(repo_name):
         if not file_path:
             return jsonify({'error': 'File path required'}), 400
         
-        g = Github(github_token)
-        repo = g.get_repo(repo_name)
-        file_content = repo.get_contents(file_path)
+        g = get_github(github_token)
+        repo = g.get_repo(repo_name, lazy=True)
+        file_content = get_listing_cache().get_contents(repo, github_token, file_path, request.args.get('ref'))
         
-        content = file_content.decoded_content.decode('utf-8')
+        content = load_file_content(repo, file_content).decode('utf-8')
         
         return jsonify({
-            'name': file_content.name,
-            'path': file_content.path,
+            'name': file_content['name'],
+            'path': file_content['path'],
             'content': content,
-            'size': file_content.size,
-            'sha': file_content.sha
+            'size': file_content['size'],
+            'sha': file_content['sha']
         })
     
+    except GitHubRateLimitExceeded as e:
+        return rate_limited_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @github_bp.route('/repository/<path:repo_name>/analyze-all', methods=['POST'])
 def analyze_all_files(repo_name):
-    """Recursively analyze all files in a repository"""
+    """Recursively analyze all files in a repository
+
+    With "stream": "ndjson" (or "sse") each file is sent as a record as soon
+    as it is downloaded, or once analyzed when an 'analysis' object is given.
+    """
     try:
+        data = request.get_json()
         github_token = request.headers.get('Authorization')
-        if not github_token:
-            return jsonify({'error': 'GitHub token required'}), 401
 
         # Remove 'Bearer ' prefix if present
-        if github_token.startswith('Bearer '):
+        if github_token and github_token.startswith('Bearer '):
             github_token = github_token[7:]
 
-        data = request.get_json()
-        file_extensions = data.get('extensions', ['.py', '.js', '.jsx', '.ts', '.tsx', '.java', '.cpp', '.c', '.cs'])
+        # 'source': 'local' reads a checkout on this host; it takes the server's local repository token instead
+        if validate_source(data) == 'local':
+            if not local_access_allowed(github_token):
+                return jsonify({'error': 'Local repository token required'}), 401
+        elif not github_token:
+            return jsonify({'error': 'GitHub token required'}), 401
+
+        if data.get('async'):
+            # Run in the background job queue and return the job id right away
+            return submit_job('analyze-all', analyze_all_task(repo_name, github_token, data),
+                              analyze_all_params(repo_name, data), github_token)
+
+        file_extensions = data.get('extensions', DEFAULT_EXTENSIONS)
         max_files = data.get('max_files', 50)  # Limit to prevent overwhelming
+        max_file_size = data.get('max_file_size', DEFAULT_MAX_FILE_SIZE)
 
-        g = Github(github_token)
-        repo = g.get_repo(repo_name)
+        # GitHub with 'fetch': 'archive' reads every file from one tarball download instead of a request per blob
+        source = get_repository_source(repo_name, github_token, data)
+        ref = data.get('ref') or source.default_ref()
 
-        def get_all_files(contents, current_files=[]):
-            if len(current_files) >= max_files:
-                return current_files
+        # One listing, filtered before any content is loaded
+        entries, truncated = source.list_files(
+            ref,
+            extensions=file_extensions,
+            max_files=max_files,
+            max_file_size=max_file_size
+        )
 
-            for content in contents:
-                if len(current_files) >= max_files:
-                    break
-
-                if content.type == "file":
-                    # Check if file extension is in our list
-                    if any(content.name.endswith(ext) for ext in file_extensions):
-                        try:
-                            file_content = content.decoded_content.decode('utf-8')
-                            current_files.append({
-                                'name': content.name,
-                                'path': content.path,
-                                'content': file_content,
-                                'size': content.size
-                            })
-                        except Exception:
-                            # Skip files that can't be decoded
-                            continue
-                elif content.type == "dir":
-                    # Recursively get files from subdirectory
-                    try:
-                        subdir_contents = repo.get_contents(content.path)
-                        current_files = get_all_files(subdir_contents, current_files)
-                    except Exception:
-                        # Skip directories that can't be accessed
-                        continue
-
-            return current_files
-
-        # Start from root
-        root_contents = repo.get_contents("")
-        all_files = get_all_files(root_contents)
+        if data.get('stream'):
+            # Each file is sent as soon as it is loaded (and analyzed); only a small window is held in memory
+            files = source.iter_files(ref, entries, concurrency=data.get('concurrency'))
+            start = {'repository': repo_name, 'ref': ref, 'truncated': truncated, 'files_total': len(entries)}
+            events = iter_analyze_all_events(start, files, data.get('analysis'))
+            return Response(
+                stream_with_context(iter_stream_records(events, data['stream'])),
+                mimetype=stream_mimetype(data['stream']),
+                headers=STREAM_HEADERS
+            )
+
+        all_files = source.fetch_files(ref, entries, concurrency=data.get('concurrency'))
 
         return jsonify({
             'files': all_files,
             'total_files': len(all_files),
-            'repository': repo_name
+            'repository': repo_name,
+            'ref': ref,
+            'truncated': truncated
         })
 
+    except GitHubRateLimitExceeded as e:
+        return rate_limited_response(e)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -209,7 +251,7 @@ def create_pull_request(repo_name):
         if not head:
             return jsonify({'error': 'Head branch required'}), 400
 
-        g = Github(github_token)
+        g = get_github(github_token)
         repo = g.get_repo(repo_name)
 
         pr = repo.create_pull(
@@ -227,5 +269,7 @@ def create_pull_request(repo_name):
             'state': pr.state
         })
 
+    except GitHubRateLimitExceeded as e:
+        return rate_limited_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
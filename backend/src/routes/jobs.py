@@ -0,0 +1,80 @@
+from flask import Blueprint, request, jsonify
+import sys
+import os
+
+# Add the parent directory to the path to import from jobs package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jobs.queue import get_job_queue, QueueFull
+from llm.providers import fingerprint
+from .common import bearer_token
+
+jobs_bp = Blueprint('jobs', __name__)
+
+def request_submitter():
+    """Fingerprint of the credential (GitHub token or API key) in the request's Authorization header"""
+    return fingerprint(bearer_token(request.headers))
+
+def submit_job(kind, task, params, credential):
+    """Queue a job and build the 202 response pointing at its status
+
+    credential is the GitHub token or API key the job was submitted with;
+    the job's status and result are only served to requests sending it in
+    their Authorization header.
+    """
+    try:
+        job = get_job_queue().submit(kind, task, params, submitter=fingerprint(credential))
+    except QueueFull as e:
+        return jsonify({'error': str(e), 'type': 'queue_full'}), 429
+
+    return jsonify({
+        'job': job,
+        'status_url': f"/api/jobs/{job['id']}",
+        'result_url': f"/api/jobs/{job['id']}/result"
+    }), 202
+
+@jobs_bp.route('', methods=['GET'])
+def list_jobs():
+    """List recent analysis jobs"""
+    try:
+        return jsonify({'jobs': get_job_queue().list(request_submitter())})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get a job's status and progress"""
+    try:
+        job = get_job_queue().get(job_id, request_submitter())
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@jobs_bp.route('/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """Get a finished job's result"""
+    try:
+        job = get_job_queue().get(job_id, request_submitter(), include_result=True)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        if job['status'] in ('queued', 'running'):
+            return jsonify({'error': 'Job not finished', 'job': job}), 409
+        return jsonify(job)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@jobs_bp.route('/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel a queued or running job"""
+    try:
+        queue = get_job_queue()
+        submitter = request_submitter()
+        if queue.get(job_id, submitter) is None:
+            return jsonify({'error': 'Job not found'}), 404
+        if not queue.cancel(job_id, submitter):
+            return jsonify({'error': 'Job already finished'}), 409
+        return jsonify(queue.get(job_id, submitter))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,4 +1,5 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+import json
 import sys
 import os
 
@@ -6,14 +7,26 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from llm.providers import DEFAULT_PROVIDERS
-from llm.analysis import analyze_code, analyze_multiple_files, get_all_sessions, get_session_history, clear_session_memory
-from llm.chat import handle_chat_followup
+from llm.routing import get_health_snapshot
+from llm.analysis import analyze_code, stream_analysis, analyze_multiple_files, get_all_sessions, get_session_history, clear_session_memory
+from llm.batch import iter_batch_results
+from llm.code_index import index_files, search_code_index
+from llm.chat import handle_chat_followup, stream_chat_followup
 from llm.connection_test import test_llm_connection
 from llm.error_handling import handle_llm_error
+from jobs.tasks import analyze_multiple_task, analyze_multiple_params, analyze_batch_task, analyze_batch_params
+from .common import STREAM_HEADERS, iter_stream_records, stream_mimetype
+from .jobs import submit_job
 
 llm_bp = Blueprint('llm', __name__)
 
-
+def _sse_response(events):
+    """Stream ('token' | 'done', payload) tuples to the client as server-sent events"""
+    return Response(
+        stream_with_context(iter_stream_records(events, 'sse')),
+        mimetype=stream_mimetype('sse'),
+        headers=STREAM_HEADERS
+    )
 
 @llm_bp.route('/providers', methods=['GET'])
 def get_providers():
@@ -26,6 +39,14 @@ def get_providers():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@llm_bp.route('/providers/health', methods=['GET'])
+def get_providers_health():
+    """Get circuit breaker state and latency percentiles of each provider route"""
+    try:
+        return jsonify({'routes': get_health_snapshot()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @llm_bp.route('/models', methods=['GET'])
 def get_models():
     """Get available models for a specific provider"""
@@ -51,18 +72,86 @@ def analyze_code_route():
     except Exception as e:
         error_response, status_code = handle_llm_error(e)
         return jsonify(error_response), status_code
-        
+
+@llm_bp.route('/analyze/stream', methods=['POST'])
+def analyze_code_stream_route():
+    """Analyze code, streaming tokens as server-sent events"""
+    try:
+        data = request.get_json()
+        # Validated before the stream opens, so a bad request gets a real status code
+        events = stream_analysis(data)
+    except Exception as e:
+        error_response, status_code = handle_llm_error(e)
+        return jsonify(error_response), status_code
+
+    return _sse_response(events)
+
 @llm_bp.route('/analyze-multiple', methods=['POST'])
 def analyze_multiple_files_route():
     """Analyze multiple files and provide comprehensive analysis"""
     try:
         data = request.get_json()
+        if data.get('async'):
+            # Run in the background job queue and return the job id right away
+            return submit_job('analyze-multiple', analyze_multiple_task(data),
+                              analyze_multiple_params(data), data.get('api_key'))
+
         result = analyze_multiple_files(data)
         return jsonify(result)
     except Exception as e:
         error_response, status_code = handle_llm_error(e)
         return jsonify(error_response), status_code
 
+@llm_bp.route('/analyze-batch', methods=['POST'])
+def analyze_batch_route():
+    """Analyze many code items with shared settings, streaming one JSON line per item
+
+    With "provider_batch": true the items are submitted through the provider's
+    Batch API instead, as a background job whose id is returned right away.
+    """
+    try:
+        data = request.get_json()
+        if data.get('provider_batch'):
+            return submit_job('analyze-batch', analyze_batch_task(data), analyze_batch_params(data),
+                              data.get('api_key'))
+
+        results = iter_batch_results(data)
+    except Exception as e:
+        error_response, status_code = handle_llm_error(e)
+        return jsonify(error_response), status_code
+
+    def generate():
+        for result in results:
+            yield json.dumps(result) + '\n'
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@llm_bp.route('/code-index', methods=['POST'])
+def index_files_route():
+    """Index files for retrieval by 'retrieval' analyses and chat"""
+    try:
+        data = request.get_json()
+        result = index_files(data)
+        return jsonify(result)
+    except Exception as e:
+        error_response, status_code = handle_llm_error(e)
+        return jsonify(error_response), status_code
+
+@llm_bp.route('/code-index/search', methods=['POST'])
+def search_code_index_route():
+    """Find the indexed code chunks most relevant to a query"""
+    try:
+        data = request.get_json()
+        result = search_code_index(data)
+        return jsonify(result)
+    except Exception as e:
+        error_response, status_code = handle_llm_error(e)
+        return jsonify(error_response), status_code
+
 @llm_bp.route('/chat', methods=['POST'])
 def chat_route():
     """Handle follow-up questions and conversations"""
@@ -74,6 +163,18 @@ def chat_route():
         error_response, status_code = handle_llm_error(e)
         return jsonify(error_response), status_code
 
+@llm_bp.route('/chat/stream', methods=['POST'])
+def chat_stream_route():
+    """Handle follow-up questions, streaming tokens as server-sent events"""
+    try:
+        data = request.get_json()
+        events = stream_chat_followup(data)
+    except Exception as e:
+        error_response, status_code = handle_llm_error(e)
+        return jsonify(error_response), status_code
+
+    return _sse_response(events)
+
 @llm_bp.route('/test-connection', methods=['POST'])
 def test_connection_route():
     """Test connection to LLM provider with given configuration"""
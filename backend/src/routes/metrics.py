@@ -0,0 +1,15 @@
+from flask import Blueprint, Response
+import sys
+import os
+
+# Add the parent directory to the path to import from llm package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm.metrics import render_metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Expose latency, token, cache and error metrics in the Prometheus text format"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,8 @@
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The app imports its packages from backend/src, as the routes do, and its models as src.models
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'src'))
+sys.path.insert(1, BACKEND_DIR)
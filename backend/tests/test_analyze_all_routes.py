@@ -0,0 +1,118 @@
+import asyncio
+import json
+
+import pytest
+from flask import Flask
+from quart import Quart
+
+from benchmarks.mock_github import OWNER, REPO, start_mock_github
+from benchmarks.mock_openai import MockLLMConfig, start_mock_llm
+from llm.cache import LRUCache
+from repository import async_fetch, blob_cache, client
+from routes.async_github import async_github_bp
+from routes.common import iter_stream_records, stream_record
+from routes.github import github_bp
+
+PATH = f"/api/github/repository/{OWNER}/{REPO}/analyze-all"
+HEADERS = {'Authorization': 'Bearer test-token'}
+REQUEST = {'extensions': ['.py', '.js'], 'max_files': 20}
+
+
+@pytest.fixture(autouse=True)
+def mock_github(tmp_path, monkeypatch):
+    server = start_mock_github(file_count=12, file_size=400)
+    monkeypatch.setattr(client, 'GITHUB_API_URL', server.base_url)
+    monkeypatch.setattr(async_fetch, 'GITHUB_API_URL', server.base_url)
+    monkeypatch.setattr(client, '_clients', LRUCache(max_size=16))
+    monkeypatch.setattr(async_fetch, '_client', None)
+    monkeypatch.setenv('GITHUB_BLOB_CACHE_DIR', str(tmp_path / 'blobs'))
+    monkeypatch.setattr(blob_cache, '_blob_cache', None)
+    yield server
+    server.shutdown()
+
+
+def flask_post(body):
+    app = Flask(__name__)
+    app.register_blueprint(github_bp, url_prefix='/api/github')
+    response = app.test_client().post(PATH, json=body, headers=HEADERS)
+    return response.status_code, response.get_data(as_text=True)
+
+
+def quart_post(body):
+    app = Quart(__name__)
+    app.register_blueprint(async_github_bp, url_prefix='/api/github')
+
+    async def post():
+        response = await app.test_client().post(PATH, json=body, headers=HEADERS)
+        return response.status_code, await response.get_data(as_text=True)
+
+    return asyncio.run(post())
+
+
+@pytest.mark.parametrize('fetch', [None, 'archive'])
+def test_sync_and_async_routes_return_the_same_files(fetch):
+    body = dict(REQUEST, fetch=fetch)
+    flask_status, flask_body = flask_post(body)
+    quart_status, quart_body = quart_post(body)
+
+    assert flask_status == quart_status == 200
+    flask_result, quart_result = json.loads(flask_body), json.loads(quart_body)
+    assert flask_result['total_files'] == 12
+    assert flask_result == quart_result
+
+
+def test_sync_and_async_streams_send_the_same_records():
+    body = dict(REQUEST, stream='ndjson')
+    flask_status, flask_body = flask_post(body)
+    quart_status, quart_body = quart_post(body)
+
+    assert flask_status == quart_status == 200
+    flask_records = [json.loads(line) for line in flask_body.splitlines()]
+    quart_records = [json.loads(line) for line in quart_body.splitlines()]
+    assert [record['event'] for record in flask_records] == ['start'] + ['file'] * 12 + ['done']
+    assert flask_records == quart_records
+
+
+def test_records_are_ndjson_lines_or_server_sent_events():
+    assert json.loads(stream_record('file', {'path': 'a.py'}, 'ndjson')) == {'path': 'a.py', 'event': 'file'}
+    assert stream_record('token', 'def', 'ndjson') == '{"content": "def", "event": "token"}\n'
+    assert stream_record('done', {'total_files': 2}, 'sse') == 'event: done\ndata: {"total_files": 2}\n\n'
+
+
+def test_failure_part_way_ends_the_stream_with_an_error_record():
+    def events():
+        yield 'file', {'path': 'a.py'}
+        raise RuntimeError('Rate limit reached for requests')
+
+    records = [json.loads(line) for line in iter_stream_records(events(), 'ndjson')]
+
+    assert [record['event'] for record in records] == ['file', 'error']
+    assert records[-1]['status'] == 429
+    assert records[-1]['type'] == 'rate_limit'
+
+
+@pytest.mark.parametrize('post', [flask_post, quart_post])
+def test_server_sent_events_stream(post):
+    status, text = post(dict(REQUEST, stream='sse'))
+
+    assert status == 200
+    events = [block.split('\n', 1)[0] for block in text.strip().split('\n\n')]
+    assert events == ['event: start'] + ['event: file'] * 12 + ['event: done']
+
+
+@pytest.mark.parametrize('post', [flask_post, quart_post])
+def test_analyzed_stream_sends_each_review_then_the_synthesis(post):
+    llm = start_mock_llm(MockLLMConfig(latency=0, token_rate=0, completion_tokens=4))
+    try:
+        status, text = post(dict(REQUEST, stream='ndjson', analysis={
+            'provider': 'custom', 'model': 'mock', 'api_key': 'sk-test', 'base_url': llm.base_url, 'fallbacks': []
+        }))
+    finally:
+        llm.shutdown()
+
+    assert status == 200
+    records = [json.loads(line) for line in text.splitlines()]
+    assert [record['event'] for record in records] == ['start'] + ['file'] * 12 + ['done']
+    assert all(record['analysis'] and 'content' not in record for record in records[1:-1])
+    assert records[-1]['analysis']
+    assert llm.stats.requests == 13
@@ -0,0 +1,71 @@
+import pytest
+
+from benchmarks.mock_github import OWNER, REPO, start_mock_github
+from llm.cache import LRUCache
+from repository import blob_cache, client
+from repository.archive import fetch_archive_files
+from repository.blob_cache import get_blob_cache, git_blob_sha
+from repository.fetch import list_tree_files
+
+
+@pytest.fixture
+def github(tmp_path, monkeypatch):
+    server = start_mock_github(file_count=5, file_size=300)
+    monkeypatch.setattr(client, 'GITHUB_API_URL', server.base_url)
+    monkeypatch.setattr(client, '_clients', LRUCache(max_size=16))
+    monkeypatch.setenv('GITHUB_BLOB_CACHE_DIR', str(tmp_path / 'blobs'))
+    monkeypatch.setattr(blob_cache, '_blob_cache', None)
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def repo(github):
+    return client.get_github('test-token').get_repo(f"{OWNER}/{REPO}")
+
+
+def test_archive_files_match_the_tree(github, repo):
+    entries, _ = list_tree_files(repo, extensions=['.py', '.js'])
+    fetched = []
+
+    files = fetch_archive_files(repo, 'main', entries, on_fetched=fetched.append)
+
+    assert [file['path'] for file in files] == [entry['path'] for entry in entries]
+    assert all(file['content'].encode() == github.files[file['path']] for file in files)
+    assert len(fetched) == len(entries)
+    assert all(get_blob_cache().get(entry['sha']) is not None for entry in entries)
+
+
+def test_file_changed_since_the_listing_gets_the_archive_sha(github, repo):
+    entries, _ = list_tree_files(repo, extensions=['.py'])
+    moved = entries[0]['path']
+    github.files[moved] += b'# pushed after the tree was listed\n'
+
+    files = {file['path']: file for file in fetch_archive_files(repo, 'main', entries)}
+
+    new_sha = git_blob_sha(github.files[moved])
+    assert files[moved]['sha'] == new_sha != entries[0]['sha']
+    assert files[moved]['size'] == len(github.files[moved])
+    assert files[moved]['content'].endswith('# pushed after the tree was listed\n')
+    assert get_blob_cache().get(new_sha) == github.files[moved]
+    assert all(files[entry['path']]['sha'] == entry['sha'] for entry in entries[1:])
+
+
+def test_cached_files_need_no_download(github, repo):
+    entries, _ = list_tree_files(repo, extensions=['.py'])
+    fetch_archive_files(repo, 'main', entries)
+    requests_before = github.requests
+
+    files = fetch_archive_files(repo, 'main', entries)
+
+    assert len(files) == len(entries)
+    assert github.requests == requests_before
+
+
+def test_files_missing_from_the_archive_are_skipped(github, repo):
+    entries, _ = list_tree_files(repo, extensions=['.py'])
+    deleted = dict(entries[0], path='src/deleted.py', sha='0' * 40)
+
+    files = fetch_archive_files(repo, 'main', [deleted] + entries)
+
+    assert [file['path'] for file in files] == [entry['path'] for entry in entries]
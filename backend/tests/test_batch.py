@@ -0,0 +1,80 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from llm import batch as llm_batch
+
+
+class FakeBatchAPI:
+    """The Files and Batches endpoints of an OpenAI-compatible provider, finishing after a number of polls"""
+
+    def __init__(self, polls_until_done):
+        self.polls_until_done = polls_until_done
+        self.retrieved = 0
+        self.cancelled = []
+        self.input = None
+        self.files = SimpleNamespace(create=self._create_file, content=self._file_content)
+        self.batches = SimpleNamespace(create=self._create_batch, retrieve=self._retrieve, cancel=self.cancelled.append)
+
+    def _create_file(self, file, purpose):
+        self.input = [json.loads(line) for line in file[1].decode('utf-8').splitlines()]
+        return SimpleNamespace(id='file-in')
+
+    def _create_batch(self, input_file_id, endpoint, completion_window):
+        return SimpleNamespace(id='batch-1', status='validating', output_file_id=None, error_file_id=None)
+
+    def _retrieve(self, batch_id):
+        self.retrieved += 1
+        if self.retrieved < self.polls_until_done:
+            return SimpleNamespace(id=batch_id, status='in_progress', output_file_id=None, error_file_id=None)
+        return SimpleNamespace(id=batch_id, status='completed', output_file_id='file-out', error_file_id=None)
+
+    def _file_content(self, file_id):
+        lines = [
+            json.dumps({'custom_id': request['custom_id'], 'response': {'status_code': 200, 'body': {
+                'choices': [{'message': {'content': f"review of {request['custom_id']}"}}],
+                'usage': {'prompt_tokens': 10, 'completion_tokens': 5}
+            }}})
+            for request in self.input
+        ]
+        return SimpleNamespace(text='\n'.join(lines))
+
+
+def prepared_batch(api):
+    settings, groups = llm_batch.prepare_batch({
+        'provider': 'openai', 'model': 'gpt-4o-mini', 'api_key': 'sk-test', 'cache': False,
+        'items': [{'id': 'a', 'code': 'print(1)'}, {'id': 'b', 'code': 'print(2)'}, {'id': 'c', 'code': 'print(1)'}]
+    })
+    return {'settings': settings, 'groups': groups, 'client': api}
+
+
+def test_provider_batch_is_polled_without_waiting():
+    api = FakeBatchAPI(polls_until_done=3)
+    run = llm_batch.start_provider_batch(prepared_batch(api))
+
+    assert len(api.input) == 2
+    assert llm_batch.poll_provider_batch(run) is None
+    assert llm_batch.poll_provider_batch(run) is None
+    result = llm_batch.poll_provider_batch(run)
+
+    assert result['batch_status'] == 'completed'
+    assert [item['id'] for item in result['results']] == ['a', 'b', 'c']
+    assert result['results'][2]['deduplicated'] is True
+    assert result['results'][0]['analysis'] == 'review of item-0'
+
+
+def test_cancelled_poll_cancels_the_provider_batch():
+    api = FakeBatchAPI(polls_until_done=10)
+    run = llm_batch.start_provider_batch(prepared_batch(api))
+
+    class Cancelled(Exception):
+        pass
+
+    def check_cancelled():
+        raise Cancelled()
+
+    with pytest.raises(Cancelled):
+        llm_batch.poll_provider_batch(run, check_cancelled=check_cancelled)
+    assert api.cancelled == ['batch-1']
+
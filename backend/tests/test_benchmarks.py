@@ -0,0 +1,115 @@
+import io
+import json
+import tarfile
+
+import httpx
+import pytest
+
+from benchmarks.mock_github import OWNER, REPO, start_mock_github
+from benchmarks.mock_openai import MockLLMConfig, start_mock_llm
+from benchmarks.run import percentile, run_scenario
+from repository.blob_cache import git_blob_sha
+
+CHAT = {'model': 'mock', 'messages': [{'role': 'user', 'content': 'Review this function please'}]}
+
+
+@pytest.fixture
+def github():
+    server = start_mock_github(file_count=6, file_size=300)
+    yield server
+    server.shutdown()
+
+
+def mock_llm(**config):
+    return start_mock_llm(MockLLMConfig(**dict({'latency': 0, 'token_rate': 0}, **config)))
+
+
+def test_mock_provider_reports_usage_capped_by_max_tokens():
+    server = mock_llm(completion_tokens=50)
+    try:
+        response = httpx.post(f"{server.base_url}/chat/completions", json=dict(CHAT, max_tokens=5))
+    finally:
+        server.shutdown()
+
+    body = response.json()
+    assert response.status_code == 200
+    assert len(body['choices'][0]['message']['content'].split()) == 5
+    assert body['usage']['completion_tokens'] == 5
+    assert server.stats.to_dict()['completion_tokens'] == 5
+
+
+def test_mock_provider_streams_usage_last_when_asked():
+    server = mock_llm(completion_tokens=3)
+    try:
+        response = httpx.post(f"{server.base_url}/chat/completions",
+                              json=dict(CHAT, stream=True, stream_options={'include_usage': True}))
+    finally:
+        server.shutdown()
+
+    events = [line[len('data: '):] for line in response.text.split('\n\n') if line]
+    assert events[-1] == '[DONE]'
+    assert json.loads(events[-2])['usage']['completion_tokens'] == 3
+    words = [json.loads(event)['choices'][0]['delta'].get('content', '') for event in events[:-2]]
+    assert ''.join(words).split() == ['the', 'function', 'handles']
+
+
+def test_mock_provider_rate_limits_with_retry_after():
+    server = mock_llm(rate_limit_rate=1.0, retry_after=2.5)
+    try:
+        response = httpx.post(f"{server.base_url}/chat/completions", json=CHAT)
+    finally:
+        server.shutdown()
+
+    assert response.status_code == 429
+    assert response.headers['retry-after'] == '2.5'
+    assert server.stats.to_dict()['rate_limited'] == 1
+
+
+def test_mock_github_tree_and_blobs_agree_with_git(github):
+    tree = httpx.get(f"{github.repo_url}/git/trees/main", params={'recursive': '1'}).json()
+    blobs = [entry for entry in tree['tree'] if entry['type'] == 'blob']
+
+    assert sorted(entry['path'] for entry in blobs) == sorted(github.files)
+    for entry in blobs:
+        blob = httpx.get(entry['url']).json()
+        assert git_blob_sha(github.files[entry['path']]) == blob['sha'] == entry['sha']
+
+
+def test_mock_github_revalidates_contents_listings(github):
+    first = httpx.get(f"{github.repo_url}/contents")
+    second = httpx.get(f"{github.repo_url}/contents", headers={'If-None-Match': first.headers['etag']})
+
+    assert first.status_code == 200
+    assert second.status_code == 304
+    assert second.content == b''
+
+
+def test_mock_github_tarball_holds_every_file(github):
+    response = httpx.get(f"{github.repo_url}/tarball/main", follow_redirects=True)
+
+    with tarfile.open(fileobj=io.BytesIO(response.content), mode='r:gz') as archive:
+        members = {member.name.split('/', 1)[1]: archive.extractfile(member).read() for member in archive.getmembers()}
+        assert archive.pax_headers['comment'] == github.commit_json()['sha']
+    assert response.url.path == f"/archive/{OWNER}-{REPO}.tar.gz"
+    assert members == github.files
+
+
+def test_percentile_uses_the_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([7], 95) == 7
+    assert percentile([], 50) is None
+
+
+def test_scenario_counts_successes_and_failures_by_status(github):
+    result = run_scenario(
+        github.base_url,
+        lambda index: ('GET', '/user' if index % 2 else '/missing', None, None),
+        total=6, concurrency=3, timeout=5
+    )
+
+    assert result['succeeded'] == 3
+    assert result['failures'] == {'404': 3}
+    assert result['p50_ms'] <= result['p99_ms'] <= result['max_ms']
+    assert github.requests == 6
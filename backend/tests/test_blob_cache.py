@@ -0,0 +1,106 @@
+import os
+
+from repository.blob_cache import BlobCache, ListingCache, git_blob_sha
+
+
+class FakeRequester:
+    """Answers like GitHub: 304 with no body when If-None-Match matches the current ETag"""
+
+    def __init__(self, data, etag='"v1"'):
+        self.data = data
+        self.etag = etag
+        self.requests = []
+
+    def requestJsonAndCheck(self, verb, url, parameters=None, headers=None):
+        self.requests.append(headers)
+        if headers and headers.get('If-None-Match') == self.etag:
+            return {}, None
+        return {'ETag': self.etag, 'X-RateLimit-Remaining': '4999'}, self.data
+
+
+def test_git_blob_sha_matches_git():
+    # git hash-object of "hello\n"
+    assert git_blob_sha(b'hello\n') == 'ce013625030ba8dba906f756967f9e9ca394464a'
+
+
+def test_blobs_survive_a_restart_on_disk(tmp_path):
+    data = b'print("hi")\n'
+    sha = git_blob_sha(data)
+    BlobCache(disk_dir=str(tmp_path)).put(sha, data)
+
+    assert BlobCache(disk_dir=str(tmp_path)).get(sha) == data
+
+
+def test_corrupt_disk_entries_are_discarded(tmp_path):
+    data = b'value = 1\n'
+    sha = git_blob_sha(data)
+    BlobCache(disk_dir=str(tmp_path)).put(sha, data)
+    path = tmp_path / sha[:2] / sha
+    path.write_bytes(b'value = 2\n')
+
+    assert BlobCache(disk_dir=str(tmp_path)).get(sha) is None
+    assert not path.exists()
+
+
+def test_disk_store_evicts_least_recently_used_blobs(tmp_path):
+    cache = BlobCache(memory_bytes=0, disk_dir=str(tmp_path), disk_bytes=250)
+    blobs = [bytes([n]) * 100 for n in range(3)]
+    for n, data in enumerate(blobs[:2]):
+        cache.put(git_blob_sha(data), data)
+        os.utime(tmp_path / git_blob_sha(data)[:2] / git_blob_sha(data), (n, n))
+
+    cache.put(git_blob_sha(blobs[2]), blobs[2])
+
+    assert cache.get(git_blob_sha(blobs[0])) is None
+    assert cache.get(git_blob_sha(blobs[1])) == blobs[1]
+    assert cache.get(git_blob_sha(blobs[2])) == blobs[2]
+
+
+def test_listing_is_revalidated_with_its_etag():
+    requester = FakeRequester([{'name': 'app.py', 'sha': 'b1'}])
+    cache = ListingCache()
+
+    first, headers = cache.get_json(requester, 'token', 'https://api.github.com/repos/o/r/contents')
+    second, revalidated_headers = cache.get_json(requester, 'token', 'https://api.github.com/repos/o/r/contents')
+
+    assert first == second == [{'name': 'app.py', 'sha': 'b1'}]
+    assert revalidated_headers == headers == {'etag': '"v1"', 'x-ratelimit-remaining': '4999'}
+    assert requester.requests == [None, {'If-None-Match': '"v1"'}]
+
+
+def test_changed_listing_replaces_the_cached_copy():
+    requester = FakeRequester(['old'])
+    cache = ListingCache()
+    cache.get_json(requester, 'token', 'https://api.github.com/user/repos')
+    requester.data, requester.etag = ['new'], '"v2"'
+
+    assert cache.get_json(requester, 'token', 'https://api.github.com/user/repos')[0] == ['new']
+    assert cache.get_json(requester, 'token', 'https://api.github.com/user/repos')[0] == ['new']
+    assert requester.requests[-1] == {'If-None-Match': '"v2"'}
+
+
+def test_listings_are_scoped_to_the_token():
+    requester = FakeRequester(['private repo'])
+    cache = ListingCache()
+    cache.get_json(requester, 'alice-token', 'https://api.github.com/user/repos')
+    cache.get_json(requester, 'bob-token', 'https://api.github.com/user/repos')
+
+    assert requester.requests == [None, None]
+
+
+def test_fresh_listings_skip_the_request():
+    requester = FakeRequester(['repo'])
+    cache = ListingCache()
+    cache.get_json(requester, 'token', 'https://api.github.com/user/repos', max_age=60)
+    cache.get_json(requester, 'token', 'https://api.github.com/user/repos', max_age=60)
+
+    assert requester.requests == [None]
+
+
+def test_file_bodies_are_not_kept_in_the_listing_cache():
+    requester = FakeRequester({'path': 'app.py', 'sha': 'b1', 'content': 'eD0xCg==', 'encoding': 'base64'})
+    cache = ListingCache()
+    repo = type('Repo', (), {'url': 'https://api.github.com/repos/o/r', '_requester': requester})()
+
+    assert cache.get_contents(repo, 'token', 'app.py')['content'] == 'eD0xCg=='
+    assert 'content' not in cache.get_contents(repo, 'token', 'app.py')
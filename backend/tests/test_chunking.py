@@ -0,0 +1,107 @@
+import pytest
+from langchain_core.messages import AIMessage
+
+from llm import response_cache
+from llm.analysis import CHUNK_BUDGET_RATIO, prepare_analysis, run_analysis
+from llm.chunking import number_lines, split_code
+from llm.tokens import count_tokens
+
+MODEL = 'gpt-4o-mini'
+
+
+def python_source(functions=60):
+    return ''.join(
+        f"def function_{n}(value):\n    total = value * {n}\n    return total + {n}\n\n"
+        for n in range(functions)
+    )
+
+
+@pytest.fixture
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(response_cache, '_response_cache', response_cache.MemoryBackend())
+
+
+class FlakyChunkLLM:
+    """Fails the second chunk on the first call only, like a transient rate limit"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        if self.calls == 2:
+            raise RuntimeError('provider overloaded')
+        return AIMessage(content=f"findings {self.calls}")
+
+
+def analysis_job(code, **options):
+    request = {'code': code, 'provider': 'openai', 'model': MODEL, 'api_key': 'test-key',
+               'max_tokens': 200, 'context_limit': 1200, 'filename': 'module.py'}
+    request.update(options)
+    return prepare_analysis(request)
+
+
+def test_numbered_chunks_fit_their_budget():
+    code = python_source()
+    for chunk in split_code(code, 150, 'python', MODEL, numbered=True):
+        # Lines counted apart can come to a few tokens less than together; analysis leaves headroom for it
+        assert count_tokens(number_lines(chunk['code'], chunk['start_line']), MODEL) <= 150 / CHUNK_BUDGET_RATIO
+
+
+def test_chunks_cover_every_line_once():
+    code = python_source()
+    chunks = split_code(code, 150, 'python', MODEL, numbered=True)
+
+    assert chunks[0]['start_line'] == 1
+    assert chunks[-1]['end_line'] == len(code.splitlines())
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk['start_line'] == previous['end_line'] + 1
+    assert ''.join(chunk['code'] for chunk in chunks) == code
+
+
+def test_large_file_is_analyzed_in_chunks_without_truncation():
+    code = python_source()
+    job = analysis_job(code)
+
+    assert len(job['chunks']) > 1
+    assert job['truncated_chunks'] == []
+    assert job['truncated'] is False
+    # Every line of the file reaches the model, numbered as in the original
+    prompts = ''.join(message.content for messages in job['chunk_messages'] for message in messages)
+    for number, line in enumerate(code.splitlines(), start=1):
+        assert f"{number:>5} | {line}" in prompts
+
+
+def test_chunk_cut_short_is_reported():
+    code = python_source(10) + 'data = [' + ', '.join(str(n) for n in range(2000)) + ']\n'
+    job = analysis_job(code)
+
+    last_line = len(code.splitlines())
+    assert job['truncated'] is True
+    assert [last_line, last_line] in job['truncated_chunks']
+
+
+def test_report_with_a_failed_chunk_is_not_cached(fresh_cache):
+    code = python_source()
+    llm = FlakyChunkLLM()
+
+    first = analysis_job(code)
+    first['llm'] = llm
+    result = run_analysis(first)
+    chunk_count = len(first['chunks'])
+
+    assert result['failed_chunks'] == [[first['chunks'][1]['start_line'], first['chunks'][1]['end_line']]]
+    assert 'Analysis failed for this section' in result['analysis']
+
+    # The same request goes back to the provider instead of serving the partial report
+    second = analysis_job(code)
+    second['llm'] = llm
+    result = run_analysis(second)
+
+    assert result['cached'] is False
+    assert result['failed_chunks'] == []
+    assert llm.calls == 2 * chunk_count
+
+    third = analysis_job(code)
+    third['llm'] = llm
+    assert run_analysis(third)['cached'] is True
@@ -0,0 +1,94 @@
+import pytest
+
+from llm import code_index
+from llm.code_index import HashingEmbeddings
+
+
+class RecordingEmbeddings(HashingEmbeddings):
+    """Hashing embeddings standing in for one caller's credentials"""
+
+    def __init__(self, caller):
+        super().__init__()
+        self.caller = caller
+        self.texts = []
+
+    def embed(self, texts):
+        self.texts.extend(texts)
+        return super().embed(texts)
+
+
+@pytest.fixture(autouse=True)
+def index_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(code_index, 'CODE_INDEX_DIR', str(tmp_path))
+    monkeypatch.setattr(code_index, '_indexes', code_index.LRUCache(max_size=16))
+
+
+FILES = [
+    {'path': 'auth.py', 'content': 'def check_password(user, password):\n    return user.password_hash == hash(password)\n'},
+    {'path': 'math_utils.py', 'content': 'def add_numbers(a, b):\n    return a + b\n'}
+]
+
+
+def test_each_call_embeds_with_its_own_credentials():
+    alice, bob = RecordingEmbeddings('alice'), RecordingEmbeddings('bob')
+    index = code_index.get_code_index('shared', alice)
+    index.update(FILES, alice)
+
+    assert code_index.get_code_index('shared', bob) is index
+    chunks = index.search('check password', bob)
+
+    assert chunks[0]['path'] == 'auth.py'
+    assert bob.texts == ['check password']
+    assert not any('check password' == text for text in alice.texts)
+
+
+def test_update_embeds_only_changed_files():
+    embeddings = RecordingEmbeddings('alice')
+    index = code_index.get_code_index('incremental', embeddings)
+    assert index.update(FILES, embeddings)['files_indexed'] == 2
+
+    changed = [FILES[0], dict(FILES[1], content='def add_numbers(a, b, c):\n    return a + b + c\n')]
+    counts = index.update(changed, embeddings)
+    assert counts['files_indexed'] == 1
+    assert counts['files'] == 2
+
+
+def test_saved_index_is_reloaded():
+    embeddings = RecordingEmbeddings('alice')
+    index = code_index.get_code_index('saved', embeddings)
+    index.update(FILES, embeddings)
+    index.save()
+
+    code_index._indexes.clear()
+    reloaded = code_index.get_code_index('saved', embeddings, create=False)
+    assert reloaded is not None and reloaded is not index
+    assert reloaded.search('add numbers', embeddings)[0]['path'] == 'math_utils.py'
+
+
+def test_indexes_are_scoped_to_the_indexing_credential():
+    code_index.index_files({'index_id': 'repo:acme/private', 'api_key': 'sk-owner', 'embeddings': 'hashing', 'files': FILES})
+
+    found = code_index.search_code_index(
+        {'index_id': 'repo:acme/private', 'api_key': 'sk-owner', 'embeddings': 'hashing', 'query': 'check password'}
+    )
+    assert found['chunks'][0]['path'] == 'auth.py'
+
+    for other in ({'api_key': 'sk-someone-else'}, {'github_token': 'ghp-other'}, {}):
+        with pytest.raises(ValueError):
+            code_index.search_code_index(
+                dict(other, index_id='repo:acme/private', embeddings='hashing', query='check password')
+            )
+
+
+def test_server_key_is_not_sent_to_a_requested_embeddings_endpoint(monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'sk-server')
+    with pytest.raises(ValueError):
+        code_index.get_embeddings({'embeddings': 'openai', 'base_url': 'http://attacker.example/v1'})
+
+
+def test_openai_embeddings_require_the_callers_key(monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'sk-server')
+    with pytest.raises(ValueError, match='API key required'):
+        code_index.get_embeddings({'embeddings': 'openai'})
+    assert isinstance(code_index.get_embeddings({'embeddings': 'openai', 'api_key': 'sk-caller'}),
+                      code_index.OpenAIEmbeddings)
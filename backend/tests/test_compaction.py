@@ -0,0 +1,122 @@
+import threading
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from llm import compaction
+from llm.compaction import compact_session, history_context, needs_compaction, split_history
+from llm.sessions import MemorySessionStore
+
+# 550-700 tokens, with or without a tokenizer: two turns fit the recent window, three do not
+LONG_TURN = 'word ' * 550
+
+
+def message(id, type, content):
+    return {'id': id, 'type': type, 'content': content}
+
+
+class SummaryLLM:
+    """Writes a fixed summary, optionally letting the conversation move on meanwhile"""
+
+    def __init__(self, during_call=None):
+        self.during_call = during_call
+        self.prompts = []
+
+    def invoke(self, messages):
+        self.prompts.append(messages[-1].content)
+        if self.during_call:
+            self.during_call()
+        return AIMessage(content='  The user is refactoring the parser.  ')
+
+
+@pytest.fixture
+def long_session():
+    store = MemorySessionStore()
+    for n in range(6):
+        store.add_message('chat', 'human' if n % 2 == 0 else 'ai', f"turn {n} {LONG_TURN}")
+    return store
+
+
+def test_recent_window_keeps_the_newest_turns_after_the_summary():
+    messages = [message(1, 'human', 'old question'), message(2, 'summary', 'so far'),
+                message(3, 'human', 'a ' * 50), message(4, 'ai', 'b ' * 50), message(5, 'human', 'c ' * 50)]
+
+    summary, older, recent = split_history(messages, recent_tokens=120)
+
+    assert summary == 'so far'
+    assert [turn['id'] for turn in older] == [3]
+    assert [turn['id'] for turn in recent] == [4, 5]
+
+
+def test_the_last_turn_is_kept_however_long_it_is():
+    summary, older, recent = split_history([message(1, 'human', 'short'), message(2, 'human', LONG_TURN)],
+                                           recent_tokens=10)
+
+    assert summary is None
+    assert [turn['id'] for turn in older] == [1]
+    assert [turn['id'] for turn in recent] == [2]
+
+
+def test_prompt_context_holds_the_summary_and_recent_turns_only():
+    messages = [message(1, 'summary', 'We looked at parser.py'), message(2, 'human', 'Old question ' + LONG_TURN * 2),
+                message(3, 'human', 'Old follow-up ' + LONG_TURN * 2), message(4, 'human', 'Why is it slow?'),
+                message(5, 'ai', 'It re-reads the file.')]
+
+    context = history_context(messages)
+
+    assert context.startswith('Summary of the earlier conversation:\nWe looked at parser.py\n')
+    assert 'User: Why is it slow?\nAssistant: It re-reads the file.\n' in context
+    assert 'Old question' not in context
+
+
+def test_compaction_starts_once_turns_after_the_summary_pass_the_threshold(long_session):
+    messages = long_session.get_messages('chat')
+
+    assert needs_compaction(messages)
+    assert not needs_compaction(messages[-2:])
+    assert not needs_compaction([message(0, 'summary', 'earlier')] + messages[-2:])
+
+
+def test_older_turns_are_folded_into_a_summary(long_session):
+    llm = SummaryLLM()
+
+    assert compact_session('chat', llm, store=long_session)
+
+    messages = long_session.get_messages('chat')
+    assert messages[0]['type'] == 'summary'
+    assert messages[0]['content'] == 'The user is refactoring the parser.'
+    assert [turn['content'][:6] for turn in messages[1:]] == ['turn 4', 'turn 5']
+    assert 'turn 0' in llm.prompts[0] and 'turn 4' not in llm.prompts[0]
+    # The next run has nothing left to fold
+    assert not compact_session('chat', llm, store=long_session)
+
+
+def test_turns_added_while_summarizing_are_kept(long_session):
+    llm = SummaryLLM(during_call=lambda: long_session.add_message('chat', 'human', 'a new question'))
+
+    assert compact_session('chat', llm, store=long_session)
+
+    messages = long_session.get_messages('chat')
+    assert messages[0]['type'] == 'summary'
+    assert messages[-1]['content'] == 'a new question'
+    assert len(messages) == 4
+
+
+def test_compaction_runs_once_per_session_at_a_time(monkeypatch):
+    started, release = threading.Event(), threading.Event()
+    runs = []
+
+    def run_compaction(session_id, llm_config):
+        runs.append(session_id)
+        started.set()
+        release.wait(5)
+        with compaction._pending_lock:
+            compaction._pending.discard(session_id)
+
+    monkeypatch.setattr(compaction, '_run_compaction', run_compaction)
+    compaction.schedule_compaction('busy', {})
+    assert started.wait(5)
+    compaction.schedule_compaction('busy', {})
+    release.set()
+
+    assert runs == ['busy']
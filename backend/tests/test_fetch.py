@@ -0,0 +1,103 @@
+import base64
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from repository import blob_cache
+from repository.blob_cache import git_blob_sha
+from repository.fetch import decode_blob, fetch_files, iter_files, resolve_fetch_concurrency, tree_entries
+
+
+class FakeRepo:
+    """Serves Git Blobs API responses for the blobs it holds, counting downloads"""
+
+    def __init__(self, blobs):
+        self.blobs = blobs
+        self.downloads = []
+        self._lock = threading.Lock()
+
+    def get_git_blob(self, sha):
+        with self._lock:
+            self.downloads.append(sha)
+        if sha not in self.blobs:
+            raise RuntimeError('404 Not Found')
+        return SimpleNamespace(encoding='base64', content=base64.b64encode(self.blobs[sha]).decode('ascii'))
+
+
+@pytest.fixture(autouse=True)
+def fresh_blob_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv('GITHUB_BLOB_CACHE_DIR', str(tmp_path / 'blobs'))
+    monkeypatch.setattr(blob_cache, '_blob_cache', None)
+
+
+def entry(path, data):
+    return {'name': path.rsplit('/', 1)[-1], 'path': path, 'sha': git_blob_sha(data), 'size': len(data)}
+
+
+def test_tree_entries_filter_before_any_download():
+    elements = [
+        {'type': 'tree', 'path': 'src', 'sha': 't1'},
+        {'type': 'blob', 'path': 'src/app.py', 'sha': 'b1', 'size': 10},
+        {'type': 'blob', 'path': 'README.md', 'sha': 'b2', 'size': 10},
+        {'type': 'blob', 'path': 'src/huge.py', 'sha': 'b3', 'size': 5000},
+        {'type': 'commit', 'path': 'vendor/lib', 'sha': 'c1'},
+        {'type': 'blob', 'path': 'src/util.py', 'sha': 'b4', 'size': 20},
+        {'type': 'blob', 'path': 'src/extra.py', 'sha': 'b5', 'size': 20},
+    ]
+
+    entries = tree_entries(elements, extensions=['.py'], max_files=2, max_file_size=1000)
+
+    assert entries == [
+        {'name': 'app.py', 'path': 'src/app.py', 'sha': 'b1', 'size': 10},
+        {'name': 'util.py', 'path': 'src/util.py', 'sha': 'b4', 'size': 20},
+    ]
+
+
+def test_blob_content_is_decoded_from_either_encoding():
+    assert decode_blob('base64', base64.b64encode(b'x = 1\n').decode()) == b'x = 1\n'
+    assert decode_blob('utf-8', 'x = 1\n') == b'x = 1\n'
+    assert decode_blob('base64', None) == b''
+
+
+def test_fetch_concurrency_is_clamped():
+    assert resolve_fetch_concurrency(0) == 1
+    assert resolve_fetch_concurrency('many') == resolve_fetch_concurrency(None)
+
+
+def test_files_keep_tree_order_and_unreadable_files_are_skipped():
+    blobs = {git_blob_sha(data): data for data in (b'a = 1\n', b'b = 2\n', b'\xff\xfe binary')}
+    repo = FakeRepo(blobs)
+    entries = [entry('a.py', b'a = 1\n'), entry('gone.py', b'deleted'),
+               entry('bin.py', b'\xff\xfe binary'), entry('b.py', b'b = 2\n')]
+    fetched = []
+
+    files = fetch_files(repo, entries, concurrency=4, on_fetched=fetched.append)
+
+    assert [(file['path'], file['content']) for file in files] == [('a.py', 'a = 1\n'), ('b.py', 'b = 2\n')]
+    assert sorted(item['path'] for item in fetched) == ['a.py', 'b.py']
+
+
+def test_cached_blobs_are_not_downloaded_again():
+    data = b'print("cached")\n'
+    repo = FakeRepo({git_blob_sha(data): data})
+
+    fetch_files(repo, [entry('one.py', data)])
+    # Same content at another path shares the blob
+    files = fetch_files(repo, [entry('copy.py', data)])
+
+    assert files[0]['content'] == 'print("cached")\n'
+    assert repo.downloads == [git_blob_sha(data)]
+
+
+def test_iter_files_downloads_only_a_window_ahead():
+    contents = [f"n = {n}\n".encode() for n in range(20)]
+    repo = FakeRepo({git_blob_sha(data): data for data in contents})
+    entries = [entry(f"f{n}.py", data) for n, data in enumerate(contents)]
+
+    files = iter_files(repo, entries, concurrency=2)
+    assert next(files)['path'] == 'f0.py'
+    # The first window of four, plus one refill before the first file was handed over
+    assert len(repo.downloads) <= 5
+    files.close()
+    assert len(repo.downloads) <= 5
@@ -0,0 +1,291 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from flask import Flask
+
+from benchmarks.mock_github import OWNER, REPO, git_blob_sha, start_mock_github
+from benchmarks.mock_openai import MockLLMConfig, start_mock_llm
+from src.models.user import db
+from src.models.job import AnalysisJob
+from src.models.snapshot import RepositorySnapshot
+from jobs import queue as job_queue
+from jobs import snapshots
+from jobs.snapshots import diff_entries, snapshot_id, snapshot_settings
+from llm.cache import LRUCache
+from llm.providers import fingerprint
+from repository import blob_cache, client
+from routes.github import github_bp
+from routes.jobs import jobs_bp
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    # A file database: in-memory SQLite shares one connection between the job threads
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'jobs.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    app.register_blueprint(jobs_bp, url_prefix='/api/jobs')
+    job_queue.init_job_queue(app, db, AnalysisJob)
+    yield app
+    job_queue._job_queue = None
+
+
+def submit(client_token, result, release=None):
+    def task(context):
+        if release is not None:
+            release.wait(5)
+        return result
+    return job_queue.get_job_queue().submit('test', task, {'api_key': client_token},
+                                            submitter=fingerprint(client_token))
+
+
+def wait_finished(job_id, token):
+    queue = job_queue.get_job_queue()
+    for _ in range(100):
+        job = queue.get(job_id, fingerprint(token))
+        if job['status'] in job_queue.TERMINAL_STATUSES:
+            return job
+        threading.Event().wait(0.02)
+    raise AssertionError('job did not finish')
+
+
+def test_jobs_are_only_visible_to_their_submitter(app):
+    client = app.test_client()
+    job = submit('alice-key', {'secret': 'alice'})
+    wait_finished(job['id'], 'alice-key')
+
+    alice = {'Authorization': 'Bearer alice-key'}
+    mallory = {'Authorization': 'Bearer mallory-key'}
+
+    assert [j['id'] for j in client.get('/api/jobs', headers=alice).get_json()['jobs']] == [job['id']]
+    assert client.get('/api/jobs', headers=mallory).get_json()['jobs'] == []
+    assert client.get('/api/jobs').get_json()['jobs'] == []
+
+    assert client.get(f"/api/jobs/{job['id']}/result", headers=alice).get_json()['result'] == {'secret': 'alice'}
+    assert client.get(f"/api/jobs/{job['id']}/result", headers=mallory).status_code == 404
+    assert client.get(f"/api/jobs/{job['id']}", headers=mallory).status_code == 404
+    assert client.get(f"/api/jobs/{job['id']}").status_code == 404
+
+
+def test_only_the_submitter_can_cancel(app):
+    client = app.test_client()
+    release = threading.Event()
+    job = submit('alice-key', {}, release)
+    try:
+        assert client.delete(f"/api/jobs/{job['id']}", headers={'Authorization': 'Bearer mallory-key'}).status_code == 404
+        response = client.delete(f"/api/jobs/{job['id']}", headers={'Authorization': 'Bearer alice-key'})
+        assert response.status_code == 200
+        assert response.get_json()['status'] == 'cancelled'
+    finally:
+        release.set()
+
+
+def test_credentials_are_not_stored(app):
+    job = submit('alice-key', {})
+    wait_finished(job['id'], 'alice-key')
+    with app.app_context():
+        stored = db.session.get(AnalysisJob, job['id'])
+        assert 'alice-key' not in (stored.params or '')
+        assert stored.submitter == fingerprint('alice-key')
+
+
+def snapshot(*files):
+    return {
+        'files': [{'path': path} for path, _ in files],
+        'result': {'file_results': [{'path': path, 'sha': sha, 'analysis': f'analysis of {path}'}
+                                    for path, sha in files]}
+    }
+
+
+def test_diff_entries_splits_reused_changed_and_removed():
+    previous = snapshot(('a.py', '1'), ('b.py', '2'), ('gone.py', '3'))
+    entries = [{'path': 'a.py', 'sha': '1'}, {'path': 'b.py', 'sha': '20'}, {'path': 'new.py', 'sha': '4'}]
+
+    reused, changed, removed = diff_entries(previous, entries)
+
+    assert list(reused) == ['a.py']
+    assert [entry['path'] for entry in changed] == ['b.py', 'new.py']
+    assert removed == ['gone.py']
+
+
+def test_diff_entries_reanalyzes_failed_files():
+    previous = snapshot(('a.py', '1'))
+    previous['result']['file_results'].append({'path': 'failed.py', 'sha': '2', 'error': 'timeout'})
+    previous['files'].append({'path': 'failed.py'})
+
+    reused, changed, removed = diff_entries(previous, [{'path': 'a.py', 'sha': '1'}, {'path': 'failed.py', 'sha': '2'}])
+
+    assert list(reused) == ['a.py']
+    assert [entry['path'] for entry in changed] == ['failed.py']
+    assert removed == []
+
+
+def test_diff_entries_without_snapshot_changes_everything():
+    entries = [{'path': 'a.py', 'sha': '1'}]
+    assert diff_entries(None, entries) == ({}, entries, [])
+
+
+def test_snapshots_are_scoped_to_the_run_credentials():
+    request = {'extensions': ['.py'], 'analysis': {'provider': 'openai', 'api_key': 'alice-key'}}
+    alice = snapshot_id('acme/private', snapshot_settings(request, 'ghp-alice'))
+
+    other_token = snapshot_id('acme/private', snapshot_settings(request, 'ghp-mallory'))
+    other_key = snapshot_id('acme/private', snapshot_settings(
+        dict(request, analysis={'provider': 'openai', 'api_key': 'mallory-key'}), 'ghp-alice'))
+
+    assert len({alice, other_token, other_key}) == 3
+    assert alice == snapshot_id('acme/private', snapshot_settings(request, 'ghp-alice'))
+    assert 'alice-key' not in str(snapshot_settings(request, 'ghp-alice'))
+
+
+def wait_status(job_id, token, statuses):
+    queue = job_queue.get_job_queue()
+    for _ in range(200):
+        job = queue.get(job_id, fingerprint(token))
+        if job['status'] in statuses:
+            return job
+        threading.Event().wait(0.02)
+    raise AssertionError(f"job stayed {job['status']}")
+
+
+@pytest.fixture
+def single_worker_app(app):
+    job_queue.get_job_queue()._executor = ThreadPoolExecutor(max_workers=1)
+    return app
+
+
+def test_rescheduled_job_frees_its_worker(single_worker_app):
+    queue = job_queue.get_job_queue()
+    polls = []
+
+    def poll(context):
+        polls.append(1)
+        return {'polls': len(polls)} if len(polls) == 3 else job_queue.Reschedule(poll, 0.05)
+
+    waiting = queue.submit('test', poll, {}, submitter=fingerprint('key'))
+    other = queue.submit('test', lambda context: 'done', {}, submitter=fingerprint('key'))
+
+    # The only worker runs the second job while the first waits between polls
+    assert wait_status(other['id'], 'key', job_queue.TERMINAL_STATUSES)['status'] == 'succeeded'
+    finished = wait_status(waiting['id'], 'key', job_queue.TERMINAL_STATUSES)
+    assert finished['status'] == 'succeeded'
+    assert queue.get(waiting['id'], fingerprint('key'), include_result=True)['result'] == {'polls': 3}
+
+
+def test_cancelling_a_waiting_job_runs_its_next_step_at_once(single_worker_app):
+    queue = job_queue.get_job_queue()
+    cleaned_up = threading.Event()
+
+    def poll(context):
+        try:
+            context.check_cancelled()
+        except job_queue.JobCancelled:
+            cleaned_up.set()
+            raise
+        return job_queue.Reschedule(poll, 3600)
+
+    job = queue.submit('test', poll, {}, submitter=fingerprint('key'))
+    for _ in range(100):
+        if job['id'] in queue._timers:
+            break
+        threading.Event().wait(0.02)
+
+    assert queue.cancel(job['id'], fingerprint('key'))
+    assert cleaned_up.wait(2)
+    assert wait_status(job['id'], 'key', job_queue.TERMINAL_STATUSES)['status'] == 'cancelled'
+
+
+def test_cancelled_queued_job_does_not_leak_its_future(single_worker_app):
+    queue = job_queue.get_job_queue()
+    release = threading.Event()
+    running = queue.submit('test', lambda context: release.wait(5), {}, submitter=fingerprint('key'))
+    queued = queue.submit('test', lambda context: 'never', {}, submitter=fingerprint('key'))
+    try:
+        assert queue.cancel(queued['id'], fingerprint('key'))
+        assert queued['id'] not in queue._futures
+    finally:
+        release.set()
+    wait_status(running['id'], 'key', job_queue.TERMINAL_STATUSES)
+    assert queue._futures == {}
+    assert queue.get(queued['id'], fingerprint('key'))['status'] == 'cancelled'
+
+
+def test_rescheduled_jobs_count_toward_the_pending_bound(app):
+    queue = job_queue.get_job_queue()
+    queue.max_pending = 2
+
+    def poll(context):
+        return job_queue.Reschedule(poll, 3600)
+
+    jobs = [queue.submit('test', poll, {}, submitter=fingerprint('key')) for _ in range(2)]
+    for _ in range(100):
+        if len(queue._timers) == 2:
+            break
+        threading.Event().wait(0.02)
+    assert len(queue._timers) == 2
+
+    with pytest.raises(job_queue.QueueFull):
+        queue.submit('test', poll, {}, submitter=fingerprint('key'))
+    for job in jobs:
+        queue.cancel(job['id'], fingerprint('key'))
+
+
+@pytest.fixture
+def repository_app(app, tmp_path, monkeypatch):
+    github = start_mock_github(file_count=4, file_size=300)
+    llm = start_mock_llm(MockLLMConfig(latency=0, token_rate=0, completion_tokens=5))
+    monkeypatch.setattr(client, 'GITHUB_API_URL', github.base_url)
+    monkeypatch.setattr(client, '_clients', LRUCache(max_size=16))
+    monkeypatch.setenv('GITHUB_BLOB_CACHE_DIR', str(tmp_path / 'blobs'))
+    monkeypatch.setattr(blob_cache, '_blob_cache', None)
+    with app.app_context():
+        db.create_all()
+    snapshots.init_snapshot_store(app, db, RepositorySnapshot)
+    app.register_blueprint(github_bp, url_prefix='/api/github')
+    yield app, github, llm
+    snapshots._snapshot_store = None
+    github.shutdown()
+    llm.shutdown()
+
+
+def run_repository_analysis(app, llm):
+    response = app.test_client().post(
+        f"/api/github/repository/{OWNER}/{REPO}/analyze-all",
+        json={'async': True, 'extensions': ['.py', '.js'], 'analysis': {
+            'provider': 'custom', 'model': 'mock', 'api_key': 'sk-test', 'base_url': llm.base_url, 'fallbacks': []
+        }},
+        headers={'Authorization': 'Bearer ghp-test'}
+    )
+    assert response.status_code == 202
+    job_id = response.get_json()['job']['id']
+    assert wait_status(job_id, 'ghp-test', job_queue.TERMINAL_STATUSES)['status'] == 'succeeded'
+    return job_queue.get_job_queue().get(job_id, fingerprint('ghp-test'), include_result=True)['result']
+
+
+def test_repository_reanalysis_only_analyzes_changed_files(repository_app):
+    app, github, llm = repository_app
+
+    first = run_repository_analysis(app, llm)
+    assert first['incremental']['files_changed'] == first['total_files'] == 4
+    # One call per file and one for the synthesis
+    assert llm.stats.requests == 5
+
+    changed_path = 'src/pkg0/module_0.py'
+    github.files[changed_path] += b'\n# edited\n'
+    github.blobs = {git_blob_sha(data): data for data in github.files.values()}
+    second = run_repository_analysis(app, llm)
+
+    assert second['commit_sha'] != first['commit_sha']
+    assert second['incremental'] == {'base_commit_sha': first['commit_sha'], 'files_changed': 1,
+                                     'files_reused': 3, 'files_removed': 0}
+    assert llm.stats.requests == 5 + 2
+    reused = [result['path'] for result in second['analysis']['file_results'] if result.get('reused')]
+    assert changed_path not in reused and len(reused) == 3
+
+    third = run_repository_analysis(app, llm)
+    assert third['incremental']['files_changed'] == 0
+    assert third['analysis']['reused'] is True
+    assert llm.stats.requests == 7
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from llm import analysis
+from llm.map_reduce import (
+    MAX_CONCURRENCY, aiter_map_files, iter_map_files, map_files, map_files_async, reduce_messages,
+    resolve_concurrency
+)
+
+
+class FakeLLM:
+    """Answers with the reviewed file's path, failing the paths in fail, and tracks concurrent calls"""
+
+    def __init__(self, fail=(), delay=0.02):
+        self.fail = set(fail)
+        self.delay = delay
+        self.prompts = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def _answer(self, messages):
+        prompt = messages[-1].content
+        path = prompt.split('\n', 1)[0].removeprefix('File: ')
+        if path in self.fail:
+            raise RuntimeError(f"provider error on {path}")
+        return AIMessage(content=f"review of {path}" if prompt.startswith('File: ') else 'synthesis')
+
+    def invoke(self, messages):
+        with self._lock:
+            self.prompts.append(messages[-1].content)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            return self._answer(messages)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    async def ainvoke(self, messages):
+        with self._lock:
+            self.prompts.append(messages[-1].content)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            return self._answer(messages)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def files(count):
+    return [{'path': f"src/file_{n}.py", 'content': f"value = {n}\n"} for n in range(count)]
+
+
+def test_concurrency_is_clamped():
+    assert resolve_concurrency(0) == 1
+    assert resolve_concurrency(10 ** 6) == MAX_CONCURRENCY
+    assert resolve_concurrency('not a number') == resolve_concurrency(None)
+
+
+def test_map_keeps_input_order_and_isolates_failures():
+    llm = FakeLLM(fail={'src/file_2.py'})
+    seen = []
+
+    results = map_files(llm, files(6), concurrency=3, on_result=seen.append)
+
+    assert [result['path'] for result in results] == [file['path'] for file in files(6)]
+    assert results[0]['analysis'] == 'review of src/file_0.py'
+    assert 'provider error' in results[2]['error'] and 'analysis' not in results[2]
+    assert len(seen) == 6
+    assert llm.max_active <= 3
+
+
+def test_async_map_is_bounded_by_its_concurrency():
+    llm = FakeLLM()
+    results = asyncio.run(map_files_async(llm, files(8), concurrency=2))
+
+    assert [result['analysis'] for result in results] == [f"review of src/file_{n}.py" for n in range(8)]
+    assert llm.max_active == 2
+
+
+def test_streamed_map_reads_only_a_window_of_files_ahead():
+    llm = FakeLLM()
+    pulled = []
+
+    def downloads():
+        for file in files(10):
+            pulled.append(file['path'])
+            yield file
+
+    results = iter_map_files(llm, downloads(), concurrency=2)
+    first_file, first_result = next(results)
+
+    assert first_file['path'] == 'src/file_0.py'
+    assert first_result['analysis'] == 'review of src/file_0.py'
+    # Twice the concurrency, plus the one pulled to replace the file just handed over
+    assert len(pulled) <= 2 * 2 + 1
+    assert [file['path'] for file, _ in results] == [f"src/file_{n}.py" for n in range(1, 10)]
+
+
+def test_async_streamed_map_yields_in_input_order():
+    llm = FakeLLM()
+
+    async def downloads():
+        for file in files(5):
+            yield file
+
+    async def collect():
+        return [(file['path'], result['analysis']) async for file, result in aiter_map_files(llm, downloads(), concurrency=2)]
+
+    assert asyncio.run(collect()) == [(f"src/file_{n}.py", f"review of src/file_{n}.py") for n in range(5)]
+
+
+def test_reduce_prompt_holds_only_successful_reviews():
+    results = [{'path': 'a.py', 'analysis': 'looks fine'}, {'path': 'b.py', 'error': 'timeout'}]
+    prompt = reduce_messages(results)[-1].content
+
+    assert '--- a.py ---\nlooks fine' in prompt
+    assert 'b.py' not in prompt
+    with pytest.raises(Exception, match='every file'):
+        reduce_messages([{'path': 'b.py', 'error': 'timeout'}])
+
+
+def test_map_reduce_analysis_skips_files_with_valid_previous_results(monkeypatch):
+    llm = FakeLLM(fail={'src/file_3.py'})
+    monkeypatch.setattr(analysis, 'get_llm', lambda **kwargs: llm)
+    previous = {'src/file_0.py': {'path': 'src/file_0.py', 'analysis': 'stored review'}}
+
+    result = analysis.analyze_multiple_files(
+        {'files': files(4), 'mode': 'map_reduce', 'api_key': 'sk-test', 'session_id': 'map-reduce'},
+        previous_results=previous
+    )
+
+    assert not any(prompt.startswith('File: src/file_0.py') for prompt in llm.prompts)
+    assert result['analysis'] == 'synthesis'
+    assert result['file_results'][0] == {'path': 'src/file_0.py', 'analysis': 'stored review', 'reused': True}
+    assert result['files_analyzed'] == 3
+    assert result['files_failed'] == 1
+    assert result['files_reused'] == 1
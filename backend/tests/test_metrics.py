@@ -0,0 +1,94 @@
+from flask import Flask
+from langchain_core.messages import AIMessage
+
+from benchmarks.mock_openai import MockLLMConfig, start_mock_llm
+from llm import providers
+from llm.error_handling import handle_llm_error
+from llm.metrics import ERRORS, TOKENS, Counter, Histogram, Registry, TokenUsage, render_metrics
+from routes.metrics import metrics_bp
+
+
+def test_request_labels_are_bounded():
+    assert providers.provider_label('openai') == 'openai'
+    assert providers.provider_label('made-up-provider') == 'other'
+    assert providers.model_label('gpt-4o-mini') == 'gpt-4o-mini'
+    # Unlisted models are labeled by their family, or 'other'
+    assert providers.model_label('llama3:70b-instruct-q4') == 'llama3'
+    assert providers.model_label('x' * 40) == 'other'
+    assert providers.model_label(None) == 'other'
+
+
+def test_provider_calls_with_arbitrary_names_share_one_series():
+    server = start_mock_llm(MockLLMConfig(latency=0, token_rate=100000, completion_tokens=3))
+    try:
+        for n in range(3):
+            llm = providers.get_llm('custom', model=f"random-model-{n}", api_key='sk-caller',
+                                    base_url=server.base_url, fallbacks=[])
+            llm.invoke('hello')
+    finally:
+        server.shutdown()
+
+    rendered = render_metrics()
+    assert 'random-model' not in rendered
+    assert TOKENS.value(provider='custom', model='other', kind='completion') >= 9
+    assert 'llm_request_seconds_count{provider="custom",model="other",method="invoke",outcome="success"}' in rendered
+
+
+def test_histogram_buckets_are_cumulative_in_the_text_format():
+    registry = Registry()
+    histogram = Histogram('test_seconds', 'Test latency', ('operation',), buckets=(0.1, 1.0))
+    registry.register(histogram)
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, operation='read')
+
+    lines = registry.render().splitlines()
+    assert 'test_seconds_bucket{operation="read",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{operation="read",le="1.0"} 2' in lines
+    assert 'test_seconds_bucket{operation="read",le="+Inf"} 3' in lines
+    assert 'test_seconds_sum{operation="read"} 5.55' in lines
+    assert 'test_seconds_count{operation="read"} 3' in lines
+
+
+def test_counter_escapes_label_values():
+    counter = Counter('test_total', 'Test count', ('reason',))
+    counter.inc(2, reason='quote " and\nnewline')
+
+    assert counter.value(reason='quote " and\nnewline') == 2
+    assert 'test_total{reason="quote \\" and\\nnewline"} 2' in counter.render()
+
+
+def test_timer_observes_failed_blocks_too():
+    histogram = Histogram('test_block_seconds', 'Test timing', ('operation',))
+    try:
+        with histogram.time(operation='fails'):
+            raise RuntimeError('boom')
+    except RuntimeError:
+        pass
+
+    assert 'test_block_seconds_count{operation="fails"} 1' in histogram.render()
+
+
+def test_usage_sums_only_reported_usage():
+    usage = TokenUsage()
+    usage.add(AIMessage(content='no usage'))
+    assert usage.to_dict() is None
+
+    for _ in range(2):
+        usage.add(AIMessage(content='ok', usage_metadata={'input_tokens': 10, 'output_tokens': 4, 'total_tokens': 14}))
+    assert usage.to_dict() == {'prompt_tokens': 20, 'completion_tokens': 8, 'total_tokens': 28}
+
+
+def test_metrics_endpoint_serves_the_text_format():
+    app = Flask(__name__)
+    app.register_blueprint(metrics_bp)
+    before = ERRORS.value(type='validation_error')
+    with app.app_context():
+        handle_llm_error(ValueError('Code is required'))
+
+    response = app.test_client().get('/metrics')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    body = response.get_data(as_text=True)
+    assert '# TYPE llm_request_seconds histogram' in body
+    assert f'llm_errors_total{{type="validation_error"}} {before + 1}' in body
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+
+import pytest
+
+from benchmarks.mock_openai import MockLLMConfig, start_mock_llm
+from llm import providers
+from llm.routing import RoutedLLM
+
+
+@pytest.fixture(autouse=True)
+def server_key(monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'sk-server')
+    providers.clear_llm_cache()
+
+
+def test_server_key_is_not_sent_to_a_requested_base_url():
+    with pytest.raises(ValueError):
+        providers.get_llm('openai', base_url='http://attacker.example/v1', fallbacks=[])
+
+
+def test_requested_fallback_without_api_key_is_skipped():
+    llm = providers.get_llm(
+        'ollama', base_url='http://127.0.0.1:9/v1',
+        fallbacks=[{'provider': 'openai', 'base_url': 'http://attacker.example/v1'}, 'openai']
+    )
+    assert not isinstance(llm, RoutedLLM)
+
+
+def test_requested_fallback_with_its_own_key_is_used():
+    llm = providers.get_llm(
+        'ollama', base_url='http://127.0.0.1:9/v1',
+        fallbacks=[{'provider': 'openai', 'api_key': 'sk-caller', 'base_url': 'http://proxy.example/v1'}]
+    )
+    assert isinstance(llm, RoutedLLM)
+    assert [route.provider for route in llm.routes] == ['ollama', 'openai']
+
+
+def test_server_fallbacks_use_environment_keys(monkeypatch):
+    monkeypatch.setattr(providers, 'FALLBACK_PROVIDERS', ['openai'])
+    llm = providers.get_llm('ollama', base_url='http://127.0.0.1:9/v1')
+    assert isinstance(llm, RoutedLLM)
+    assert [route.provider for route in llm.routes] == ['ollama', 'openai']
+
+
+def test_cached_llm_is_usable_from_successive_event_loops():
+    server = start_mock_llm(MockLLMConfig(latency=0, token_rate=100000, completion_tokens=5))
+    try:
+        llm = providers.get_llm('custom', model='mock', api_key='sk-caller', base_url=server.base_url, fallbacks=[])
+        # Each asyncio.run is a new loop, as in separate worker threads; the pooled connection must not leak across
+        for _ in range(2):
+            assert asyncio.run(llm.ainvoke('hello')).content
+    finally:
+        server.shutdown()
+
+
+def test_loop_local_client_drops_pools_of_closed_loops():
+    server = start_mock_llm(MockLLMConfig(latency=0, completion_tokens=1))
+    client = providers.LoopLocalAsyncClient()
+    url = f"{server.base_url}/models"
+    try:
+        for _ in range(3):
+            asyncio.run(client.get(url))
+        assert len(client._loop_clients) == 1
+    finally:
+        server.shutdown()
+
+
+def test_evicted_endpoint_pools_are_closed_with_their_cached_clients(monkeypatch):
+    monkeypatch.setattr(providers, '_http_pools', providers.LRUCache(max_size=2, on_evict=providers._close_http_pool))
+    urls = [f"http://endpoint-{n}.example/v1" for n in range(3)]
+
+    providers.get_llm('custom', model='mock', api_key='sk-caller', base_url=urls[0], fallbacks=[])
+    first_sync, first_async = providers.get_http_clients(urls[0])
+    for url in urls[1:]:
+        providers.get_llm('custom', model='mock', api_key='sk-caller', base_url=url, fallbacks=[])
+
+    assert len(providers._http_pools) == 2
+    assert first_sync.is_closed
+    assert first_async._loop_clients == {}
+    # The cached client bound to the closed pool is dropped, not handed out again
+    assert len(providers._llm_cache) == 2
+    assert providers.get_http_clients(urls[0])[0] is not first_sync
+
+
+def test_close_pools_closes_the_pool_of_a_running_loop():
+    server = start_mock_llm(MockLLMConfig(latency=0, completion_tokens=1))
+    client = providers.LoopLocalAsyncClient()
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+    try:
+        asyncio.run_coroutine_threadsafe(client.get(f"{server.base_url}/models"), loop).result(5)
+        inner = client._loop_clients[loop]
+
+        client.close_pools()
+
+        asyncio.run_coroutine_threadsafe(asyncio.sleep(0.05), loop).result(5)
+        assert inner.is_closed
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+        server.shutdown()
@@ -0,0 +1,143 @@
+import time
+
+import pytest
+from flask import Flask
+
+from benchmarks.mock_github import start_mock_github
+from llm.cache import LRUCache
+from repository import blob_cache, client, rate_limit
+from repository.client import _budgeted, get_github
+from repository.rate_limit import GitHubRateLimit, GitHubRateLimitExceeded, get_rate_limit, is_rate_limit_response
+from routes.github import github_bp
+
+HEADERS = {'Authorization': 'Bearer test-token'}
+
+
+@pytest.fixture(autouse=True)
+def fresh_budgets(monkeypatch):
+    monkeypatch.setattr(rate_limit, '_budgets', LRUCache(max_size=16))
+
+
+def budget(remaining, limit=5000, window=400.0, now=None):
+    now = time.time() if now is None else now
+    limit_state = GitHubRateLimit()
+    limit_state.update({'X-RateLimit-Limit': str(limit), 'X-RateLimit-Remaining': str(remaining),
+                        'X-RateLimit-Reset': str(int(now + window))})
+    return limit_state
+
+
+def test_calls_are_not_spaced_above_the_reserve():
+    limit_state = budget(remaining=4000)
+    now = time.time()
+
+    assert [limit_state._reserve(now, max_wait=30) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limit_state.remaining == 3997
+
+
+def test_calls_in_the_reserve_are_spread_over_the_rest_of_the_window():
+    now = time.time()
+    limit_state = budget(remaining=100, now=now)
+    gap = (limit_state.reset_at - now) / 100
+
+    delays = [limit_state._reserve(now, max_wait=30) for _ in range(3)]
+
+    assert delays[0] == 0.0
+    assert delays[1] == pytest.approx(gap)
+    assert delays[2] == pytest.approx(gap + (limit_state.reset_at - now) / 99)
+    assert limit_state.state()['throttled'] is True
+
+
+def test_call_that_would_wait_too_long_fails_with_retry_after():
+    now = time.time()
+    limit_state = budget(remaining=0, now=now)
+
+    with pytest.raises(GitHubRateLimitExceeded) as raised:
+        limit_state._reserve(now, max_wait=30)
+
+    assert raised.value.retry_after == pytest.approx(limit_state.reset_at - now + 1)
+    assert raised.value.state['remaining'] == 0
+    # Background jobs wait the window out instead
+    assert limit_state._reserve(now, max_wait=3900) == pytest.approx(limit_state.reset_at - now + 1)
+
+
+def test_a_new_window_forgets_the_spent_budget():
+    now = time.time()
+    limit_state = budget(remaining=0, window=10, now=now)
+
+    assert limit_state._reserve(now + 20, max_wait=30) == 0.0
+    assert limit_state.remaining is None
+
+
+def test_other_resources_do_not_touch_the_core_budget():
+    limit_state = budget(remaining=4000)
+    limit_state.update({'X-RateLimit-Resource': 'search', 'X-RateLimit-Limit': '30',
+                        'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '0'})
+
+    assert limit_state.remaining == 4000
+
+
+def test_late_responses_do_not_raise_the_local_count():
+    limit_state = budget(remaining=4000)
+    reset = str(int(limit_state.reset_at))
+    limit_state._reserve(time.time(), max_wait=30)
+    limit_state.update({'X-RateLimit-Limit': '5000', 'X-RateLimit-Remaining': '4000', 'X-RateLimit-Reset': reset})
+
+    assert limit_state.remaining == 3999
+
+
+@pytest.mark.parametrize('status, headers, body, limited', [
+    (429, {}, None, True),
+    (403, {'Retry-After': '60'}, None, True),
+    (403, {'X-RateLimit-Remaining': '0'}, None, True),
+    (403, {}, b'{"message": "You have exceeded a secondary rate limit"}', True),
+    (403, {'X-RateLimit-Remaining': '10'}, b'{"message": "Resource not accessible"}', False),
+    (404, {'X-RateLimit-Remaining': '0'}, None, False),
+])
+def test_rate_limit_responses_are_recognized(status, headers, body, limited):
+    assert is_rate_limit_response(status, headers, body) is limited
+
+
+def test_rejected_call_holds_every_caller_on_the_token_back():
+    limit_state = get_rate_limit('test-token')
+    sent = []
+
+    def send(verb, url, *args, **kwargs):
+        sent.append(url)
+        return 403, {'Retry-After': '120'}, b'{"message": "secondary rate limit"}'
+
+    request = _budgeted(send, limit_state, 'interactive')
+    with pytest.raises(GitHubRateLimitExceeded) as raised:
+        request('GET', '/user')
+    assert raised.value.retry_after == 120
+
+    with pytest.raises(GitHubRateLimitExceeded):
+        request('GET', '/user/repos')
+    assert sent == ['/user']
+
+
+def test_clients_are_pooled_per_token_and_priority(monkeypatch):
+    monkeypatch.setattr(client, '_clients', LRUCache(max_size=16))
+
+    assert get_github('alice') is get_github('alice')
+    assert get_github('alice') is not get_github('bob')
+    assert get_github('alice') is not get_github('alice', priority='batch')
+
+
+def test_route_answers_429_with_retry_after_while_throttled(monkeypatch):
+    server = start_mock_github(file_count=2)
+    monkeypatch.setattr(client, 'GITHUB_API_URL', server.base_url)
+    monkeypatch.setattr(client, '_clients', LRUCache(max_size=16))
+    monkeypatch.setattr(blob_cache, '_listing_cache', None)
+    app = Flask(__name__)
+    app.register_blueprint(github_bp, url_prefix='/api/github')
+    try:
+        get_rate_limit('test-token').record_rate_limited({'Retry-After': '120'})
+        requests_before = server.requests
+        response = app.test_client().get('/api/github/repositories', headers=HEADERS)
+    finally:
+        server.shutdown()
+
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '120'
+    assert response.get_json()['type'] == 'rate_limit'
+    assert server.requests == requests_before
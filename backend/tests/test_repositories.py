@@ -0,0 +1,111 @@
+import pytest
+from flask import Flask
+
+from benchmarks.mock_github import REPO, start_mock_github
+from llm.cache import LRUCache
+from repository import blob_cache, client
+from repository.repositories import (
+    DEFAULT_PER_PAGE, MAX_PER_PAGE, _page_number, _per_page, list_repositories_page, repository_filters
+)
+from routes.github import github_bp
+
+HEADERS = {'Authorization': 'Bearer test-token'}
+
+
+class PagedRequester:
+    """Serves /user/repos pages of one repository each, linking the next page until the last"""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.parameters = []
+
+    def requestJsonAndCheck(self, verb, url, parameters=None, headers=None):
+        self.parameters.append(parameters)
+        page = parameters['page']
+        link = '<https://api.github.com/user/repos?page=2>; rel="next"' if page < self.pages else ''
+        return {'ETag': f'"page-{page}"', 'Link': link}, [{'id': page, 'name': f"repo-{page}", 'token': 'hidden'}]
+
+
+@pytest.fixture(autouse=True)
+def fresh_listing_cache(monkeypatch):
+    monkeypatch.setattr(blob_cache, '_listing_cache', None)
+
+
+@pytest.fixture
+def app(monkeypatch):
+    server = start_mock_github(file_count=2)
+    monkeypatch.setattr(client, 'GITHUB_API_URL', server.base_url)
+    monkeypatch.setattr(client, '_clients', LRUCache(max_size=16))
+    app = Flask(__name__)
+    app.register_blueprint(github_bp, url_prefix='/api/github')
+    yield app
+    server.shutdown()
+
+
+@pytest.mark.parametrize('cursor, page', [(None, 1), ('', 1), ('3', 3)])
+def test_cursor_is_a_page_number(cursor, page):
+    assert _page_number(cursor) == page
+
+
+@pytest.mark.parametrize('cursor', ['0', '-1', 'abc', '1.5'])
+def test_invalid_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        _page_number(cursor)
+
+
+def test_page_size_is_clamped():
+    assert _per_page(None) == DEFAULT_PER_PAGE
+    assert _per_page('0') == 1
+    assert _per_page('1000') == MAX_PER_PAGE
+    with pytest.raises(ValueError, match='per_page'):
+        _per_page('many')
+
+
+def test_filters_are_checked_against_githubs_values():
+    assert repository_filters({'sort': 'pushed', 'direction': '', 'affiliation': 'owner'}) == {
+        'sort': 'pushed', 'affiliation': 'owner'
+    }
+    with pytest.raises(ValueError, match='visibility must be one of'):
+        repository_filters({'visibility': 'secret'})
+
+
+def test_pages_follow_the_next_link_until_the_last():
+    user = type('User', (), {'_requester': PagedRequester(pages=2)})()
+
+    first = list_repositories_page(user, 'token', per_page='10', filters={'sort': 'updated'})
+    last = list_repositories_page(user, 'token', cursor=first['next_cursor'])
+
+    assert first == {'repositories': [{'id': 1, 'name': 'repo-1', 'full_name': None, 'description': None,
+                                       'private': None, 'html_url': None, 'language': None, 'updated_at': None}],
+                     'next_cursor': '2'}
+    assert last['next_cursor'] is None
+    assert user._requester.parameters == [{'sort': 'updated', 'page': 1, 'per_page': 10},
+                                          {'page': 2, 'per_page': DEFAULT_PER_PAGE}]
+
+
+def test_recent_pages_are_served_from_the_cache():
+    user = type('User', (), {'_requester': PagedRequester(pages=1)})()
+    list_repositories_page(user, 'token')
+    list_repositories_page(user, 'token')
+
+    assert len(user._requester.parameters) == 1
+
+
+def test_repositories_route_returns_a_page_with_an_etag(app):
+    browser = app.test_client()
+    response = browser.get('/api/github/repositories', headers=HEADERS)
+
+    assert response.status_code == 200
+    assert [repo['name'] for repo in response.get_json()['repositories']] == [REPO]
+    assert response.get_json()['next_cursor'] is None
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+
+    again = browser.get('/api/github/repositories', headers=dict(HEADERS, **{'If-None-Match': response.headers['ETag']}))
+    assert again.status_code == 304
+
+
+@pytest.mark.parametrize('query', ['cursor=0', 'per_page=lots', 'sort=stars'])
+def test_repositories_route_rejects_bad_arguments(app, query):
+    response = app.test_client().get(f"/api/github/repositories?{query}", headers=HEADERS)
+
+    assert response.status_code == 400
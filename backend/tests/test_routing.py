@@ -0,0 +1,152 @@
+import asyncio
+import time
+
+import pytest
+
+from llm import routing
+from llm.routing import ProviderHealth, Route, RoutedLLM
+
+
+class ServiceUnavailable(Exception):
+    status_code = 503
+
+
+class BadRequest(Exception):
+    status_code = 400
+
+
+class FakeLLM:
+    def __init__(self, name, calls, error=None):
+        self.name = name
+        self.calls = calls
+        self.error = error
+
+    def invoke(self, messages, **kwargs):
+        self.calls.append(self.name)
+        if self.error:
+            raise self.error
+        return self.name
+
+    async def ainvoke(self, messages, **kwargs):
+        return self.invoke(messages, **kwargs)
+
+
+def _route(name, calls, error=None, hedge_samples=0):
+    health = ProviderHealth()
+    for _ in range(hedge_samples):
+        health.latencies.append(1.0)
+    return Route(name, 'model', FakeLLM(name, calls, error), health)
+
+
+@pytest.fixture
+def hedging(monkeypatch):
+    monkeypatch.setattr(routing, 'HEDGE_PERCENTILE', 95)
+    monkeypatch.setattr(routing, 'HEDGE_MIN_SAMPLES', 5)
+
+
+def test_fails_over_to_next_route():
+    calls = []
+    llm = RoutedLLM([_route('a', calls, ServiceUnavailable()), _route('b', calls)])
+    assert llm.invoke([]) == 'b'
+    assert calls == ['a', 'b']
+
+
+def test_request_errors_do_not_fail_over():
+    calls = []
+    llm = RoutedLLM([_route('a', calls, BadRequest()), _route('b', calls)])
+    with pytest.raises(BadRequest):
+        llm.invoke([])
+    assert calls == ['a']
+
+
+def test_primary_failing_before_hedge_delay_still_reaches_backup(hedging):
+    calls = []
+    llm = RoutedLLM([_route('a', calls, ServiceUnavailable(), hedge_samples=10), _route('b', calls)])
+    assert llm.invoke([]) == 'b'
+    assert calls == ['a', 'b']
+
+
+def test_async_primary_failing_before_hedge_delay_still_reaches_backup(hedging):
+    calls = []
+    llm = RoutedLLM([_route('a', calls, ServiceUnavailable(), hedge_samples=10), _route('b', calls)])
+    assert asyncio.run(llm.ainvoke([])) == 'b'
+    assert calls == ['a', 'b']
+
+
+def test_open_circuit_is_skipped():
+    calls = []
+    failing = _route('a', calls)
+    for _ in range(routing.CIRCUIT_FAILURE_THRESHOLD):
+        failing.health.record_failure()
+    llm = RoutedLLM([failing, _route('b', calls)])
+    assert llm.invoke([]) == 'b'
+    assert calls == ['b']
+
+
+def test_stream_fails_over_before_first_chunk():
+    class StreamingLLM(FakeLLM):
+        def stream(self, messages, **kwargs):
+            self.calls.append(self.name)
+            if self.error:
+                raise self.error
+            yield self.name
+
+    calls = []
+    routes = [
+        Route('a', 'model', StreamingLLM('a', calls, ServiceUnavailable()), ProviderHealth()),
+        Route('b', 'model', StreamingLLM('b', calls), ProviderHealth())
+    ]
+    assert list(RoutedLLM(routes).stream([])) == ['b']
+
+
+def _half_open(route):
+    for _ in range(routing.CIRCUIT_FAILURE_THRESHOLD):
+        route.health.record_failure()
+    # Past the reset timeout: the next allow() is the single half-open probe
+    route.health.breaker.opened_at -= route.health.breaker.reset_timeout
+
+
+def test_unused_backup_keeps_its_half_open_probe():
+    calls = []
+    backup = _route('b', calls)
+    _half_open(backup)
+    llm = RoutedLLM([_route('a', calls), backup])
+
+    assert llm.invoke([]) == 'a'
+    assert calls == ['a']
+    assert backup.health.breaker.allow() is True
+
+
+def test_half_open_backup_is_probed_when_primary_fails():
+    calls = []
+    backup = _route('b', calls)
+    _half_open(backup)
+    llm = RoutedLLM([_route('a', calls, ServiceUnavailable()), backup])
+
+    assert llm.invoke([]) == 'b'
+    assert backup.health.breaker.state == 'closed'
+
+
+def test_routes_are_tried_in_order_when_every_circuit_is_open():
+    calls = []
+    routes = [_route('a', calls, ServiceUnavailable()), _route('b', calls)]
+    for route in routes:
+        for _ in range(routing.CIRCUIT_FAILURE_THRESHOLD):
+            route.health.record_failure()
+
+    assert RoutedLLM(routes).invoke([]) == 'b'
+    assert calls == ['a', 'b']
+
+
+def test_slow_primary_is_hedged_to_the_backup(hedging):
+    class SlowLLM(FakeLLM):
+        def invoke(self, messages, **kwargs):
+            time.sleep(0.5)
+            return super().invoke(messages, **kwargs)
+
+    calls = []
+    health = ProviderHealth()
+    health.latencies.extend([0.01] * 10)
+    primary = Route('a', 'model', SlowLLM('a', calls), health)
+
+    assert RoutedLLM([primary, _route('b', calls)]).invoke([]) == 'b'
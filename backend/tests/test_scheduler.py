@@ -0,0 +1,204 @@
+import asyncio
+import threading
+import time
+from email.utils import formatdate
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from llm import scheduler
+from llm.scheduler import (
+    RateLimiter, RateLimitExceeded, ScheduledLLM, TokenBucket, backoff_delay, is_retryable, retry_after
+)
+
+
+class APIError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"Error code: {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+class FlakyLLM:
+    """Fails with the given errors first, then answers"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def invoke(self, messages, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return AIMessage(content='ok')
+
+    async def ainvoke(self, messages, **kwargs):
+        return self.invoke(messages, **kwargs)
+
+    def stream(self, messages, **kwargs):
+        self.calls += 1
+        yield AIMessageChunk(content='partial')
+        if self.errors:
+            raise self.errors.pop(0)
+        yield AIMessageChunk(content=' answer')
+
+
+def test_bucket_waits_for_the_missing_share_of_a_minute():
+    bucket = TokenBucket(60)
+    bucket.consume(60)
+
+    assert bucket.wait_time(1, bucket.updated_at) == pytest.approx(1.0)
+    # Refilled after half a minute
+    assert bucket.wait_time(30, bucket.updated_at + 30) == 0.0
+
+
+def test_backed_off_bucket_refills_slower():
+    bucket = TokenBucket(60)
+    bucket.consume(60)
+
+    assert bucket.wait_time(1, bucket.updated_at, scale=0.5) == pytest.approx(2.0)
+
+
+def test_oversized_requests_wait_for_a_full_bucket():
+    bucket = TokenBucket(100)
+    bucket.consume(100)
+
+    assert bucket.wait_time(1000, bucket.updated_at) == pytest.approx(60.0)
+
+
+def test_rate_limit_halves_the_rate_and_successes_recover_it():
+    limiter = RateLimiter(requests_per_minute=60)
+    limiter.record_rate_limited(0)
+    limiter.record_rate_limited(0)
+    assert limiter.rate_scale == 0.25
+
+    for _ in range(5):
+        limiter.record_success()
+    assert limiter.rate_scale == pytest.approx(0.5)
+
+
+def test_rate_limit_without_configured_rates_halves_concurrency():
+    limiter = RateLimiter()
+    for _ in range(4):
+        limiter.acquire()
+    limiter.record_rate_limited(0)
+
+    assert limiter._concurrency_limit() == 2
+
+
+def test_cooldown_blocks_callers_until_it_passes():
+    limiter = RateLimiter()
+    limiter.record_rate_limited(0.2)
+
+    started = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - started >= 0.15
+    limiter.release()
+
+    limiter.record_rate_limited(5)
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire(timeout=0.05)
+    assert limiter._waiting == []
+
+
+def test_interactive_callers_are_served_before_batch_callers():
+    limiter = RateLimiter(max_concurrent=1)
+    limiter.acquire()
+    served = []
+
+    def call(priority):
+        limiter.acquire(priority=priority)
+        served.append(priority)
+        limiter.release()
+
+    threads = [threading.Thread(target=call, args=('batch',)), threading.Thread(target=call, args=('interactive',))]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)
+    limiter.release()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert served == ['interactive', 'batch']
+
+
+def test_token_reservation_is_refunded_to_actual_usage():
+    limiter = RateLimiter(tokens_per_minute=1000)
+    limiter.acquire(tokens=800)
+    limiter.release(reserved_tokens=800, used_tokens=300)
+
+    assert limiter.tokens.level == pytest.approx(700, abs=1)
+
+
+def test_retry_after_headers_are_honored():
+    assert retry_after(APIError(429, {'retry-after-ms': '1500'})) == 1.5
+    assert retry_after(APIError(429, {'retry-after': '7'})) == 7.0
+    assert 25 <= retry_after(APIError(429, {'retry-after': formatdate(time.time() + 30, usegmt=True)})) <= 30
+    assert retry_after(APIError(429)) is None
+    assert backoff_delay(0, APIError(429, {'retry-after': '10000'})) == scheduler.RETRY_MAX_DELAY
+
+
+def test_backoff_is_jittered_below_an_exponential_cap(monkeypatch):
+    monkeypatch.setattr(scheduler, 'RETRY_BASE_DELAY', 1.0)
+    delays = [backoff_delay(3) for _ in range(200)]
+
+    assert all(0 <= delay <= 8 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+@pytest.mark.parametrize('error, retryable', [
+    (APIError(429), True),
+    (APIError(503), True),
+    (APIError(400), False),
+    (APIError(401), False),
+    (RateLimitExceeded('queue timeout'), False),
+    (type('APIConnectionError', (Exception,), {})('reset'), True),
+    (ValueError('bad input'), False),
+])
+def test_only_transient_errors_are_retried(error, retryable):
+    assert is_retryable(error) is retryable
+
+
+def test_rate_limited_call_is_retried_after_a_cooldown():
+    llm = FlakyLLM(APIError(429, {'retry-after-ms': '50'}), APIError(503, {'retry-after-ms': '10'}))
+    limiter = RateLimiter()
+    scheduled = ScheduledLLM(llm, limiter, provider='openai', model='gpt-4o')
+
+    assert scheduled.invoke([]).content == 'ok'
+    assert llm.calls == 3
+    assert limiter.in_flight == 0
+    # Halved by the 429, then a recovery step for the success
+    assert limiter.rate_scale == pytest.approx(0.5 + scheduler.RATE_RECOVERY_STEP)
+
+
+def test_async_call_gives_up_on_errors_that_are_not_transient():
+    llm = FlakyLLM(APIError(401))
+    scheduled = ScheduledLLM(llm, RateLimiter(), provider='openai', model='gpt-4o')
+
+    with pytest.raises(APIError):
+        asyncio.run(scheduled.ainvoke([]))
+    assert llm.calls == 1
+    assert scheduled.limiter.in_flight == 0
+
+
+def test_retries_stop_after_max_retries():
+    llm = FlakyLLM(*[APIError(503, {'retry-after-ms': '1'}) for _ in range(5)])
+    scheduled = ScheduledLLM(llm, RateLimiter(), provider='openai', model='gpt-4o', max_retries=2)
+
+    with pytest.raises(APIError):
+        scheduled.invoke([])
+    assert llm.calls == 3
+
+
+def test_stream_is_not_retried_after_its_first_chunk():
+    llm = FlakyLLM(APIError(503, {'retry-after-ms': '1'}))
+    scheduled = ScheduledLLM(llm, RateLimiter(), provider='openai', model='gpt-4o')
+    chunks = []
+
+    with pytest.raises(APIError):
+        for chunk in scheduled.stream([]):
+            chunks.append(chunk.content)
+    assert chunks == ['partial']
+    assert llm.calls == 1
+    assert scheduled.limiter.in_flight == 0
@@ -0,0 +1,56 @@
+import pytest
+from flask import Flask
+
+from src.models.user import db
+from src.models.session import ChatSession, ChatMessage
+from llm.sessions import MemorySessionStore, SQLSessionStore
+
+
+@pytest.fixture
+def sql_store(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'sessions.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return SQLSessionStore(app, db, ChatSession, ChatMessage, max_messages=3)
+
+
+@pytest.fixture(params=['memory', 'sql'])
+def store(request, sql_store):
+    if request.param == 'memory':
+        return MemorySessionStore(max_messages=3)
+    return sql_store
+
+
+def test_first_message_survives_a_concurrently_created_session(sql_store, monkeypatch):
+    with sql_store.app.app_context():
+        db.session.add(ChatSession(id='chat'))
+        db.session.commit()
+
+    lookups = []
+    real_get = db.session.get
+
+    def get_missing_once(model, ident, **kwargs):
+        # The other worker's insert lands between this worker's lookup and its own insert
+        lookups.append(ident)
+        return None if len(lookups) == 1 else real_get(model, ident, **kwargs)
+
+    monkeypatch.setattr(db.session, 'get', get_missing_once)
+    sql_store.add_message('chat', 'human', 'hello')
+
+    assert [message['content'] for message in sql_store.get_messages('chat')] == ['hello']
+
+
+def test_message_cap_keeps_the_compaction_summary(store):
+    for n in range(3):
+        store.add_message('chat', 'human', f"question {n}")
+    through_id = store.get_messages('chat')[1]['id']
+    assert store.compact('chat', 'summary of questions 0-1', through_id)
+
+    for n in range(3, 8):
+        store.add_message('chat', 'human', f"question {n}")
+
+    messages = store.get_messages('chat')
+    assert messages[0]['type'] == 'summary'
+    assert [message['content'] for message in messages[1:]] == ['question 5', 'question 6', 'question 7']
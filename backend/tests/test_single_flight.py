@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from llm.analysis import prepare_analysis
+from llm.single_flight import SingleFlight
+
+
+def test_callers_with_different_api_keys_share_no_cache_or_call():
+    request = {'code': 'print(1)', 'provider': 'openai', 'model': 'gpt-4o-mini'}
+    alice = prepare_analysis(dict(request, api_key='alice-key'))
+    bob = prepare_analysis(dict(request, api_key='bob-key'))
+    alice_again = prepare_analysis(dict(request, api_key='alice-key'))
+
+    assert alice['cache_key'] != bob['cache_key']
+    assert alice['cache_key'] == alice_again['cache_key']
+
+
+def test_cancelling_the_leader_does_not_cancel_followers():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await release.wait()
+            return 'result'
+
+        leader = asyncio.create_task(flight.do_async('key', work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do_async('key', work))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert await follower == ('result', True)
+        assert calls == [1]
+        assert flight.in_flight() == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelling_a_follower_leaves_the_call_running():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return 'result'
+
+        leader = asyncio.create_task(flight.do_async('key', work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do_async('key', work))
+        await asyncio.sleep(0)
+
+        follower.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await leader == ('result', False)
+
+    asyncio.run(scenario())
+
+
+def test_leader_error_reaches_followers_and_clears_the_key():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def failing():
+            await release.wait()
+            raise RuntimeError('provider down')
+
+        leader = asyncio.create_task(flight.do_async('key', failing))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do_async('key', failing))
+        await asyncio.sleep(0)
+        release.set()
+
+        for caller in (leader, follower):
+            with pytest.raises(RuntimeError):
+                await caller
+        assert flight.in_flight() == 0
+
+        async def working():
+            return 'result'
+
+        assert await flight.do_async('key', working) == ('result', False)
+
+    asyncio.run(scenario())
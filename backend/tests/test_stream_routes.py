@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+from flask import Flask
+from quart import Quart
+
+from benchmarks.mock_openai import MockLLMConfig, start_mock_llm
+from routes.async_llm import async_llm_bp
+from routes.llm import llm_bp
+
+LLM = {'provider': 'custom', 'model': 'mock', 'api_key': 'sk-test', 'fallbacks': []}
+
+
+def flask_post(path, body):
+    app = Flask(__name__)
+    app.register_blueprint(llm_bp, url_prefix='/api/llm')
+    response = app.test_client().post(path, json=body)
+    return response.status_code, response.get_data(as_text=True)
+
+
+def quart_post(path, body):
+    app = Quart(__name__)
+    app.register_blueprint(async_llm_bp, url_prefix='/api/llm')
+
+    async def post():
+        response = await app.test_client().post(path, json=body)
+        return response.status_code, await response.get_data(as_text=True)
+
+    return asyncio.run(post())
+
+
+INVALID_REQUESTS = [
+    ('/api/llm/analyze', {'code': 'x = 1'}, 401),
+    ('/api/llm/analyze', dict(LLM), 400),
+    ('/api/llm/chat', dict(LLM), 400),
+]
+
+
+@pytest.mark.parametrize('post', [flask_post, quart_post])
+@pytest.mark.parametrize('path, body, status', INVALID_REQUESTS)
+def test_invalid_stream_request_is_rejected_before_streaming(post, path, body, status):
+    stream_status, text = post(f"{path}/stream", body)
+
+    assert stream_status == status
+    assert 'event:' not in text
+    # The same bad request gets the same status with or without streaming
+    assert post(path, body)[0] == status
+
+
+@pytest.mark.parametrize('post', [flask_post, quart_post])
+def test_valid_stream_request_streams_tokens_then_done(post):
+    server = start_mock_llm(MockLLMConfig(latency=0, token_rate=100000, completion_tokens=5))
+    try:
+        body = dict(LLM, base_url=server.base_url, message='What does this do?', session_id='stream-routes')
+        status, text = post('/api/llm/chat/stream', body)
+    finally:
+        server.shutdown()
+
+    assert status == 200
+    assert 'event: token' in text
+    assert text.rstrip().split('\n\n')[-1].startswith('event: done')
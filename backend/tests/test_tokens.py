@@ -0,0 +1,94 @@
+import pytest
+from langchain_core.prompts import ChatPromptTemplate
+
+from llm import tokens
+from llm.providers import get_context_limit
+from llm.tokens import (
+    SAFETY_MARGIN, TRUNCATION_NOTE, count_message_tokens, count_tokens, encoding_name_for_model, estimate_tokens,
+    fit_code_to_budget, truncate_to_tokens
+)
+
+PROMPT = ChatPromptTemplate.from_messages([
+    ('system', 'You review code.'),
+    ('human', 'Review this code:\n\n{code}')
+])
+
+
+def source(lines):
+    return ''.join(f"result_{n} = compute(value_{n}, offset={n})\n" for n in range(lines))
+
+
+@pytest.mark.parametrize('model, limit', [
+    ('gpt-4', 8192),
+    ('gpt-4-0613', 8192),
+    ('gpt-4-32k-0613', 32768),
+    ('gpt-4o-mini', 128000),
+    ('openai/gpt-4o', 128000),
+    ('llama3:8b', 8192),
+    ('deepseek-coder-v2:16b', 131072),
+])
+def test_context_limit_uses_the_longest_matching_prefix(model, limit):
+    assert get_context_limit(model) == limit
+
+
+def test_unknown_models_get_the_default_context_limit():
+    assert get_context_limit('my-finetune') == 4096
+    assert get_context_limit(None, default=2048) == 2048
+
+
+def test_encodings_are_chosen_by_model_prefix():
+    assert encoding_name_for_model('gpt-4o-mini') == 'o200k_base'
+    assert encoding_name_for_model('gpt-4-turbo') == 'cl100k_base'
+    assert encoding_name_for_model('llama3') == 'cl100k_base'
+
+
+def test_estimate_counts_words_and_punctuation():
+    assert estimate_tokens('') == 0
+    assert estimate_tokens('x = f(a, b)') == 8
+    # Long identifiers still cost at least one token per four characters
+    assert estimate_tokens('a' * 400) == 100
+
+
+def test_estimated_truncation_fits_the_budget(monkeypatch):
+    monkeypatch.setattr(tokens, 'get_encoder', lambda model: None)
+    code = source(200)
+
+    prefix = truncate_to_tokens(code, 300)
+
+    assert code.startswith(prefix)
+    assert estimate_tokens(prefix) <= 300 < estimate_tokens(code[:len(prefix) + 8])
+    assert truncate_to_tokens('short', 300) == 'short'
+    assert truncate_to_tokens(code, 0) == ''
+
+
+def test_message_tokens_add_chat_framing():
+    messages = PROMPT.format_messages(code='x = 1')
+    content = sum(count_tokens(message.content, 'gpt-4o') for message in messages)
+
+    assert count_message_tokens(messages, 'gpt-4o') == content + len(messages) * tokens.TOKENS_PER_MESSAGE + tokens.TOKENS_PER_REPLY
+
+
+def test_code_that_fits_is_sent_whole():
+    fitted = fit_code_to_budget(PROMPT, source(20), 'gpt-4', max_tokens=1000)
+
+    assert fitted['truncated'] is False
+    assert source(20) in fitted['messages'][-1].content
+    assert fitted['context_limit'] == 8192
+
+
+def test_oversized_code_is_cut_to_leave_room_for_the_completion():
+    fitted = fit_code_to_budget(PROMPT, source(2000), 'gpt-4', max_tokens=2000)
+
+    assert fitted['truncated'] is True
+    assert fitted['messages'][-1].content.endswith(TRUNCATION_NOTE)
+    assert fitted['prompt_tokens'] == count_message_tokens(fitted['messages'], 'gpt-4')
+    assert fitted['prompt_tokens'] + 2000 <= 8192 - SAFETY_MARGIN + count_tokens(TRUNCATION_NOTE, 'gpt-4')
+
+
+def test_budget_scale_and_explicit_context_limit_shrink_the_code_budget():
+    full = fit_code_to_budget(PROMPT, source(2000), 'gpt-4o', max_tokens=1000, context_limit=6000)
+    half = fit_code_to_budget(PROMPT, source(2000), 'gpt-4o', max_tokens=1000, context_limit=6000, budget_scale=0.5)
+
+    assert full['context_limit'] == 6000
+    assert half['code_budget'] == int(full['code_budget'] * 0.5)
+    assert half['prompt_tokens'] < full['prompt_tokens']
@@ -9,6 +9,8 @@ import { repositoryService } from '@/services/repositoryService'
 
 export default function RepositoryExplorer({ githubToken, setSidebarOpen }) {
   const [repositories, setRepositories] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [selectedRepo, setSelectedRepo] = useState(null)
   const [repoContents, setRepoContents] = useState([])
   const [currentPath, setCurrentPath] = useState('')
@@ -27,6 +29,7 @@ export default function RepositoryExplorer({ githubToken, setSidebarOpen }) {
     try {
       const data = await repositoryService.fetchRepositories(githubToken)
       setRepositories(data.repositories)
+      setNextCursor(data.next_cursor)
     } catch (error) {
       toast({
         title: "Error",
@@ -38,6 +41,24 @@ export default function RepositoryExplorer({ githubToken, setSidebarOpen }) {
     }
   }
 
+  const loadMoreRepositories = async () => {
+    if (!nextCursor) return
+    setLoadingMore(true)
+    try {
+      const data = await repositoryService.fetchRepositories(githubToken, nextCursor)
+      setRepositories(prev => [...prev, ...data.repositories])
+      setNextCursor(data.next_cursor)
+    } catch (error) {
+      toast({
+        title: "Error",
+        description: error.message,
+        variant: "destructive"
+      })
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   const fetchRepoContents = async (repoName, path = '') => {
     setLoading(true)
     try {
@@ -110,6 +131,9 @@ export default function RepositoryExplorer({ githubToken, setSidebarOpen }) {
               searchTerm={searchTerm}
               onSearchChange={setSearchTerm}
               loading={loading && !selectedRepo}
+              hasMore={Boolean(nextCursor)}
+              onLoadMore={loadMoreRepositories}
+              loadingMore={loadingMore}
             />
 
             <RepositoryContents
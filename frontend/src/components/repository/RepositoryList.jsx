@@ -1,6 +1,7 @@
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card'
 import { Input } from '@/components/ui/input'
 import { Badge } from '@/components/ui/badge'
+import { Button } from '@/components/ui/button'
 import { GitBranch, Search, Loader2 } from 'lucide-react'
 
 export default function RepositoryList({
@@ -9,7 +10,10 @@ export default function RepositoryList({
   onSelectRepository,
   searchTerm,
   onSearchChange,
-  loading
+  loading,
+  hasMore,
+  onLoadMore,
+  loadingMore
 }) {
   const filteredRepositories = repositories.filter(repo =>
     repo.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
@@ -31,12 +35,18 @@ export default function RepositoryList({
         <div className="relative">
           <Search className="absolute left-3 top-1/2 transform -translate-y-1/2 text-gray-400 h-4 w-4" />
           <Input
-            placeholder="Search repositories..."
+            placeholder="Search loaded repositories..."
             value={searchTerm}
             onChange={(e) => onSearchChange(e.target.value)}
             className="pl-10"
           />
         </div>
+
+        {searchTerm && hasMore && (
+          <p className="text-xs text-gray-500">
+            Searching the {repositories.length} repositories loaded so far. Load more to search the rest.
+          </p>
+        )}
         
         {loading ? (
           <div className="flex items-center justify-center py-8">
@@ -75,11 +85,23 @@ export default function RepositoryList({
               </div>
             ))}
             
-            {filteredRepositories.length === 0 && !loading && (
+            {filteredRepositories.length === 0 && !loading && !hasMore && (
               <div className="text-center py-8 text-gray-500">
                 {searchTerm ? 'No repositories match your search' : 'No repositories found'}
               </div>
             )}
+
+            {hasMore && (
+              <Button
+                variant="outline"
+                className="w-full"
+                onClick={onLoadMore}
+                disabled={loadingMore}
+              >
+                {loadingMore && <Loader2 className="h-4 w-4 mr-2 animate-spin" />}
+                Load more
+              </Button>
+            )}
           </div>
         )}
       </CardContent>
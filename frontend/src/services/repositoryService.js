@@ -1,8 +1,9 @@
 import { API_BASE_URL } from '@/lib/api'
 
 export const repositoryService = {
-  async fetchRepositories(githubToken) {
-    const response = await fetch(`${API_BASE_URL}/api/github/repositories`, {
+  async fetchRepositories(githubToken, cursor = null) {
+    const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : ''
+    const response = await fetch(`${API_BASE_URL}/api/github/repositories${query}`, {
       headers: {
         'Authorization': `Bearer ${githubToken}`
       }